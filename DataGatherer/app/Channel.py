@@ -0,0 +1,249 @@
+import asyncio
+import threading
+from collections import deque
+from queue import Empty
+
+
+def _resolve(future):
+    """
+    Wake a waiting coroutine, called on the waiter's own event loop.
+    :param future: Future the coroutine awaits.
+    :return: True if the waiter was woken, False if it had already gone.
+    """
+    if future.done():
+        return False
+    future.set_result(None)
+    return True
+
+
+class Channel:
+    def __init__(self, high_water=0, low_water=None):
+        """
+        FIFO shared between asyncio coroutines and plain threads.
+        Coroutines await items without going through the default executor,
+        threads (Syncer, Validator) put and drain in batches under a lock.
+        Puts never block or drop. Once the channel reaches high_water it is pressured until it drains to low_water,
+        and producers that wait for room hold off until then.
+        :param high_water: Size at which the channel becomes pressured, 0 for never.
+        :param low_water: Size at which it stops being pressured, half of high_water by default.
+        """
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._getters = deque()
+        self._room_waiters = deque()
+        self._joiners = []
+        self._unfinished = 0
+        self.high_water = high_water
+        self.low_water = high_water // 2 if low_water is None else low_water
+        self.pressured = False
+
+    def qsize(self):
+        return len(self._items)
+
+    def empty(self):
+        return not self._items
+
+    def room(self):
+        """
+        :return: Items that may be added before the channel is pressured, -1 if it has no high water mark.
+        """
+        if not self.high_water:
+            return -1
+        if self.pressured:
+            return 0
+        return max(0, self.high_water - len(self._items))
+
+    def _taken(self):
+        """
+        Release waiting producers once the channel has drained to low water. Lock must be held.
+        """
+        if self.pressured and len(self._items) <= self.low_water:
+            self.pressured = False
+            self._not_full.notify_all()
+            waiters = list(self._room_waiters)
+            self._room_waiters.clear()
+            for loop, future in waiters:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_resolve, future)
+
+    async def wait_for_room(self):
+        """
+        Wait while the channel is pressured. Returns at once otherwise, or when woken by wake_all.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self.pressured:
+                return
+            future = loop.create_future()
+            self._room_waiters.append((loop, future))
+        try:
+            await future
+        finally:
+            with self._lock:
+                try:
+                    self._room_waiters.remove((loop, future))
+                except ValueError:
+                    pass
+
+    def block_for_room(self, timeout=None):
+        """
+        Thread version of wait_for_room.
+        :param timeout: Seconds to wait, None waits until there is room.
+        :return: True if there is room.
+        """
+        with self._not_full:
+            return self._not_full.wait_for(lambda: not self.pressured, timeout)
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Add an item. Signature matches queue.Queue so Syncer can use it unchanged.
+        :param item: Item to add.
+        """
+        self.put_many((item,))
+
+    def put_nowait(self, item):
+        self.put_many((item,))
+
+    def put_many(self, items):
+        """
+        Add many items with a single lock acquisition.
+        :param items: Iterable of items.
+        :return: Number of items added.
+        """
+        with self._lock:
+            before = len(self._items)
+            self._items.extend(items)
+            added = len(self._items) - before
+            if self.high_water and len(self._items) >= self.high_water:
+                self.pressured = True
+            if added:
+                self._unfinished += added
+                self._not_empty.notify(added)
+                self._wake_getters(added)
+        return added
+
+    def _wake_getters(self, count):
+        """
+        Wake up to count waiting coroutines. Lock must be held.
+        :param count: Number of waiters to wake.
+        """
+        while count and self._getters:
+            loop, future = self._getters.popleft()
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(self._hand_over, future)
+            count -= 1
+
+    def _hand_over(self, future):
+        """
+        Resolve a getter, passing the wake-up on if that getter was cancelled meanwhile.
+        :param future: Future of the chosen getter.
+        """
+        if not _resolve(future):
+            with self._lock:
+                if self._items:
+                    self._wake_getters(1)
+
+    async def get(self, timeout=None):
+        """
+        Wait for an item without polling.
+        :param timeout: Seconds to wait, None waits forever.
+        :return: The oldest item.
+        :raises queue.Empty: Nothing arrived in time, or the wait was interrupted by wake_all.
+        """
+        try:
+            return self.get_nowait()
+        except Empty:
+            pass
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._items:
+                item = self._items.popleft()
+                self._taken()
+                return item
+            self._getters.append((loop, future))
+
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                try:
+                    self._getters.remove((loop, future))
+                except ValueError:
+                    pass
+
+        return self.get_nowait()
+
+    def wake_all(self):
+        """
+        Release every waiting coroutine and producer so it can re-check its own running flag.
+        """
+        with self._lock:
+            getters = list(self._getters) + list(self._room_waiters)
+            self._getters.clear()
+            self._room_waiters.clear()
+            self._not_full.notify_all()
+        for loop, future in getters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._items:
+                raise Empty
+            item = self._items.popleft()
+            self._taken()
+            return item
+
+    def get_batch(self, max_items, timeout=0):
+        """
+        Drain up to max_items in one lock acquisition.
+        :param max_items: Largest batch to return, -1 for everything available.
+        :param timeout: Seconds to block for the first item, 0 returns immediately, None waits forever.
+        :return: List of items, empty if none arrived.
+        """
+        with self._not_empty:
+            if timeout != 0 and not self._items:
+                self._not_empty.wait_for(lambda: self._items, timeout)
+            if max_items == -1 or max_items >= len(self._items):
+                batch = list(self._items)
+                self._items.clear()
+            else:
+                batch = [self._items.popleft() for _ in range(max_items)]
+            self._taken()
+        return batch
+
+    def task_done(self):
+        """
+        Mark one previously taken item as processed.
+        """
+        with self._lock:
+            if self._unfinished <= 0:
+                raise ValueError("task_done() called too many times")
+            self._unfinished -= 1
+            if self._unfinished == 0:
+                joiners = self._joiners
+                self._joiners = []
+            else:
+                joiners = []
+        for loop, future in joiners:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    async def join(self):
+        """
+        Wait until every item put has been marked with task_done.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._lock:
+            if self._unfinished == 0:
+                return
+            self._joiners.append((loop, future))
+        await future
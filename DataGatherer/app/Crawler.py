@@ -1,30 +1,43 @@
 import asyncio
 from queue import Empty
-from aiohttp import ClientSession, ClientTimeout
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
-from urllib.parse import urlparse
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
 
 try:
-    from utils import push_list
+    from ParsePool import ParsePool
+    from HostScheduler import HostScheduler
 except ImportError:
-    from DataGatherer.app.utils import push_list
-
+    from DataGatherer.app.ParsePool import ParsePool
+    from DataGatherer.app.HostScheduler import HostScheduler
 
 
 class Crawler:
-    def __init__(self, target_links, link_text, potential_links, timeout):
+    def __init__(self, target_links, link_text, potential_links, timeout, parse_pool=None,
+                 host_concurrency=2, host_delay=0.5, dns_ttl=300, max_scheduled=1000):
         """
         Uses aiohttp to use target links to get link text and potential links.
-        :param target_links: Queue of target links to visit.
-        :param link_text: Queue of link, text pairs.
-        :param potential_links: Queue of potential links to visit later.
+        All workers share one session, so connections are kept alive and reused across workers.
+        Workers wait while link_text is pressured, so a slow consumer slows the crawl instead of filling memory.
+        :param target_links: Channel of target links to visit.
+        :param link_text: Channel of link, text pairs, or link, text, SimHash when the parse pool fingerprints.
+        :param potential_links: Channel of potential links to visit later.
         :param timeout: Timeout in seconds.
+        :param parse_pool: ParsePool that turns pages into text and links, parses on the event loop if None.
+        :param host_concurrency: Most requests in flight to one host.
+        :param host_delay: Seconds between the start of two requests to one host.
+        :param dns_ttl: Seconds a DNS lookup is cached.
+        :param max_scheduled: Most links held by the host scheduler, the rest wait in target_links.
         """
         self.target_links = target_links
         self.link_text = link_text
         self.potential_links = potential_links
         self.timeout = timeout
+        self.parse_pool = parse_pool or ParsePool(0)
+        self.host_concurrency = host_concurrency
+        self.host_delay = host_delay
+        self.dns_ttl = dns_ttl
+        self.max_scheduled = max_scheduled
+        self.session = None
+        self.scheduler = None
         self.running = False
         self.worker_tasks = []
 
@@ -36,6 +49,18 @@ class Crawler:
         if self.running:
             return
         self.running = True
+        self.parse_pool.start()
+        self.scheduler = HostScheduler(self.host_concurrency, self.host_delay)
+        self.session = ClientSession(
+            connector=TCPConnector(
+                limit=workers,
+                limit_per_host=self.host_concurrency,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=30,
+            ),
+            timeout=ClientTimeout(total=self.timeout),
+        )
+        self.worker_tasks.append(asyncio.create_task(self.dispatcher()))
         for _ in range(workers):
             self.worker_tasks.append(asyncio.create_task(self.worker()))
 
@@ -47,27 +72,47 @@ class Crawler:
         self.running = False
         if soft:
             await self.target_links.join()
+        # idle workers are parked on the channel and scheduler, let them see the flag.
+        self.target_links.wake_all()
+        self.link_text.wake_all()
+        await self.scheduler.close()
         await asyncio.gather(*self.worker_tasks, return_exceptions=True)
         self.worker_tasks.clear()
+        await self.session.close()
+        await self.parse_pool.stop()
+
+    async def dispatcher(self):
+        """
+        Move target links into the host scheduler as they arrive.
+        """
+        while self.running:
+            await self.scheduler.wait_for_room(self.max_scheduled)
+            try:
+                # wait for a link, wakes as soon as one is put.
+                link = await self.target_links.get(timeout=self.timeout)
+            except Empty:
+                continue
+            await self.scheduler.add(link)
 
     async def worker(self):
         """
         Primary event loop for crawling.
         """
-        async with ClientSession(timeout=ClientTimeout(total=self.timeout)) as session:
-            while self.running:
-                try:
-                    # try to get a link
-                    link = await asyncio.to_thread(self.target_links.get_nowait)
-                except Empty:
-                    await asyncio.sleep(self.timeout)
-                    continue
+        while self.running:
+            # hold off while pages are not being taken away fast enough.
+            await self.link_text.wait_for_room()
+            # next link of whichever host is ready, never waits behind a slow host.
+            link = await self.scheduler.acquire(timeout=self.timeout)
+            if link is None:
+                continue
 
-                try:
-                    await self.get_link(session, link)
-
-                finally:
-                    self.target_links.task_done()
+            try:
+                await self.get_link(self.session, link)
+            except Exception as e:
+                print(f"Crawler failed on {link}: {e}")
+            finally:
+                await self.scheduler.release(link)
+                self.target_links.task_done()
 
     async def get_link(self, session, link):
         async with session.get(link) as response:
@@ -75,15 +120,10 @@ class Crawler:
                 return
             html = await response.text()
 
-        # combine this with each tag content to form the full link.
-        # we do not have a browser this time.
-        base_url = f"{urlparse(link).scheme}://{urlparse(link).netloc}"
-
-        soup = BeautifulSoup(html, "html.parser")
-        body = soup.get_text(separator=" ", strip=True)
-
-        await asyncio.to_thread(self.link_text.put, (link, body))
+        body, found_links, signature = await self.parse_pool.parse(link, html)
 
-        for found_link in soup.find_all("a", href=True):
-            full_link = urljoin(base_url, found_link["href"])
-            await asyncio.to_thread(self.potential_links.put, full_link)
+        if signature is None:
+            self.link_text.put_nowait((link, body))
+        else:
+            self.link_text.put_nowait((link, body, signature))
+        self.potential_links.put_many(found_links)
@@ -3,9 +3,17 @@ import time
 from utils import delayed_action
 import redis
 import asyncio
-from queue import Queue
+from Channel import Channel
+from ParsePool import ParsePool
+from Parsers import PARSERS
 from shared.utils.Syncer import Syncer
+from shared.utils.Codec import Codec
+from shared.utils.Backpressure import BackpressureMonitor
 from Validator import Validator
+from Frontier import Frontier
+from SeenSet import make_seen_set
+from NearDuplicate import NearDuplicateFilter
+from Spill import Spill
 import argparse
 
 def parse_args():
@@ -13,9 +21,55 @@ def parse_args():
     parser.add_argument("--seed", type=str, required=True, help="Starting link.")
     parser.add_argument("--timeout", type=int, default=120, help="Timeout in seconds.")
     parser.add_argument("--scrapers", type=int, default=2, help="Number of scrapers.")
+    parser.add_argument("--parsers", type=int, default=2,
+                        help="Number of HTML parsing processes, 0 parses on the event loop.")
+    parser.add_argument("--parser", type=str, default="html.parser", choices=list(PARSERS),
+                        help="HTML parser backend.")
+    parser.add_argument("--host_concurrency", type=int, default=2, help="Most requests in flight to one host.")
+    parser.add_argument("--host_delay", type=float, default=0.5,
+                        help="Seconds between the start of two requests to one host.")
+    parser.add_argument("--near_duplicates", action="store_true",
+                        help="Drop pages whose SimHash is close to a page already gathered.")
+    parser.add_argument("--near_duplicate_distance", type=int, default=3,
+                        help="Largest SimHash bit difference between near duplicate pages.")
     parser.add_argument("--redis_host", type=str, default="none", help="Redis host.")
     parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
-    return parser.parse_args()
+    parser.add_argument("--sync_mode", type=str, default="poll", choices=["poll", "blocking"],
+                        help="Sync with Redis every sync period, or as soon as items arrive.")
+    parser.add_argument("--sync_period", type=float, default=5, help="Seconds between polled syncs.")
+    parser.add_argument("--transport", type=str, default="list", choices=["list", "stream"],
+                        help="Push link_text to a list, or to a stream read by a group of Indexers.")
+    parser.add_argument("--stream_groups", type=str, nargs="+", default=["indexers"],
+                        help="Consumer groups the link_text stream keeps entries for until each has acked them.")
+    parser.add_argument("--codec", type=str, default="json", choices=["json", "msgpack"],
+                        help="Encoding of items sent to Redis, every service reads both.")
+    parser.add_argument("--compression", type=str, default="none", choices=["none", "zstd", "lz4"],
+                        help="Compression of large msgpack items such as page text.")
+    parser.add_argument("--frontier", type=str, default="list", choices=["list", "mercator"],
+                        help="Plain FIFO target_links list, or a prioritized frontier spread over hosts.")
+    parser.add_argument("--priority", type=str, default="depth", choices=["depth", "inlinks"],
+                        help="Priority of the mercator frontier.")
+    parser.add_argument("--seen_set", type=str, default="exact", choices=["exact", "bloom", "redisbloom"],
+                        help="Exact Redis set of seen links, or a Bloom filter using far less memory.")
+    parser.add_argument("--bloom_capacity", type=int, default=1000000,
+                        help="Links the Bloom filter holds before it grows.")
+    parser.add_argument("--bloom_error", type=float, default=0.001,
+                        help="Share of new links the Bloom filter may wrongly report as seen.")
+    parser.add_argument("--validators", type=int, default=1, help="Number of validator threads.")
+    parser.add_argument("--validator_batch", type=int, default=256,
+                        help="Most links a validator checks in one Redis round trip.")
+    parser.add_argument("--high_water", type=int, default=0,
+                        help="Size at which a local queue holds back its producers, 0 for unbounded queues.")
+    parser.add_argument("--link_text_limit", type=int, default=0,
+                        help="Most pages left waiting in Redis for the Indexers before crawling slows, 0 for no limit.")
+    parser.add_argument("--overflow", type=str, default="none", choices=["none", "shed", "spill"],
+                        help="What validators do with found links over the high water mark.")
+    parser.add_argument("--spill_path", type=str, default="potential_links.spill", help="File spilled links go to.")
+    args = parser.parse_args()
+    if args.overflow != "none" and args.high_water <= 0:
+        # unbounded queues never go over a high water mark, so nothing would be shed or spilled.
+        parser.error(f"--overflow {args.overflow} needs a --high_water above 0.")
+    return args
 
 class DataGatherer:
     def __init__(self,
@@ -23,6 +77,13 @@ class DataGatherer:
                  timeout=60,
                  scrapers=8,
                  scraper_timeout=2,
+                 parsers=2,
+                 parser="html.parser",
+                 host_concurrency=2,
+                 host_delay=0.5,
+                 near_duplicates=False,
+                 near_duplicate_distance=3,
+                 high_water=0,
                  ):
         """
         Starts an object that takes a seed link and generates links and text to a queue.
@@ -31,44 +92,135 @@ class DataGatherer:
         :param timeout: how long the code runs until shutdown.
         :param scrapers: how many browsers to use.
         :param scraper_timeout: how frequently the scrapers check for links.
+        :param parsers: how many processes parse pages, 0 parses on the event loop.
+        :param parser: HTML parser backend.
+        :param host_concurrency: how many requests may be in flight to one host.
+        :param host_delay: seconds between the start of two requests to one host.
+        :param near_duplicates: drop pages nearly identical to one already gathered, needs Redis.
+        :param near_duplicate_distance: largest SimHash bit difference between near duplicates.
+        :param high_water: size at which a local queue holds back its producers, 0 for unbounded queues.
         """
 
         self.syncer = None
-        self.validator = None
-        self.out_queue = Queue()
+        self.validators = []
+        self.monitor = None
+        self.out_queue = Channel(high_water)
         self.timeout = timeout
         self.running = False
         self.scrapers = scrapers
-        self.target_link_queue = Queue()
+        self.host_delay = host_delay
+        self.target_link_queue = Channel(high_water)
         self.target_link_queue.put_nowait(seed)
-        self.potential_link_queue = Queue()
+        self.potential_link_queue = Channel(high_water)
+        # with near duplicate detection, pages pass through the filter on their way to out_queue.
+        self.near_duplicates = near_duplicates
+        self.near_duplicate_distance = near_duplicate_distance
+        self.near_duplicate_filter = None
+        self.page_queue = Channel(high_water) if near_duplicates else self.out_queue
         self.crawler = Crawler(self.target_link_queue,
-                                      self.out_queue,
+                                      self.page_queue,
                                       self.potential_link_queue,
                                       scraper_timeout,
+                                      parse_pool=ParsePool(parsers, parser, fingerprint=near_duplicates),
+                                      host_concurrency=host_concurrency,
+                                      host_delay=host_delay,
         )
 
-    def connect_redis(self, host, port, sync_period):
+    def connect_redis(self, host, port, sync_period, frontier="list", priority="depth",
+                      seen_set="exact", bloom_capacity=1000000, bloom_error=0.001,
+                      validators=1, validator_batch=256, sync_mode="poll", transport="list",
+                      codec=None, link_text_limit=0, overflow=None, spill_path="potential_links.spill",
+                      stream_groups=("indexers",)):
         """
         Start agent that syncs to redis.
         Queue of potential links is converted to target links in Redis, then synced.
+        Queue sizes, remote lengths and shed links are published to the backpressure:datagatherer hash.
+        :param frontier: "list" for the target_links list, "mercator" for a prioritized frontier leased per host.
+        :param priority: Priority of the mercator frontier.
+        :param seen_set: "exact", "bloom" or "redisbloom" set of seen links.
+        :param bloom_capacity: Links the Bloom filter holds before it grows.
+        :param bloom_error: Share of new links the Bloom filter may wrongly report as seen.
+        :param validators: Number of validator threads sharing the potential links.
+        :param validator_batch: Most links a validator checks in one Redis round trip.
+        :param sync_mode: "poll" syncs every sync_period, "blocking" syncs as soon as items arrive.
+        :param transport: "list" pushes link_text to a list, "stream" to a stream for Indexer consumer groups.
+        :param codec: Codec of items sent to Redis, plain JSON if None.
+        :param link_text_limit: Most pages left waiting in Redis before pages back up locally, 0 for no limit.
+        :param overflow: None, "shed" or "spill", what validators do with found links over the high water mark.
+        :param spill_path: File spilled links go to.
+        :param stream_groups: Consumer groups the link_text stream keeps entries for, even before they start reading.
         """
 
         redis_client = redis.Redis(host=host, port=port, db=0)
+        if frontier == "mercator":
+            frontier = Frontier(redis_client, priority=priority, host_delay=self.host_delay)
+            pull_map = []
+            lease_map = [(self.target_link_queue, frontier, self.scrapers)]
+        else:
+            frontier = None
+            pull_map = [(self.target_link_queue, "target_links", False, self.scrapers)]
+            lease_map = []
+
         self.syncer = Syncer(
             redis_client,
             push_map=[(self.out_queue, "link_text", False, -1, "queue")],
-            pull_map=[(self.target_link_queue, "target_links", False, self.scrapers)],
-            sync_period=sync_period
+            pull_map=pull_map,
+            sync_period=sync_period,
+            lease_map=lease_map,
+            mode=sync_mode,
+            streams=["link_text"] if transport == "stream" else None,
+            stream_groups=stream_groups,
+            codec=codec,
+            remote_limits={"link_text": link_text_limit} if link_text_limit else None,
         )
         self.syncer.start()
 
-        self.validator = Validator(
+        seen_set = make_seen_set(redis_client, seen_set, bloom_capacity, bloom_error)
+        spill = Spill(spill_path) if overflow == "spill" else None
+        for _ in range(validators):
+            validator = Validator(
+                redis_client,
+                self.potential_link_queue,
+                sync_period=sync_period,
+                batch_size=validator_batch,
+                frontier=frontier,
+                seen_set=seen_set,
+                codec=codec,
+                overflow=overflow,
+                spill=spill,
+            )
+            validator.start()
+            self.validators.append(validator)
+
+        if self.near_duplicates:
+            self.near_duplicate_filter = NearDuplicateFilter(
+                redis_client,
+                self.page_queue,
+                self.out_queue,
+                sync_period=sync_period,
+                distance=self.near_duplicate_distance,
+            )
+            self.near_duplicate_filter.start()
+
+        queues = {
+            "target_links": self.target_link_queue,
+            "potential_links": self.potential_link_queue,
+            "link_text": self.out_queue,
+        }
+        if self.near_duplicates:
+            queues["pages"] = self.page_queue
+        self.monitor = BackpressureMonitor(
             redis_client,
-            self.potential_link_queue,
-            sync_period=sync_period
+            "backpressure:datagatherer",
+            queues=queues,
+            syncer=self.syncer,
+            counters=lambda: {
+                "shed": sum(validator.shed for validator in self.validators),
+                "spilled": sum(validator.spilled for validator in self.validators),
+                "spill_pending": len(spill) if spill else 0,
+            },
         )
-        self.validator.start()
+        self.monitor.start()
 
     async def start(self):
         """
@@ -93,11 +245,18 @@ class DataGatherer:
 
         await asyncio.sleep(10)
 
+        # the filter hands its last pages to out_queue before the syncer stops.
+        if self.near_duplicate_filter:
+            self.near_duplicate_filter.stop()
+
         if self.syncer:
             self.syncer.stop()
 
-        if self.validator:
-            self.validator.stop()
+        for validator in self.validators:
+            validator.stop()
+
+        if self.monitor:
+            self.monitor.stop()
 
 def run():
     args = parse_args()
@@ -106,10 +265,26 @@ def run():
         args.seed,
         timeout=args.timeout,
         scrapers=args.scrapers,
+        parsers=args.parsers,
+        parser=args.parser,
+        host_concurrency=args.host_concurrency,
+        host_delay=args.host_delay,
+        near_duplicates=args.near_duplicates,
+        near_duplicate_distance=args.near_duplicate_distance,
+        high_water=args.high_water,
     )
 
     if args.redis_host != "none":
-        datagatherer.connect_redis(args.redis_host, args.redis_port, sync_period=5)
+        datagatherer.connect_redis(args.redis_host, args.redis_port, sync_period=args.sync_period,
+                                   frontier=args.frontier, priority=args.priority,
+                                   seen_set=args.seen_set, bloom_capacity=args.bloom_capacity,
+                                   bloom_error=args.bloom_error, validators=args.validators,
+                                   validator_batch=args.validator_batch, sync_mode=args.sync_mode,
+                                   transport=args.transport,
+                                   codec=Codec(args.codec, None if args.compression == "none" else args.compression),
+                                   link_text_limit=args.link_text_limit,
+                                   overflow=None if args.overflow == "none" else args.overflow,
+                                   spill_path=args.spill_path, stream_groups=args.stream_groups)
 
     asyncio.run(datagatherer.start())
 
@@ -0,0 +1,136 @@
+import time
+from urllib.parse import urlparse
+
+# Move links from the front queue into per-host back queues, then lease at most one link per ready host.
+# KEYS: front zset, ready zset, backlog counter. ARGV: now, host delay, count, backlog target, back queue prefix.
+# Back queues are named in the script, so they share the hash tag of the KEYS to stay in their slot on a cluster.
+LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local delay = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local target = tonumber(ARGV[4])
+local prefix = ARGV[5]
+
+local backlog = tonumber(redis.call("GET", KEYS[3]) or "0")
+if backlog < target then
+    local moved = redis.call("ZPOPMIN", KEYS[1], target - backlog)
+    for i = 1, #moved, 2 do
+        local link = moved[i]
+        local host = string.match(link, "^%a[%w+.-]*://([^/?#]+)") or ""
+        redis.call("RPUSH", prefix .. host .. ":list", link)
+        -- NX keeps the delay of a host that is still waiting.
+        redis.call("ZADD", KEYS[2], "NX", now, host)
+    end
+    backlog = backlog + #moved / 2
+end
+
+local leased = {}
+local hosts = redis.call("ZRANGEBYSCORE", KEYS[2], "-inf", now, "LIMIT", 0, count * 2)
+for _, host in ipairs(hosts) do
+    if #leased >= count then
+        break
+    end
+    local link = redis.call("LPOP", prefix .. host .. ":list")
+    if link then
+        table.insert(leased, link)
+        redis.call("ZADD", KEYS[2], now + delay, host)
+    else
+        -- its delay has run out, so the host can be forgotten.
+        redis.call("ZREM", KEYS[2], host)
+    end
+end
+
+redis.call("SET", KEYS[3], backlog - #leased)
+return leased
+"""
+
+
+def depth_priority(link):
+    """
+    Shallow pages first, depth is the number of path segments.
+    :param link: Link to score.
+    :return: Score, lower is leased sooner.
+    """
+    return len([segment for segment in urlparse(link).path.split("/") if segment])
+
+
+class Frontier:
+    def __init__(self, redis_client, priority="depth", host_delay=1.0, backlog=1000, prefix="frontier"):
+        """
+        Mercator style frontier kept in Redis.
+        Front queue: one sorted set of links ordered by priority.
+        Back queues: one list per host, fed from the front queue in priority order.
+        Ready heap: sorted set of hosts by the time they may be visited next.
+        Leasing is a single Lua script, so several gatherers can share the frontier.
+        The script names back queues itself, so every key is put under the {prefix} hash tag:
+        on Redis Cluster they all map to one slot, and the script only touches keys of that slot.
+
+        :param redis_client: Redis client instance.
+        :param priority: "depth", "inlinks", or a function of a link returning a score (lower first).
+        :param host_delay: Seconds before a host can be leased from again.
+        :param backlog: Links kept spread over back queues, more spreads better but reacts slower to priority.
+        :param prefix: Key prefix of the frontier, used as the hash tag of every key.
+        """
+        self.redis_client = redis_client
+        self.priority = priority
+        self.host_delay = host_delay
+        self.backlog = backlog
+        tag = "{" + prefix + "}"
+        self.front_key = tag + ":front:zset"
+        self.ready_key = tag + ":ready:zset"
+        self.backlog_key = tag + ":backlog"
+        self.back_prefix = tag + ":back:"
+        self.lease_script = redis_client.register_script(LEASE_SCRIPT)
+
+    def score(self, link):
+        if self.priority == "depth":
+            return depth_priority(link)
+        if self.priority == "inlinks":
+            # every later sighting lowers the score through bump.
+            return 0
+        return self.priority(link)
+
+    def add(self, links):
+        """
+        Add links that were never seen before to the front queue.
+        :param links: List of links.
+        """
+        if links:
+            self.redis_client.zadd(self.front_key, {link: self.score(link) for link in links}, nx=True)
+
+    def bump(self, links):
+        """
+        Count another in-link for links already waiting in the front queue.
+        Only used by the "inlinks" priority, links already leased are left alone.
+        :param links: List of links seen again.
+        """
+        if self.priority != "inlinks" or not links:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for link in links:
+            pipe.zadd(self.front_key, {link: -1}, xx=True, incr=True)
+        pipe.execute()
+
+    def lease(self, count):
+        """
+        Atomically take up to count links, at most one per host that is ready to be visited.
+        :param count: Most links to take.
+        :return: List of links.
+        """
+        if count == -1:
+            count = self.backlog
+        leased = self.lease_script(
+            keys=[self.front_key, self.ready_key, self.backlog_key],
+            args=[time.time(), self.host_delay, count, self.backlog, self.back_prefix],
+        )
+        return [link.decode() if isinstance(link, bytes) else link for link in leased]
+
+    def size(self):
+        """
+        :return: Number of links waiting in the front queue and back queues.
+        """
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zcard(self.front_key)
+        pipe.get(self.backlog_key)
+        front, backlog = pipe.execute()
+        return front + int(backlog or 0)
@@ -0,0 +1,139 @@
+import asyncio
+import heapq
+import itertools
+from collections import deque
+from urllib.parse import urlparse
+
+
+class HostScheduler:
+    def __init__(self, concurrency=2, delay=0.5):
+        """
+        Hands links to crawler workers one host at a time, keeping each host within its politeness limits.
+        A worker always gets the link of the host that is ready soonest, so a slow host only holds up its own links.
+        Must be used from a single event loop.
+        :param concurrency: Most requests in flight to one host.
+        :param delay: Seconds between the start of two requests to one host.
+        """
+        self.concurrency = concurrency
+        self.delay = delay
+        self.pending = {}
+        self.active = {}
+        self.ready_at = {}
+        # heap of (ready time, host) for idle hosts whose delay was still running when they were forgotten.
+        self.expiring = []
+        # heap of (ready time, tiebreak, host) for hosts with pending links and a free slot.
+        self.heap = []
+        self.scheduled = set()
+        self.counter = itertools.count()
+        # links added but not yet acquired.
+        self.size = 0
+        self.condition = asyncio.Condition()
+        self.closed = False
+
+    def _schedule(self, host):
+        """
+        Put a host in the heap if it has work and room for another request.
+        :param host: Host to check.
+        """
+        if host in self.scheduled:
+            return
+        if not self.pending.get(host) or self.active.get(host, 0) >= self.concurrency:
+            return
+        heapq.heappush(self.heap, (self.ready_at.get(host, 0), next(self.counter), host))
+        self.scheduled.add(host)
+
+    def _expire(self, now):
+        """
+        Forget the delays of idle hosts that have run out.
+        :param now: Current loop time.
+        """
+        while self.expiring and self.expiring[0][0] <= now:
+            ready, host = heapq.heappop(self.expiring)
+            # a host visited again since has its own entry, or is busy again.
+            if host not in self.pending and self.ready_at.get(host) == ready:
+                del self.ready_at[host]
+
+    async def _notify(self):
+        async with self.condition:
+            self.condition.notify_all()
+
+    async def add(self, link):
+        """
+        Queue a link behind the other links of its host.
+        :param link: Link to visit.
+        """
+        host = urlparse(link).netloc
+        self.pending.setdefault(host, deque()).append(link)
+        self.size += 1
+        self._schedule(host)
+        await self._notify()
+
+    async def acquire(self, timeout=None):
+        """
+        Wait for the next link whose host may be visited now.
+        :param timeout: Seconds to wait, None waits until woken.
+        :return: A link, or None if nothing became ready in time or the scheduler was closed.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        async with self.condition:
+            while not self.closed:
+                now = loop.time()
+                self._expire(now)
+                if self.heap and self.heap[0][0] <= now:
+                    _, _, host = heapq.heappop(self.heap)
+                    self.scheduled.discard(host)
+                    link = self.pending[host].popleft()
+                    self.size -= 1
+                    self.active[host] = self.active.get(host, 0) + 1
+                    self.ready_at[host] = now + self.delay
+                    self._schedule(host)
+                    return link
+
+                # sleep until the earliest host is ready, a link is added or a slot frees up.
+                wait = self.heap[0][0] - now if self.heap else None
+                if deadline is not None:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        return None
+                    wait = remaining if wait is None else min(wait, remaining)
+                try:
+                    await asyncio.wait_for(self.condition.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        return None
+
+    async def wait_for_room(self, limit):
+        """
+        Wait until fewer than limit links are waiting, so links beyond it stay upstream.
+        :param limit: Most links to hold.
+        """
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.closed or self.size < limit)
+
+    async def release(self, link):
+        """
+        Mark a request to a link's host as finished.
+        :param link: Link previously returned by acquire.
+        """
+        host = urlparse(link).netloc
+        self.active[host] -= 1
+        if not self.active[host] and not self.pending[host]:
+            # forget idle hosts, keeping only a still running delay.
+            del self.active[host]
+            del self.pending[host]
+            if self.ready_at[host] <= asyncio.get_running_loop().time():
+                del self.ready_at[host]
+            else:
+                heapq.heappush(self.expiring, (self.ready_at[host], host))
+        else:
+            self._schedule(host)
+        await self._notify()
+
+    async def close(self):
+        """
+        Stop handing out links and release every waiting worker.
+        """
+        self.closed = True
+        await self._notify()
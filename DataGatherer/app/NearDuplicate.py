@@ -0,0 +1,186 @@
+import hashlib
+import re
+import threading
+import time
+
+WORD = re.compile(r"\w+")
+# texts with fewer shingles than this get no signature, short texts would all collapse onto a few signatures.
+MIN_SHINGLES = 8
+
+# Look up a 64 bit SimHash in its LSH band buckets, add it if no close signature is found.
+# Signatures are 16 hex digits, compared a digit at a time so the script does not need the bit library.
+# KEYS: one bucket set per band, under one hash tag so they share a slot on a cluster.
+# ARGV: signature, largest Hamming distance of a duplicate.
+CHECK_SCRIPT = """
+local signature = ARGV[1]
+local threshold = tonumber(ARGV[2])
+
+local function xor_bits(a, b)
+    local count = 0
+    for i = 0, 3 do
+        local p = 2 ^ i
+        if math.floor(a / p) % 2 ~= math.floor(b / p) % 2 then
+            count = count + 1
+        end
+    end
+    return count
+end
+local distances = {}
+for a = 0, 15 do
+    for b = 0, 15 do
+        distances[a * 16 + b] = xor_bits(a, b)
+    end
+end
+
+local digits = {}
+for i = 1, 16 do
+    digits[i] = tonumber(string.sub(signature, i, i), 16)
+end
+
+for _, key in ipairs(KEYS) do
+    for _, member in ipairs(redis.call("SMEMBERS", key)) do
+        local distance = 0
+        for i = 1, 16 do
+            distance = distance + distances[digits[i] * 16 + tonumber(string.sub(member, i, i), 16)]
+            if distance > threshold then
+                break
+            end
+        end
+        if distance <= threshold then
+            return 1
+        end
+    end
+end
+
+for _, key in ipairs(KEYS) do
+    redis.call("SADD", key, signature)
+end
+return 0
+"""
+
+
+def simhash(text, shingle=3, min_shingles=MIN_SHINGLES):
+    """
+    64 bit SimHash of a text over word shingles. Similar texts get signatures a few bits apart.
+    :param text: Page text.
+    :param shingle: Words per feature.
+    :param min_shingles: Fewest shingles a text needs for a signature.
+    :return: Signature as an int, None for texts too short to tell apart.
+    """
+    words = WORD.findall(text.lower())
+    features = [" ".join(words[i:i + shingle]) for i in range(len(words) - shingle + 1)]
+    if len(features) < min_shingles:
+        return None
+
+    hashes = [
+        format(int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big"), "064b")
+        for feature in features
+    ]
+    # each bit is set when most features set it, counted a whole bit column at a time.
+    half = len(hashes) / 2
+    return int("".join("1" if column.count("1") > half else "0" for column in zip(*hashes)), 2)
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class NearDuplicateFilter:
+    def __init__(self, redis_client, in_queue, out_queue, sync_period=1, distance=3, bands=4, batch_size=64,
+                 prefix="near_dup"):
+        """
+        Pipeline stage between the Crawler and link_text that drops pages nearly identical to one already kept.
+        Signatures are split into bands, any two within distance share a band when bands > distance,
+        so only the buckets of those bands have to be compared.
+        :param redis_client: Redis client instance.
+        :param in_queue: Channel of link, text, signature tuples from the Crawler, pages without a signature are kept.
+        :param out_queue: Channel of link, text pairs that are kept.
+        :param sync_period: Time to wait for pages.
+        :param distance: Largest Hamming distance between signatures of near duplicates.
+        :param bands: Number of LSH bands the 64 bit signature is split into.
+        :param batch_size: Most pages checked in one Redis round trip.
+        :param prefix: Key prefix of the band buckets, used as their hash tag.
+        """
+        if bands <= distance:
+            raise ValueError("bands must be larger than distance for every near duplicate to share a band.")
+        self.redis_client = redis_client
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.sync_period = sync_period
+        self.distance = distance
+        self.bands = bands
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.script = redis_client.register_script(CHECK_SCRIPT)
+        self.checked = 0
+        self.dropped = 0
+        self.seconds = 0
+        self.running = False
+        self.thread = None
+
+    def band_keys(self, signature):
+        """
+        :param signature: 64 bit SimHash.
+        :return: Redis bucket key of each band.
+        """
+        width = 64 // self.bands
+        mask = (1 << width) - 1
+        tag = "{" + self.prefix + "}"
+        return [f"{tag}:{band}:{(signature >> (band * width)) & mask}" for band in range(self.bands)]
+
+    def check(self, pages):
+        """
+        Keep the pages that are not near duplicates, checking all of them in one round trip.
+        Pages are checked in order, so a near duplicate within the same batch is caught too.
+        Pages too short for a signature are always kept.
+        :param pages: List of link, text, signature tuples.
+        :return: List of link, text pairs to keep.
+        """
+        start = time.perf_counter()
+        pipe = self.redis_client.pipeline(transaction=False)
+        for _, _, signature in pages:
+            if signature is not None:
+                self.script(keys=self.band_keys(signature), args=[f"{signature:016x}", self.distance], client=pipe)
+        duplicates = iter(pipe.execute())
+        kept = [(link, text) for link, text, signature in pages if signature is None or not next(duplicates)]
+
+        self.checked += len(pages)
+        self.dropped += len(pages) - len(kept)
+        self.seconds += time.perf_counter() - start
+        return kept
+
+    def sync(self):
+        while self.running:
+            # pages wait in in_queue while out_queue is pressured, which in turn slows the crawler.
+            if not self.out_queue.block_for_room(self.sync_period):
+                continue
+            pages = self.in_queue.get_batch(self.batch_size, timeout=self.sync_period)
+            if not pages:
+                continue
+            try:
+                self.out_queue.put_many(self.check(pages))
+            except Exception as e:
+                # let the pages through rather than lose them.
+                print("Error checking near duplicates:", e)
+                self.out_queue.put_many((link, text) for link, text, _ in pages)
+
+    def report(self):
+        """
+        Print the duplicate rate and Redis cost per page.
+        """
+        if not self.checked:
+            return
+        print(f"Near duplicates: {self.dropped}/{self.checked} pages dropped "
+              f"({self.dropped / self.checked:.1%}), {self.seconds / self.checked * 1000:.2f} ms per page.")
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.sync, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.report()
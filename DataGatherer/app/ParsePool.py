@@ -0,0 +1,78 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+try:
+    from Parsers import get_parser
+    from NearDuplicate import simhash
+except ImportError:
+    from DataGatherer.app.Parsers import get_parser
+    from DataGatherer.app.NearDuplicate import simhash
+
+# one parser per worker process, built on first use.
+_parsers = {}
+
+
+def parse_page(link, html, parser_name="html.parser", fingerprint=False):
+    """
+    Turn a fetched page into its text and the links it contains.
+    Module level so it can be sent to worker processes.
+    :param link: Link the page was fetched from.
+    :param html: Raw page body.
+    :param parser_name: Parser backend to use.
+    :param fingerprint: Also compute the SimHash of the text.
+    :return: Tuple of page text, list of full links and SimHash or None.
+    """
+    if parser_name not in _parsers:
+        _parsers[parser_name] = get_parser(parser_name)
+    text, links = _parsers[parser_name].parse(link, html)
+    return text, links, simhash(text) if fingerprint else None
+
+
+class ParsePool:
+    def __init__(self, size, parser="html.parser", fingerprint=False):
+        """
+        Parse stage that keeps HTML parsing off the event loop.
+        Fetching and parsing then scale separately: workers fetch, the pool uses the cores.
+        Parsers that release the GIL run in threads, the rest in processes.
+        :param size: Number of parse workers, 0 parses directly on the event loop.
+        :param parser: Parser backend name.
+        :param fingerprint: Also compute a SimHash of each page for near duplicate detection.
+        """
+        self.size = size
+        self.parser = parser
+        self.fingerprint = fingerprint
+        self.use_threads = get_parser(parser).releases_gil
+        self.executor = None
+
+    def start(self):
+        """
+        Start the worker pool.
+        """
+        if self.executor or self.size <= 0:
+            return
+        if self.use_threads:
+            self.executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="parser")
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=self.size)
+
+    async def stop(self):
+        """
+        Stop the pool once the pages already handed over are parsed.
+        The shutdown waits in a thread, so the event loop keeps running meanwhile.
+        """
+        if self.executor:
+            executor = self.executor
+            self.executor = None
+            await asyncio.to_thread(executor.shutdown, wait=True)
+
+    async def parse(self, link, html):
+        """
+        Parse a page in the pool.
+        :param link: Link the page was fetched from.
+        :param html: Raw page body.
+        :return: Tuple of page text, list of full links and SimHash or None.
+        """
+        if not self.executor:
+            return parse_page(link, html, self.parser, self.fingerprint)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, parse_page, link, html, self.parser, self.fingerprint)
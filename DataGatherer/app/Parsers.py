@@ -0,0 +1,104 @@
+from bs4 import BeautifulSoup
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxTree
+except ImportError:
+    SelectolaxTree = None
+
+
+class HtmlParser:
+    """
+    Backend that turns a page into its visible text and raw anchor hrefs.
+    Subclasses only implement extract, link resolution is shared so every backend agrees on it.
+    """
+    name = None
+    # parsing happens in C with the GIL released, so a thread pool is enough.
+    releases_gil = False
+
+    def extract(self, html):
+        """
+        :param html: Raw page body.
+        :return: Tuple of page text and list of href values.
+        """
+        raise NotImplementedError
+
+    def parse(self, link, html):
+        """
+        Turn a fetched page into its text and the links it contains.
+        :param link: Link the page was fetched from.
+        :param html: Raw page body.
+        :return: Tuple of page text and list of full links.
+        """
+        text, hrefs = self.extract(html)
+
+        # combine this with each tag content to form the full link.
+        # we do not have a browser this time.
+        base_url = f"{urlparse(link).scheme}://{urlparse(link).netloc}"
+        return text, [urljoin(base_url, href) for href in hrefs]
+
+
+class SoupParser(HtmlParser):
+    name = "html.parser"
+
+    def extract(self, html):
+        soup = BeautifulSoup(html, "html.parser")
+        text = soup.get_text(separator=" ", strip=True)
+        return text, [found_link["href"] for found_link in soup.find_all("a", href=True)]
+
+
+class LxmlParser(HtmlParser):
+    name = "lxml"
+    releases_gil = True
+
+    def __init__(self):
+        if lxml is None:
+            raise ImportError("lxml parser backend requires the lxml package.")
+
+    def extract(self, html):
+        if not html.strip():
+            return "", []
+        document = lxml.html.document_fromstring(html)
+        strings = document.xpath("//text()[not(ancestor::script or ancestor::style or ancestor::template)]")
+        text = " ".join(stripped for stripped in (string.strip() for string in strings) if stripped)
+        return text, document.xpath("//a/@href")
+
+
+class SelectolaxParser(HtmlParser):
+    name = "selectolax"
+
+    def __init__(self):
+        if SelectolaxTree is None:
+            raise ImportError("selectolax parser backend requires the selectolax package.")
+
+    def extract(self, html):
+        tree = SelectolaxTree(html)
+        tree.strip_tags(["script", "style", "template"])
+        root = tree.root
+        if root is None:
+            return "", []
+        # split on a control character so empty nodes between tags can be dropped.
+        strings = root.text(separator="\x1f", strip=True).split("\x1f")
+        text = " ".join(string for string in strings if string)
+        hrefs = [node.attributes["href"] for node in tree.css("a[href]")]
+        return text, [href for href in hrefs if href is not None]
+
+
+PARSERS = {parser.name: parser for parser in (SoupParser, LxmlParser, SelectolaxParser)}
+
+
+def get_parser(name):
+    """
+    Build a parser backend by name.
+    :param name: One of PARSERS.
+    :return: HtmlParser instance.
+    """
+    if name not in PARSERS:
+        raise ValueError(f"Unknown parser backend {name}, choose from {', '.join(PARSERS)}.")
+    return PARSERS[name]()
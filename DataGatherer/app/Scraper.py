@@ -11,7 +11,7 @@ from queue import Empty
 from utils import push_list
 
 class Scraper:
-    def __init__(self, name, lock, flags, in_queue, texts_queue, validate_queue, timeout=1):
+    def __init__(self, name, lock, flags, in_queue, texts_queue, validate_queue, timeout=1, parser=None):
         """
         Create Scraper instance that has 1 thread.
 
@@ -22,6 +22,7 @@ class Scraper:
         :param texts_queue: Output queue for text.
         :param validate_queue: Output queue of raw links.
         :param timeout: Seconds to wait.
+        :param parser: HtmlParser backend to read the page source with, uses the browser's own text if None.
         """
         self.name = name
         self.toggle_lock = lock  # lock for scrapers
@@ -30,6 +31,7 @@ class Scraper:
         self.texts_queue = texts_queue
         self.validate_queue = validate_queue
         self.timeout = timeout
+        self.parser = parser
         self.operating = False
         self.browser = None
         self.browser = self._init_browser()
@@ -76,6 +78,10 @@ class Scraper:
         """
         self.browser.get(url)
         WebDriverWait(self.browser, self.timeout).until(ec.presence_of_element_located((By.TAG_NAME, "body")))
+        if self.parser:
+            text, found_links = self.parser.parse(url, self.browser.page_source)
+            self.report(f"Got page {url}")
+            return text, found_links
         try:
             text = self.browser.find_element(By.TAG_NAME, "body").text
             a_tags = self.browser.find_elements(By.TAG_NAME, 'a')
@@ -0,0 +1,309 @@
+import hashlib
+import json
+
+# Shared end of the seen set scripts. enqueue holds score, payload pairs of the new links: a "list" kind pushes the payloads
+# to the end of the KEYS[2] list, a "zset" kind adds them to the KEYS[2] sorted set unless already there.
+ENQUEUE_TAIL = """
+if KEYS[2] and #enqueue > 0 then
+    if kind == "zset" then
+        redis.call("ZADD", KEYS[2], "NX", unpack(enqueue))
+    else
+        local payloads = {}
+        for i = 2, #enqueue, 2 do
+            table.insert(payloads, enqueue[i])
+        end
+        redis.call("RPUSH", KEYS[2], unpack(payloads))
+    end
+end
+"""
+
+# Scalable Bloom filter over Redis bitmaps. Each layer is a bitmap at KEYS[1]:<layer>, its sizes live in the
+# KEYS[1] hash. A full layer gets a larger successor with a tighter error rate, so the total error stays bounded.
+# Layer keys are named in the script, so KEYS[1] must be a hash tag for them to share its slot on a cluster.
+# ARGV: capacity, error rate, growth, tightening, enqueue kind, then two 32 bit hashes, a payload and a score per link.
+# New links' payloads are enqueued to KEYS[2] when given. Returns 1 per new link.
+BLOOM_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local error_rate = tonumber(ARGV[2])
+local growth = tonumber(ARGV[3])
+local tightening = tonumber(ARGV[4])
+local kind = ARGV[5]
+local meta = KEYS[1]
+
+local layers = tonumber(redis.call("HGET", meta, "layers") or "0")
+local m, k, cap, n = {}, {}, {}, {}
+
+local function load(i)
+    local fields = redis.call("HMGET", meta, "m:" .. i, "k:" .. i, "cap:" .. i, "n:" .. i)
+    m[i], k[i], cap[i], n[i] = tonumber(fields[1]), tonumber(fields[2]), tonumber(fields[3]), tonumber(fields[4])
+end
+
+local function add_layer()
+    local i = layers
+    local layer_cap = math.ceil(capacity * growth ^ i)
+    local layer_error = error_rate * tightening ^ i
+    local bits = math.ceil(-layer_cap * math.log(layer_error) / (math.log(2) ^ 2))
+    local hashes = math.max(1, math.floor(bits / layer_cap * math.log(2) + 0.5))
+    redis.call("HSET", meta, "m:" .. i, bits, "k:" .. i, hashes, "cap:" .. i, layer_cap, "n:" .. i, 0)
+    layers = layers + 1
+    redis.call("HSET", meta, "layers", layers)
+    m[i], k[i], cap[i], n[i] = bits, hashes, layer_cap, 0
+end
+
+for i = 0, layers - 1 do
+    load(i)
+end
+if layers == 0 then
+    add_layer()
+end
+
+local result = {}
+local enqueue = {}
+for j = 6, #ARGV, 4 do
+    local h1, h2 = tonumber(ARGV[j]), tonumber(ARGV[j + 1])
+    local seen = false
+    for i = 0, layers - 1 do
+        local all = true
+        for x = 0, k[i] - 1 do
+            if redis.call("GETBIT", meta .. ":" .. i, (h1 + x * h2) % m[i]) == 0 then
+                all = false
+                break
+            end
+        end
+        if all then
+            seen = true
+            break
+        end
+    end
+
+    if seen then
+        table.insert(result, 0)
+    else
+        local last = layers - 1
+        for x = 0, k[last] - 1 do
+            redis.call("SETBIT", meta .. ":" .. last, (h1 + x * h2) % m[last], 1)
+        end
+        n[last] = n[last] + 1
+        redis.call("HSET", meta, "n:" .. last, n[last])
+        if n[last] >= cap[last] then
+            add_layer()
+        end
+        table.insert(result, 1)
+        table.insert(enqueue, ARGV[j + 3])
+        table.insert(enqueue, ARGV[j + 2])
+    end
+end
+""" + ENQUEUE_TAIL + """
+return result
+"""
+
+# Exact set check-and-add. ARGV: enqueue kind, then member, payload and score per link.
+# New links' payloads are enqueued to KEYS[2] when given.
+EXACT_SCRIPT = """
+local kind = ARGV[1]
+local result = {}
+local enqueue = {}
+for j = 2, #ARGV, 3 do
+    local added = redis.call("SADD", KEYS[1], ARGV[j])
+    table.insert(result, added)
+    if added == 1 then
+        table.insert(enqueue, ARGV[j + 2])
+        table.insert(enqueue, ARGV[j + 1])
+    end
+end
+""" + ENQUEUE_TAIL + """
+return result
+"""
+
+# RedisBloom check-and-add, so new links are enqueued in the same step. ARGV: enqueue kind, then link, payload
+# and score per link.
+REDISBLOOM_SCRIPT = """
+local kind = ARGV[1]
+local links = {}
+for j = 2, #ARGV, 3 do
+    table.insert(links, ARGV[j])
+end
+local result = redis.call("BF.MADD", KEYS[1], unpack(links))
+local enqueue = {}
+for i, added in ipairs(result) do
+    if added == 1 then
+        local j = 3 * i - 1
+        table.insert(enqueue, ARGV[j + 2])
+        table.insert(enqueue, ARGV[j + 1])
+    end
+end
+""" + ENQUEUE_TAIL + """
+return result
+"""
+
+
+def enqueue_args(link, enqueue_key, encode, score):
+    """
+    Payload and score of a link for the scripts' enqueue step.
+    :return: Tuple of payload and score, blank when nothing is enqueued.
+    """
+    if not enqueue_key:
+        return "", 0
+    if score:
+        return link, score(link)
+    return encode(link), 0
+
+
+def link_hashes(link):
+    """
+    Two independent 32 bit hashes of a link, used for double hashing into every Bloom layer.
+    :param link: Link to hash.
+    :return: Tuple of two ints, the second is odd so it never collapses to one bit.
+    """
+    digest = hashlib.blake2b(link.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest[:4], "little"), int.from_bytes(digest[4:], "little") | 1
+
+
+class ExactSeenSet:
+    def __init__(self, redis_client, key="seen_links:set"):
+        """
+        Every seen link stored as a JSON string in a Redis set. Exact, but grows with every link.
+        :param redis_client: Redis client instance.
+        :param key: Redis set key.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self.script = redis_client.register_script(EXACT_SCRIPT)
+
+    def add_new(self, links, enqueue_key=None, encode=json.dumps, score=None):
+        """
+        Mark links as seen in one atomic step, safe with many validators at once.
+        :param links: List of links.
+        :param enqueue_key: Redis list the new links are pushed to in the same step, if given.
+        :param encode: Turns a link into the item pushed to enqueue_key.
+        :param score: Scores a link, making enqueue_key a sorted set the plain new links are added to.
+        :return: The links that had not been seen before.
+        """
+        if not links:
+            return []
+        args = ["zset" if score else "list"]
+        for link in links:
+            args += (json.dumps(link), *enqueue_args(link, enqueue_key, encode, score))
+        keys = [self.key, enqueue_key] if enqueue_key else [self.key]
+        added = self.script(keys=keys, args=args)
+        return [link for link, new in zip(links, added) if new]
+
+    def memory_usage(self):
+        """
+        :return: Bytes of Redis memory used by the set.
+        """
+        return self.redis_client.memory_usage(self.key) or 0
+
+
+class BloomSeenSet:
+    def __init__(self, redis_client, key="seen_links:bloom", capacity=1000000, error_rate=0.001,
+                 growth=2, tightening=0.5):
+        """
+        Scalable Bloom filter kept in Redis bitmaps through a Lua script.
+        A few bytes per link instead of the whole link, at the cost of treating a small share of new links as seen.
+        The script names layer bitmaps itself, so the filter is kept at {key} and its layers at {key}:<layer>:
+        on Redis Cluster they all map to one slot, and the script only touches keys of that slot.
+        :param redis_client: Redis client instance.
+        :param key: Redis key of the filter, used as the hash tag of every layer.
+        :param capacity: Links the first layer holds before another layer is added.
+        :param error_rate: Chance a new link is reported as seen, for the first layer.
+        :param growth: Capacity multiplier of each new layer.
+        :param tightening: Error rate multiplier of each new layer, keeps the total error under error_rate / (1 - tightening).
+        """
+        self.redis_client = redis_client
+        self.key = "{" + key + "}"
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.script = redis_client.register_script(BLOOM_SCRIPT)
+
+    def add_new(self, links, enqueue_key=None, encode=json.dumps, score=None):
+        """
+        Mark links as seen in one atomic step, safe with many validators at once.
+        :param links: List of links.
+        :param enqueue_key: Redis list the new links are pushed to in the same step, if given.
+        :param encode: Turns a link into the item pushed to enqueue_key.
+        :param score: Scores a link, making enqueue_key a sorted set the plain new links are added to.
+        :return: The links that had not been seen before, give or take the error rate.
+        """
+        if not links:
+            return []
+        args = [self.capacity, self.error_rate, self.growth, self.tightening, "zset" if score else "list"]
+        for link in links:
+            args.extend(link_hashes(link))
+            args.extend(enqueue_args(link, enqueue_key, encode, score))
+        keys = [self.key, enqueue_key] if enqueue_key else [self.key]
+        added = self.script(keys=keys, args=args)
+        return [link for link, new in zip(links, added) if new]
+
+    def memory_usage(self):
+        """
+        :return: Bytes of Redis memory used by the filter layers.
+        """
+        layers = int(self.redis_client.hget(self.key, "layers") or 0)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for i in range(layers):
+            pipe.strlen(f"{self.key}:{i}")
+        return sum(pipe.execute())
+
+
+class RedisBloomSeenSet:
+    def __init__(self, redis_client, key="seen_links:bf", capacity=1000000, error_rate=0.001, growth=2):
+        """
+        Seen set on the RedisBloom module's scalable Bloom filter, for servers that load it.
+        :param redis_client: Redis client instance.
+        :param key: Redis key of the filter.
+        :param capacity: Links the first layer holds.
+        :param error_rate: Chance a new link is reported as seen.
+        :param growth: Capacity multiplier of each new layer.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        try:
+            redis_client.execute_command("BF.RESERVE", key, error_rate, capacity, "EXPANSION", growth)
+        except Exception as e:
+            # an existing filter keeps its settings.
+            if "exists" not in str(e):
+                raise
+        self.script = redis_client.register_script(REDISBLOOM_SCRIPT)
+
+    def add_new(self, links, enqueue_key=None, encode=json.dumps, score=None):
+        """
+        Mark links as seen in one atomic step. BF.MADD decides which links are new, so only one validator
+        ever enqueues a link.
+        :param links: List of links.
+        :param enqueue_key: Redis list the new links are pushed to in the same step, if given.
+        :param encode: Turns a link into the item pushed to enqueue_key.
+        :param score: Scores a link, making enqueue_key a sorted set the plain new links are added to.
+        :return: The links that had not been seen before, give or take the error rate.
+        """
+        if not links:
+            return []
+        args = ["zset" if score else "list"]
+        for link in links:
+            args += (link, *enqueue_args(link, enqueue_key, encode, score))
+        keys = [self.key, enqueue_key] if enqueue_key else [self.key]
+        added = self.script(keys=keys, args=args)
+        return [link for link, new in zip(links, added) if new]
+
+    def memory_usage(self):
+        return self.redis_client.memory_usage(self.key) or 0
+
+
+def make_seen_set(redis_client, kind="exact", capacity=1000000, error_rate=0.001):
+    """
+    Build a seen set by name.
+    :param redis_client: Redis client instance.
+    :param kind: "exact", "bloom" or "redisbloom".
+    :param capacity: Expected links, for the Bloom filters.
+    :param error_rate: Chance a new link is reported as seen, for the Bloom filters.
+    :return: Seen set.
+    """
+    if kind == "exact":
+        return ExactSeenSet(redis_client)
+    if kind == "bloom":
+        return BloomSeenSet(redis_client, capacity=capacity, error_rate=error_rate)
+    if kind == "redisbloom":
+        return RedisBloomSeenSet(redis_client, capacity=capacity, error_rate=error_rate)
+    raise ValueError(f"Unknown seen set {kind}.")
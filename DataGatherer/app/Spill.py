@@ -0,0 +1,59 @@
+import json
+import os
+import threading
+
+
+class Spill:
+    def __init__(self, path):
+        """
+        Append-only file of items put aside while a queue is overfull, read back in order once it has room.
+        Shared by every validator, the file is emptied whenever everything has been read back.
+        :param path: File to spill to, created when first needed.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.offset = 0
+        self.pending = 0
+        if os.path.exists(path):
+            # items spilled by an earlier run.
+            with open(path, "rb") as file:
+                self.pending = sum(1 for _ in file)
+
+    def __len__(self):
+        return self.pending
+
+    def write(self, items):
+        """
+        :param items: List of JSON compatible items.
+        """
+        if not items:
+            return
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.writelines(json.dumps(item) + "\n" for item in items)
+            self.pending += len(items)
+
+    def read(self, count):
+        """
+        Take back the oldest spilled items.
+        :param count: Most items to read.
+        :return: List of items.
+        """
+        with self.lock:
+            if not self.pending:
+                return []
+            items = []
+            with open(self.path, "r", encoding="utf-8") as file:
+                file.seek(self.offset)
+                while len(items) < count:
+                    line = file.readline()
+                    if not line:
+                        self.pending = len(items)
+                        break
+                    items.append(json.loads(line))
+                self.offset = file.tell()
+            self.pending -= len(items)
+            if not self.pending:
+                os.remove(self.path)
+                self.offset = 0
+            return items
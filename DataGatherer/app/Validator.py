@@ -2,8 +2,13 @@ import hashlib
 import json
 import time
 import redis
-from queue import Queue, Empty
 import threading
+from shared.utils.Codec import Codec
+
+try:
+    from SeenSet import ExactSeenSet
+except ImportError:
+    from DataGatherer.app.SeenSet import ExactSeenSet
 
 
 def hash_text(text):
@@ -16,37 +21,86 @@ def hash_text(text):
 
 
 class Validator:
-    def __init__(self, redis_client, queue, sync_period=1):
+    def __init__(self, redis_client, queue, sync_period=1, batch_size=256, frontier=None, seen_set=None,
+                 codec=None, overflow=None, spill=None):
         """
-        Initializes Syncer agent.
+        Initializes Validator agent, turning found links into target links.
 
         :param redis_client: redis_client client instance.
-        :param queue: Queue to take data out of.
+        :param queue: Channel to take data out of.
         :param sync_period: Time to wait between syncs.
+        :param batch_size: Most links taken off the channel at once.
+        :param frontier: Frontier that new links are added to, target_links:list if None.
+        :param seen_set: Set of links already seen, an exact set in seen_links:set if None.
+        :param codec: Codec of links pushed to target_links:list, plain JSON if None.
+        :param overflow: What happens to links over the queue's high water mark. None leaves them queued,
+            "shed" drops them, "spill" writes them to spill and reads them back once the queue has drained.
+        :param spill: Spill shared by the validators, needed for the "spill" overflow.
         """
+        if overflow not in (None, "shed", "spill"):
+            raise ValueError(f"Unknown overflow {overflow}.")
+        if overflow == "spill" and spill is None:
+            raise ValueError("Spill overflow needs a spill.")
         self.redis_client = redis_client
         self.queue = queue
         self.sync_period = sync_period
+        self.batch_size = batch_size
+        self.frontier = frontier
+        self.seen_set = seen_set or ExactSeenSet(redis_client)
+        self.codec = codec or Codec()
+        self.overflow = overflow
+        self.spill = spill
+        self.shed = 0
+        self.spilled = 0
         self.running = False
         self.thread = None
 
     def sync(self):
         while self.running:
-            try:
-                link = self.queue.get(self.sync_period)
-            except Empty:
-                continue
+            if self.overflow:
+                self.relieve()
+            # blocks until links arrive, then takes everything up to the batch size.
+            links = self.queue.get_batch(self.batch_size, timeout=self.sync_period)
+            if links:
+                self.validate(links)
+
+    def relieve(self):
+        """
+        Bring a pressured queue back down to its low water mark by shedding or spilling the excess,
+        and read spilled links back once the queue is below low water.
+        """
+        if self.queue.pressured:
+            excess = self.queue.get_batch(max(0, self.queue.qsize() - self.queue.low_water))
+            if self.overflow == "spill":
+                self.spill.write(excess)
+                self.spilled += len(excess)
+            else:
+                self.shed += len(excess)
+        elif self.spill and len(self.spill) and self.queue.qsize() < self.queue.low_water:
+            self.queue.put_many(self.spill.read(self.queue.low_water - self.queue.qsize()))
 
-            if not link:
-                continue
+    def validate(self, links):
+        """
+        Enqueue the links never seen before, in one round trip for the whole batch.
+        The seen check, seen add and enqueue are a single atomic step, so validators can run side by side.
+        :param links: List of found links.
+        """
+        # pages repeat their navigation links, so most duplicates never reach Redis.
+        links = list(dict.fromkeys(link for link in links if link and link.strip()))
+        if not links:
+            return
 
-            try:
-                if link.strip() and not self.redis_client.sismember("seen_links:set", json.dumps(link)):
-                    self.redis_client.sadd("seen_links:set", json.dumps(link))
-                    self.redis_client.rpush("target_links:list", json.dumps(link))
+        try:
+            if self.frontier:
+                # seen and queued in one step, a failure in between would lose the links for good.
+                new = self.seen_set.add_new(links, enqueue_key=self.frontier.front_key, score=self.frontier.score)
+                new_set = set(new)
+                self.frontier.bump([link for link in links if link not in new_set])
+            else:
+                self.seen_set.add_new(links, enqueue_key="target_links:list", encode=self.codec.encode)
 
-            except Exception as e:
-                print("Error processing:", e)
+        except Exception as e:
+            print("Error processing:", e)
 
     def start(self):
         if not self.running:
@@ -0,0 +1,67 @@
+import argparse
+import os
+import time
+
+from DataGatherer.app.Parsers import get_parser
+from shared.utils.Codec import Codec
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "corpus")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bytes stored and encode/decode cost per page for each codec.")
+    parser.add_argument("--corpus", type=str, default=CORPUS, help="Directory of .html pages.")
+    parser.add_argument("--rounds", type=int, default=200, help="Times each page is encoded and decoded.")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Copies of each page's text joined together, to reach article sized pages with the "
+                             "small test corpus. Repeated text compresses better than real pages.")
+    parser.add_argument("--threshold", type=int, default=1024, help="Smallest item in bytes that is compressed.")
+    return parser.parse_args()
+
+
+def load_items(corpus, repeat):
+    """
+    The link, text pairs the Crawler pushes to link_text for each page of the corpus.
+    """
+    parser = get_parser("html.parser")
+    items = []
+    for name in sorted(os.listdir(corpus)):
+        if name.endswith(".html"):
+            with open(os.path.join(corpus, name), encoding="utf-8", errors="replace") as file:
+                text, _ = parser.parse("https://en.wikipedia.org/wiki/Main_Page", file.read())
+            items.append(("https://en.wikipedia.org/wiki/" + name[:-5], " ".join([text] * repeat)))
+    return items
+
+
+def run():
+    args = parse_args()
+    items = load_items(args.corpus, args.repeat)
+    codecs = [
+        ("json", Codec()),
+        ("msgpack", Codec("msgpack")),
+        ("msgpack+zstd", Codec("msgpack", "zstd", threshold=args.threshold)),
+        ("msgpack+lz4", Codec("msgpack", "lz4", threshold=args.threshold)),
+    ]
+    print(f"{len(items)} pages")
+
+    for name, codec in codecs:
+        encoded = [codec.encode(item) for item in items]
+        size = sum(len(data) for data in encoded) / len(items)
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for item in items:
+                codec.encode(item)
+        encode = (time.perf_counter() - start) / (args.rounds * len(items))
+
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for data in encoded:
+                codec.decode(data)
+        decode = (time.perf_counter() - start) / (args.rounds * len(items))
+
+        print(f"{name:>13}: {size:8.0f} bytes/page, encode {encode * 1e6:7.1f} us, decode {decode * 1e6:7.1f} us")
+
+
+if __name__ == "__main__":
+    run()
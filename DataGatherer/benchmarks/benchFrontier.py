@@ -0,0 +1,77 @@
+import argparse
+import random
+import time
+import redis
+
+from DataGatherer.app.Frontier import Frontier
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lease throughput of the Redis frontier with many hosts.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--hosts", type=int, default=1000, help="Number of distinct hosts.")
+    parser.add_argument("--links", type=int, default=20000, help="Number of links.")
+    parser.add_argument("--batch", type=int, default=12, help="Links per lease, like --scrapers.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def make_links(hosts, count):
+    rng = random.Random(0)
+    return [f"https://host{rng.randrange(hosts)}.com/{'/'.join(str(rng.randrange(9)) for _ in range(rng.randrange(4)))}/{i}"
+            for i in range(count)]
+
+
+def bench_list(client, links, batch):
+    """
+    Current path: RPUSH to target_links:list, LPOP item by item.
+    """
+    client.flushdb()
+    start = time.perf_counter()
+    for i in range(0, len(links), 256):
+        client.rpush("target_links:list", *links[i:i + 256])
+    added = time.perf_counter()
+    taken = 0
+    while True:
+        got = [link for link in (client.lpop("target_links:list") for _ in range(batch)) if link]
+        taken += len(got)
+        if len(got) < batch:
+            break
+    return added - start, time.perf_counter() - added, taken
+
+
+def bench_frontier(client, links, batch):
+    client.flushdb()
+    frontier = Frontier(client, host_delay=0)
+    start = time.perf_counter()
+    for i in range(0, len(links), 256):
+        frontier.add(links[i:i + 256])
+    added = time.perf_counter()
+    taken = 0
+    while frontier.size():
+        taken += len(frontier.lease(batch))
+    return added - start, time.perf_counter() - added, taken
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+    links = make_links(args.hosts, args.links)
+    print(f"{args.links} links over {args.hosts} hosts, {args.batch} links per lease")
+
+    for name, bench in (("list", bench_list), ("frontier", bench_frontier)):
+        add_time, lease_time, taken = bench(client, links, args.batch)
+        print(f"{name:>9}: add {len(links) / add_time:10.0f} links/sec  "
+              f"lease {taken / lease_time:10.0f} links/sec  ({taken} leased)")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
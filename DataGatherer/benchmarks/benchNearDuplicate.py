@@ -0,0 +1,80 @@
+import argparse
+import random
+import time
+import redis
+
+from DataGatherer.app.Channel import Channel
+from DataGatherer.app.NearDuplicate import NearDuplicateFilter, simhash
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Duplicate rate and per page cost of near duplicate detection.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of distinct pages.")
+    parser.add_argument("--words", type=int, default=800, help="Words per page.")
+    parser.add_argument("--copies", type=float, default=0.3, help="Share of extra pages that are altered copies.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def make_corpus(pages, words, copies):
+    """
+    Distinct pages plus copies that differ the way mirrors and printable versions do.
+    :return: List of link, text pairs and the number of copies among them.
+    """
+    rng = random.Random(0)
+    vocabulary = [f"word{i}" for i in range(20000)]
+    originals = [(f"https://site{i % 50}.org/page/{i}", " ".join(rng.choices(vocabulary, k=words)))
+                 for i in range(pages)]
+
+    altered = []
+    for i in range(int(pages * copies)):
+        link, text = rng.choice(originals)
+        kind = i % 3
+        if kind == 0:
+            text = f"{text} Retrieved {rng.randrange(1, 28)} October 2026 at {rng.randrange(24)}:00."
+        elif kind == 1:
+            text = f"Printable version {text} Navigation Main page Contents"
+        else:
+            words_list = text.split()
+            words_list[rng.randrange(len(words_list))] = "edited"
+            text = " ".join(words_list)
+        altered.append((f"https://mirror{i}.org{link[link.index('/page'):]}", text))
+
+    corpus = originals + altered
+    rng.shuffle(corpus)
+    return corpus, len(altered)
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+    client.flushdb()
+    corpus, copies = make_corpus(args.pages, args.words, args.copies)
+
+    start = time.perf_counter()
+    pages = [(link, text, simhash(text)) for link, text in corpus]
+    hash_time = (time.perf_counter() - start) / len(corpus)
+
+    near_filter = NearDuplicateFilter(client, Channel(), Channel())
+    kept = []
+    for i in range(0, len(pages), near_filter.batch_size):
+        kept += near_filter.check(pages[i:i + near_filter.batch_size])
+
+    print(f"{len(corpus)} pages of {args.words} words, {copies} altered copies")
+    print(f"dropped {near_filter.dropped} ({near_filter.dropped / len(corpus):.1%} of pages, "
+          f"{near_filter.dropped / max(copies, 1):.1%} of copies)")
+    print(f"simhash {hash_time * 1000:.2f} ms per page, "
+          f"redis check {near_filter.seconds / near_filter.checked * 1000:.2f} ms per page")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,59 @@
+import argparse
+import os
+import time
+
+from DataGatherer.app.Parsers import PARSERS, get_parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "corpus")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pages per second for each HTML parser backend.")
+    parser.add_argument("--corpus", type=str, default=CORPUS, help="Directory of .html pages.")
+    parser.add_argument("--seconds", type=float, default=3, help="Time spent on each backend.")
+    return parser.parse_args()
+
+
+def load_pages(corpus):
+    pages = []
+    for name in sorted(os.listdir(corpus)):
+        if name.endswith(".html"):
+            with open(os.path.join(corpus, name), encoding="utf-8", errors="replace") as file:
+                pages.append(file.read())
+    return pages
+
+
+def bench(parser, pages, seconds):
+    """
+    Parse the corpus in a loop for a fixed time.
+    :return: Pages per second.
+    """
+    parsed = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for html in pages:
+            parser.parse("https://en.wikipedia.org/wiki/Main_Page", html)
+        parsed += len(pages)
+    return parsed / (time.perf_counter() - start)
+
+
+def run():
+    args = parse_args()
+    pages = load_pages(args.corpus)
+    size = sum(len(page) for page in pages)
+    print(f"{len(pages)} pages, {size / len(pages) / 1024:.1f} KiB average")
+
+    baseline = None
+    for name in PARSERS:
+        try:
+            parser = get_parser(name)
+        except ImportError as e:
+            print(f"{name:>12}: skipped ({e})")
+            continue
+        rate = bench(parser, pages, args.seconds)
+        baseline = baseline or rate
+        print(f"{name:>12}: {rate:10.1f} pages/sec  {rate / baseline:5.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,65 @@
+import argparse
+import time
+import redis
+
+from DataGatherer.app.SeenSet import ExactSeenSet, BloomSeenSet
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory and throughput of the exact and Bloom seen sets.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--links", type=int, default=100000, help="Number of distinct links.")
+    parser.add_argument("--batch", type=int, default=256, help="Links per call.")
+    parser.add_argument("--error", type=float, default=0.001, help="Bloom filter error rate.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def bench(seen_set, links, batch):
+    """
+    Add every link, then add them all again.
+    :return: Links per second, share of new links wrongly reported as seen.
+    """
+    start = time.perf_counter()
+    new = 0
+    for i in range(0, len(links), batch):
+        new += len(seen_set.add_new(links[i:i + batch]))
+    for i in range(0, len(links), batch):
+        seen_set.add_new(links[i:i + batch])
+    rate = 2 * len(links) / (time.perf_counter() - start)
+    return rate, 1 - new / len(links)
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+    client.flushdb()
+    links = [f"https://en.wikipedia.org/wiki/Article_{i}_{i * 7919 % 104729}" for i in range(args.links)]
+    raw = sum(len(link) for link in links)
+    print(f"{args.links} links, {raw / 1024 / 1024:.1f} MiB of raw link text")
+
+    for name, seen_set in (
+        ("exact", ExactSeenSet(client)),
+        # sized for a tenth of the links, so the filter has to grow.
+        ("bloom", BloomSeenSet(client, capacity=max(args.links // 10, 1), error_rate=args.error)),
+    ):
+        rate, false_positives = bench(seen_set, links, args.batch)
+        try:
+            memory = f"{seen_set.memory_usage() / 1024 / 1024:8.2f} MiB"
+        except redis.exceptions.ResponseError:
+            # no MEMORY USAGE (fakeredis), the stored members are a lower bound.
+            stored = sum(len(member) for member in client.sscan_iter(seen_set.key))
+            memory = f">={stored / 1024 / 1024:6.2f} MiB"
+        print(f"{name:>6}: {rate:10.0f} links/sec  memory {memory}  false positives {false_positives:.4%}")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,66 @@
+import argparse
+import json
+import random
+import time
+import redis
+
+from DataGatherer.app.SeenSet import ExactSeenSet
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Links/sec of per-link and batched link validation.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--links", type=int, default=50000, help="Number of found links.")
+    parser.add_argument("--unique", type=float, default=0.3, help="Share of found links that are distinct.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def per_link(client, links):
+    """
+    The original path: SISMEMBER, SADD and RPUSH round trips for each link.
+    """
+    for link in links:
+        if link.strip() and not client.sismember("seen_links:set", json.dumps(link)):
+            client.sadd("seen_links:set", json.dumps(link))
+            client.rpush("target_links:list", json.dumps(link))
+
+
+def batched(client, links, batch):
+    seen_set = ExactSeenSet(client)
+    for i in range(0, len(links), batch):
+        unique = list(dict.fromkeys(links[i:i + batch]))
+        seen_set.add_new(unique, enqueue_key="target_links:list")
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+    rng = random.Random(0)
+    distinct = [f"https://en.wikipedia.org/wiki/Article_{i}" for i in range(int(args.links * args.unique))]
+    links = [rng.choice(distinct) for _ in range(args.links)]
+    print(f"{len(links)} found links, {len(set(links))} distinct")
+
+    runs = [("per link", lambda: per_link(client, links))]
+    for batch in (16, 64, 256, 1024):
+        runs.append((f"batch {batch}", lambda batch=batch: batched(client, links, batch)))
+
+    for name, action in runs:
+        client.flushdb()
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        enqueued = client.llen("target_links:list")
+        print(f"{name:>10}: {len(links) / elapsed:10.0f} links/sec  ({enqueued} enqueued)")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
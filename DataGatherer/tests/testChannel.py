@@ -0,0 +1,111 @@
+import pytest
+import asyncio
+import threading
+from queue import Empty
+
+from DataGatherer.app.Channel import Channel
+
+
+@pytest.mark.asyncio
+async def test_get_wakes_on_put_from_thread():
+    channel = Channel()
+    waiter = asyncio.create_task(channel.get(timeout=5))
+    await asyncio.sleep(0.01)
+
+    threading.Thread(target=channel.put, args=("https://example.com",)).start()
+
+    assert await waiter == "https://example.com"
+
+
+@pytest.mark.asyncio
+async def test_get_times_out_and_wake_all_releases():
+    channel = Channel()
+    with pytest.raises(Empty):
+        await channel.get(timeout=0.01)
+
+    waiters = [asyncio.create_task(channel.get()) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    channel.wake_all()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert all(isinstance(result, Empty) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_put_many_feeds_every_waiter():
+    channel = Channel()
+    waiters = [asyncio.create_task(channel.get(timeout=5)) for _ in range(4)]
+    await asyncio.sleep(0.01)
+
+    channel.put_many(range(4))
+
+    assert sorted(await asyncio.gather(*waiters)) == [0, 1, 2, 3]
+
+
+def test_get_batch():
+    channel = Channel()
+    channel.put_many(range(10))
+
+    assert channel.get_batch(4) == [0, 1, 2, 3]
+    assert channel.get_batch(-1) == [4, 5, 6, 7, 8, 9]
+    assert channel.get_batch(4, timeout=0.01) == []
+
+
+def test_get_batch_blocks_for_first_item():
+    channel = Channel()
+    threading.Timer(0.05, channel.put_many, args=(["a", "b"],)).start()
+
+    assert channel.get_batch(8, timeout=5) == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_join():
+    channel = Channel()
+    channel.put_many(["a", "b"])
+
+    async def consume():
+        for _ in range(2):
+            await channel.get()
+            channel.task_done()
+
+    task = asyncio.create_task(consume())
+    await asyncio.wait_for(channel.join(), 1)
+    await task
+
+
+def test_high_and_low_water():
+    channel = Channel(high_water=4, low_water=1)
+    assert Channel().room() == -1
+    channel.put_many(range(3))
+    assert channel.room() == 1 and not channel.pressured
+
+    channel.put_many(range(3))
+    assert channel.pressured and channel.room() == 0
+    channel.get_batch(4)
+    # still above low water.
+    assert channel.pressured
+    channel.get_nowait()
+    assert not channel.pressured and channel.room() == 3
+
+
+@pytest.mark.asyncio
+async def test_wait_for_room_until_low_water():
+    channel = Channel(high_water=2, low_water=0)
+    await channel.wait_for_room()
+    channel.put_many(["a", "b"])
+
+    waiter = asyncio.create_task(channel.wait_for_room())
+    await asyncio.sleep(0.01)
+    threading.Thread(target=channel.get_batch, args=(1,)).start()
+    await asyncio.sleep(0.05)
+    assert not waiter.done()
+
+    threading.Thread(target=channel.get_batch, args=(1,)).start()
+    await asyncio.wait_for(waiter, 5)
+
+
+def test_block_for_room():
+    channel = Channel(high_water=1)
+    channel.put("a")
+    assert not channel.block_for_room(0.01)
+    threading.Timer(0.05, channel.get_nowait).start()
+    assert channel.block_for_room(5)
@@ -1,25 +1,26 @@
 import pytest
 from DataGatherer.app.Crawler import Crawler
+from DataGatherer.app.Channel import Channel
 import asyncio
-from queue import Queue
 
 import time
 
 @pytest.mark.asyncio
 async def test_crawler():
-    target_links = Queue()
-    link_text = Queue()
-    potential_links = Queue()
+    target_links = Channel()
+    link_text = Channel()
+    potential_links = Channel()
 
     crawler = Crawler(target_links, link_text, potential_links, 5)
 
     await crawler.start(8)
-    assert len(crawler.worker_tasks) == 8
+    # 8 workers and the dispatcher.
+    assert len(crawler.worker_tasks) == 9
 
-    await asyncio.to_thread(target_links.put, "https://muxite.github.io/test")
+    target_links.put("https://muxite.github.io/test")
 
-    link, text = await asyncio.to_thread(link_text.get)
-    pot_link = await asyncio.to_thread(potential_links.get)
+    link, text = await link_text.get()
+    pot_link = await potential_links.get()
 
     assert link == "https://muxite.github.io/test"
 
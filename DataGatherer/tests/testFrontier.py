@@ -0,0 +1,74 @@
+import fakeredis
+import time
+
+from DataGatherer.app.Frontier import Frontier, depth_priority
+
+
+def make_frontier(**kwargs):
+    return Frontier(fakeredis.FakeRedis(), **kwargs)
+
+
+def test_depth_priority():
+    assert depth_priority("https://a.com/") == 0
+    assert depth_priority("https://a.com/wiki/Main_Page") == 2
+
+
+def test_lease_spreads_hosts():
+    frontier = make_frontier(host_delay=60)
+    frontier.add([f"https://a.com/{i}" for i in range(5)] + ["https://b.com/1", "https://c.com/1"])
+
+    leased = frontier.lease(10)
+    assert sorted(leased) == ["https://a.com/0", "https://b.com/1", "https://c.com/1"]
+
+    # every host is waiting out its delay.
+    assert frontier.lease(10) == []
+    assert frontier.size() == 4
+
+
+def test_lease_after_delay():
+    frontier = make_frontier(host_delay=0.05)
+    frontier.add(["https://a.com/1", "https://a.com/2"])
+
+    assert frontier.lease(5) == ["https://a.com/1"]
+    time.sleep(0.06)
+    assert frontier.lease(5) == ["https://a.com/2"]
+
+
+def test_priority_order():
+    # a backlog of one leaves all ordering to the front queue.
+    frontier = make_frontier(host_delay=0, backlog=1)
+    frontier.add(["https://a.com/x/y/z", "https://b.com/x", "https://c.com/"])
+
+    order = []
+    for _ in range(3):
+        order += frontier.lease(1)
+    assert order == ["https://c.com/", "https://b.com/x", "https://a.com/x/y/z"]
+
+
+def test_inlinks_priority():
+    frontier = make_frontier(priority="inlinks", host_delay=0, backlog=1)
+    frontier.add(["https://a.com/", "https://b.com/"])
+    frontier.bump(["https://b.com/", "https://b.com/", "https://c.com/"])
+
+    assert frontier.lease(1) == ["https://b.com/"]
+    # bump never adds links that were not waiting.
+    assert frontier.lease(5) == ["https://a.com/"]
+
+
+def test_add_ignores_waiting_links():
+    frontier = make_frontier(host_delay=0)
+    frontier.add(["https://a.com/"])
+    frontier.add(["https://a.com/"])
+
+    assert frontier.size() == 1
+
+
+def test_keys_share_hash_tag():
+    client = fakeredis.FakeRedis()
+    frontier = Frontier(client, host_delay=60, prefix="crawl")
+    frontier.add(["https://a.com/1", "https://a.com/2", "https://b.com/1"])
+    frontier.lease(1)
+
+    # one slot on a cluster, back queues named inside the script included.
+    keys = [key.decode() for key in client.keys("*")]
+    assert keys and all(key.startswith("{crawl}:") for key in keys)
@@ -0,0 +1,59 @@
+import pytest
+import asyncio
+
+from DataGatherer.app.HostScheduler import HostScheduler
+
+
+@pytest.mark.asyncio
+async def test_slow_host_does_not_block_others():
+    scheduler = HostScheduler(concurrency=1, delay=0)
+    await scheduler.add("https://slow.com/1")
+    await scheduler.add("https://slow.com/2")
+    await scheduler.add("https://fast.com/1")
+
+    first = await scheduler.acquire(timeout=1)
+    second = await scheduler.acquire(timeout=1)
+    assert {first, second} == {"https://slow.com/1", "https://fast.com/1"}
+
+    # slow.com still has its one request in flight.
+    assert await scheduler.acquire(timeout=0.05) is None
+
+    await scheduler.release("https://slow.com/1")
+    assert await scheduler.acquire(timeout=1) == "https://slow.com/2"
+
+
+@pytest.mark.asyncio
+async def test_host_delay():
+    scheduler = HostScheduler(concurrency=4, delay=0.2)
+    await scheduler.add("https://a.com/1")
+    await scheduler.add("https://a.com/2")
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await scheduler.acquire(timeout=1)
+    await scheduler.acquire(timeout=1)
+    assert loop.time() - start >= 0.19
+
+
+@pytest.mark.asyncio
+async def test_close_releases_waiters():
+    scheduler = HostScheduler()
+    waiter = asyncio.create_task(scheduler.acquire())
+    await asyncio.sleep(0.01)
+
+    await scheduler.close()
+    assert await asyncio.wait_for(waiter, 1) is None
+
+
+@pytest.mark.asyncio
+async def test_idle_host_delays_expire():
+    scheduler = HostScheduler(concurrency=1, delay=0.05)
+    await scheduler.add("https://a.com/1")
+    await scheduler.release(await scheduler.acquire(timeout=1))
+    # the delay of a.com is still running when it goes idle.
+    assert "a.com" in scheduler.ready_at
+
+    await asyncio.sleep(0.06)
+    await scheduler.acquire(timeout=0)
+    assert scheduler.ready_at == {}
+    assert scheduler.expiring == []
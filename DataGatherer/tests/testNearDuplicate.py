@@ -0,0 +1,50 @@
+import fakeredis
+
+from DataGatherer.app.Channel import Channel
+from DataGatherer.app.NearDuplicate import NearDuplicateFilter, simhash, hamming
+
+ARTICLE = ("Neon Genesis Evangelion is a Japanese mecha anime television series produced by Gainax and "
+           "animated by Tatsunoko, directed by Hideaki Anno and broadcast on TV Tokyo from October 1995 to "
+           "March 1996. Fifteen years after a worldwide cataclysm, the Second Impact, humanity is attacked by "
+           "monstrous beings called Angels and the paramilitary organization NERV fights back with giant "
+           "biomechanical mecha called Evangelions piloted by teenagers. ") * 3
+OTHER = ("pip is the package installer for Python. You can use pip to install packages from the Python "
+         "Package Index and other indexes. Please take a look at our documentation for how to install and "
+         "use pip, and the release notes and changelog for what changed between versions.") * 3
+
+
+def test_simhash_distance():
+    edited = ARTICLE + " Retrieved 18 October 2026."
+    assert hamming(simhash(ARTICLE), simhash(edited)) <= 3
+    assert hamming(simhash(ARTICLE), simhash(OTHER)) > 10
+
+
+def test_filter_drops_near_duplicates():
+    in_queue, out_queue = Channel(), Channel()
+    near_filter = NearDuplicateFilter(fakeredis.FakeRedis(), in_queue, out_queue)
+
+    pages = [
+        ("https://a.com/article", ARTICLE, simhash(ARTICLE)),
+        ("https://a.com/other", OTHER, simhash(OTHER)),
+        ("https://mirror.com/article", ARTICLE, simhash(ARTICLE)),
+        ("https://a.com/article?printable=yes", ARTICLE + " Retrieved 18 October 2026.",
+         simhash(ARTICLE + " Retrieved 18 October 2026.")),
+    ]
+    kept = near_filter.check(pages)
+
+    assert [link for link, _ in kept] == ["https://a.com/article", "https://a.com/other"]
+    assert near_filter.dropped == 2
+
+
+def test_short_texts_are_kept():
+    client = fakeredis.FakeRedis()
+    in_queue, out_queue = Channel(), Channel()
+    near_filter = NearDuplicateFilter(client, in_queue, out_queue)
+
+    assert simhash("") is None
+    pages = [(f"https://a.com/{i}", text, simhash(text)) for i, text in enumerate(["", "Log in", "", ARTICLE])]
+    kept = near_filter.check(pages)
+
+    assert len(kept) == 4
+    # one slot on a cluster for the script's band keys.
+    assert client.keys("*") and all(key.startswith(b"{near_dup}:") for key in client.keys("*"))
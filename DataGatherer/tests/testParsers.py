@@ -0,0 +1,58 @@
+import os
+import re
+import pytest
+
+from DataGatherer.app.Parsers import PARSERS, get_parser
+
+CORPUS = os.path.join(os.path.dirname(__file__), "corpus")
+LINK = "https://en.wikipedia.org/wiki/Neon_Genesis_Evangelion"
+# share of words that may differ between two backends on the same page.
+TEXT_TOLERANCE = 0.05
+
+
+def corpus_pages():
+    for name in sorted(os.listdir(CORPUS)):
+        with open(os.path.join(CORPUS, name), encoding="utf-8") as file:
+            yield name, file.read()
+
+
+def words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def available_parsers():
+    parsers = []
+    for name in PARSERS:
+        try:
+            parsers.append(get_parser(name))
+        except ImportError:
+            pass
+    return parsers
+
+
+@pytest.mark.parametrize("parser", available_parsers(), ids=lambda parser: parser.name)
+def test_parser_parity(parser):
+    reference = get_parser("html.parser")
+
+    for name, html in corpus_pages():
+        expected_text, expected_links = reference.parse(LINK, html)
+        text, links = parser.parse(LINK, html)
+
+        assert set(links) == set(expected_links), name
+
+        expected_words, found_words = words(expected_text), words(text)
+        difference = len(expected_words ^ found_words) / max(len(expected_words | found_words), 1)
+        assert difference <= TEXT_TOLERANCE, name
+
+
+def test_script_and_style_are_not_text():
+    html = dict(corpus_pages())["article.html"]
+    for parser in available_parsers():
+        text, _ = parser.parse(LINK, html)
+        assert "client-js" not in text
+        assert "color" not in text
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        get_parser("regex")
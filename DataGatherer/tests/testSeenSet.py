@@ -0,0 +1,35 @@
+import fakeredis
+
+from DataGatherer.app.SeenSet import ExactSeenSet, BloomSeenSet
+
+
+def test_exact_seen_set():
+    seen = ExactSeenSet(fakeredis.FakeRedis())
+
+    assert seen.add_new(["https://a.com/", "https://b.com/"]) == ["https://a.com/", "https://b.com/"]
+    assert seen.add_new(["https://a.com/", "https://c.com/", "https://c.com/"]) == ["https://c.com/"]
+
+
+def test_bloom_seen_set():
+    seen = BloomSeenSet(fakeredis.FakeRedis(), capacity=100)
+
+    assert seen.add_new(["https://a.com/", "https://b.com/"]) == ["https://a.com/", "https://b.com/"]
+    assert seen.add_new(["https://a.com/", "https://c.com/", "https://c.com/"]) == ["https://c.com/"]
+
+
+def test_bloom_grows_and_keeps_error_rate():
+    client = fakeredis.FakeRedis()
+    seen = BloomSeenSet(client, capacity=200, error_rate=0.01)
+
+    links = [f"https://example.com/page/{i}" for i in range(2000)]
+    new = []
+    for i in range(0, len(links), 100):
+        new += seen.add_new(links[i:i + 100])
+
+    assert int(client.hget(seen.key, "layers")) > 1
+    # one slot on a cluster, layers named inside the script included.
+    assert all(key.startswith(b"{seen_links:bloom}") for key in client.keys("*"))
+    # false positives drop links, the layers together stay near error_rate / (1 - tightening).
+    assert len(new) >= len(links) * (1 - 0.03)
+    # nothing that went in is ever reported as new again.
+    assert seen.add_new(links[:500]) == []
@@ -0,0 +1,100 @@
+import fakeredis
+import json
+import time
+
+from DataGatherer.app.Channel import Channel
+from DataGatherer.app.Frontier import Frontier
+from DataGatherer.app.SeenSet import BloomSeenSet
+from DataGatherer.app.Spill import Spill
+from DataGatherer.app.Validator import Validator
+from shared.utils.Codec import Codec
+
+
+def run_validators(client, links, count, **kwargs):
+    queue = Channel()
+    validators = [Validator(client, queue, sync_period=0.05, batch_size=64, **kwargs) for _ in range(count)]
+    for validator in validators:
+        validator.start()
+    queue.put_many(links)
+
+    deadline = time.time() + 10
+    while not queue.empty() and time.time() < deadline:
+        time.sleep(0.05)
+    for validator in validators:
+        validator.stop()
+
+    return [json.loads(link) for link in client.lrange("target_links:list", 0, -1)]
+
+
+def test_each_link_enqueued_once_across_validators():
+    client = fakeredis.FakeRedis()
+    unique = [f"https://a.com/{i}" for i in range(500)]
+    links = unique * 4 + ["", "   "]
+
+    targets = run_validators(client, links, 4)
+
+    assert sorted(targets) == sorted(unique)
+
+
+def test_bloom_validators():
+    client = fakeredis.FakeRedis()
+    unique = [f"https://a.com/{i}" for i in range(300)]
+
+    targets = run_validators(client, unique * 3, 3, seen_set=BloomSeenSet(client, capacity=1000))
+
+    assert len(targets) == len(set(targets))
+    assert len(targets) >= 295
+
+
+def test_enqueued_links_use_codec():
+    client = fakeredis.FakeRedis()
+    codec = Codec("msgpack")
+    Validator(client, Channel(), codec=codec).validate(["https://a.com/", "https://a.com/"])
+
+    assert [codec.decode(link) for link in client.lrange("target_links:list", 0, -1)] == ["https://a.com/"]
+    # membership keeps the JSON form, so seen sets written before codecs still match.
+    assert client.sismember("seen_links:set", json.dumps("https://a.com/"))
+
+
+def test_frontier_links_seen_and_queued_together():
+    client = fakeredis.FakeRedis()
+    frontier = Frontier(client)
+    for seen_set in (None, BloomSeenSet(client, capacity=100)):
+        client.flushall()
+        validator = Validator(client, Channel(), frontier=frontier, seen_set=seen_set)
+        validator.validate(["https://a.com/x/y", "https://b.com/"])
+        validator.validate(["https://a.com/x/y", "https://c.com/"])
+
+        # one script call, scored by the frontier's priority.
+        assert client.zrange(frontier.front_key, 0, -1, withscores=True) == [
+            (b"https://b.com/", 0), (b"https://c.com/", 0), (b"https://a.com/x/y", 2)]
+
+
+def test_shed_over_high_water():
+    queue = Channel(high_water=10, low_water=4)
+    queue.put_many(f"https://a.com/{i}" for i in range(12))
+    validator = Validator(fakeredis.FakeRedis(), queue, overflow="shed")
+
+    validator.relieve()
+    assert validator.shed == 8
+    assert queue.qsize() == 4 and not queue.pressured
+
+
+def test_spill_and_read_back(tmp_path):
+    queue = Channel(high_water=10, low_water=4)
+    links = [f"https://a.com/{i}" for i in range(12)]
+    queue.put_many(links)
+    spill = Spill(str(tmp_path / "links.spill"))
+    validator = Validator(fakeredis.FakeRedis(), queue, overflow="spill", spill=spill)
+
+    validator.relieve()
+    assert validator.spilled == 8 and len(spill) == 8
+    remaining = queue.get_batch(-1)
+
+    validator.relieve()
+    validator.relieve()
+    assert sorted(remaining + queue.get_batch(-1)) == sorted(links[8:] + links[:4])
+    assert len(spill) == 4
+    validator.relieve()
+    assert sorted(queue.get_batch(-1)) == sorted(links[4:8])
+    assert len(spill) == 0
@@ -1,14 +1,31 @@
 import redis
-import json
 import argparse
-import mysql.connector
-from utils import delayed_action
+from shared.utils.Codec import Codec
 import time
 
+try:
+    from utils import delayed_action
+    from Storage import STORAGES, data_error, get_storage
+except ImportError:
+    from Databaser.app.utils import delayed_action
+    from Databaser.app.Storage import STORAGES, data_error, get_storage
+
+# list the Indexer's Syncer pushes link, tags pairs to.
+LINK_TAG = "link_tag:list"
+# list of pairs the database rejects or that can not be decoded, kept for a look instead of retried.
+DEAD_LETTER = "link_tag:dead"
+
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Store links and tags in a database')
     parser.add_argument("--timeout", type=int, default=120, help="Timeout in seconds.")
     parser.add_argument("--sync_period", type=int, default=30, help="Sync period in seconds.")
+    parser.add_argument("--batch_size", type=int, default=500,
+                        help="Most link-tags pairs moved in one transaction, 1 moves a pair at a time.")
+    parser.add_argument("--tag_cache", type=int, default=100000, help="Most tag ids kept in memory.")
+    parser.add_argument("--storage", type=str, default="mysql", choices=list(STORAGES),
+                        help="Database to store in, sqlite and duckdb are embedded files needing no server.")
+    parser.add_argument("--storage_path", type=str, default="links.db", help="File of an embedded database.")
     parser.add_argument("--redis_host", type=str, help="Redis host.")
     parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
     parser.add_argument("--mysql_host", type=str, default="host", help="MySQL host.")
@@ -20,53 +37,41 @@ def parse_args():
 
 
 class Databaser:
-    def __init__(self, sync_period=30, timeout=120):
+    def __init__(self, sync_period=30, timeout=120, batch_size=500, tag_cache=100000):
         """
-        Stores link-tags pairs into a MySQL database. Uses 3 tables, "links", "tags", "junction".
-        :param redis_client: Redis to connect to.
-        :param connection: MySQL connection.
+        Stores link-tags pairs into a database through a Storage backend.
+        Uses 3 tables, "links", "tags", "junction".
+        Pairs are moved a batch at a time: a batch is popped from Redis in one call and stored
+        in one transaction with multi-row statements, so a batch costs a handful of round trips
+        instead of 2 + 2 x tags per pair.
         :param sync_period: How often data transfer is done.
         :param timeout: Time until automatic shutdown.
+        :param batch_size: Most pairs moved in one transaction, 1 moves a pair at a time.
+        :param tag_cache: Most tag ids cached.
         """
 
         self.redis_client = None
-        self.mysql_connection = None
-        self.mysql_cursor = None
+        self.storage = None
+        self.codec = Codec()
         self.sync_period = sync_period
         self.timeout = timeout
+        self.batch_size = batch_size
+        self.tag_cache = tag_cache
         self.active = False
-        self.await_stream()
-
-
-    def setup(self):
-        self.mysql_cursor.execute("CREATE TABLE IF NOT EXISTS links ("
-                            "id INT AUTO_INCREMENT PRIMARY KEY, "
-                            "link VARCHAR(2048) NOT NULL")
-        self.mysql_cursor.execute("CREATE TABLE IF NOT EXISTS tags ("
-                            "id INT AUTO_INCREMENT PRIMARY KEY, "
-                            "link VARCHAR(64) NOT NULL")
-        self.mysql_cursor.execute("CREATE TABLE IF NOT EXISTS junction ("
-                            "link_id INT, "
-                            "tag_id INT, "
-                            "PRIMARY KEY (link_id, tag_id),"
-                            "FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE,"
-                            "FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE)")
-        self.mysql_connection.commit()
-
-    def connect(self, redis_host, redis_port, mysql_host, mysql_port,
-                      mysql_user, mysql_password, mysql_database ):
+
+    def connect(self, redis_host, redis_port, storage="mysql", **options):
+        """
+        :param redis_host: Host to connect to.
+        :param redis_port: Port to connect to.
+        :param storage: Name of the storage backend.
+        :param options: Connection options of the backend.
+        """
         redis_client = redis.Redis(host=redis_host, port=redis_port, db=0)
-        mysql_connection = mysql.connector.connect(
-            host=mysql_host,
-            port=mysql_port,
-            user=mysql_user,
-            password=mysql_password,
-            database=mysql_database
-        )
-        self.mysql_connection = mysql_connection
-        self.mysql_cursor = mysql_connection.cursor()
-        self.redis_client = redis_client
+        self.attach(redis_client, get_storage(storage, tag_cache=self.tag_cache, **options))
 
+    def attach(self, redis_client, storage):
+        self.redis_client = redis_client
+        self.storage = storage
 
     def quit(self):
         self.active = False
@@ -77,25 +82,26 @@ class Databaser:
         """
 
         while not self.active:
-            if not self.mysql_connection or not self.mysql_cursor or not self.redis_client:
+            if not self.storage or not self.redis_client:
                 if retries < 0:
                     return
                 retries -= 1
                 time.sleep(interval)
             else:
-                self.setup()
+                self.storage.setup()
                 self.stream(self.timeout)
 
     def stream(self, timeout):
         """
-        Continuously move data from Redis to MySQL database.
+        Continuously move data from Redis to the database.
         :param timeout: Pause time after failed movement.
         """
 
         self.active = True
         delayed_action(timeout, self.quit)
         while self.active:
-            if not self.transfer():
+            moved = self.transfer_batch() if self.batch_size > 1 else self.transfer()
+            if not moved:
                 time.sleep(self.sync_period)
 
     def transfer(self):
@@ -103,30 +109,67 @@ class Databaser:
         Transfers 1 link-tags pair into the database.
         :return: True if successful, False otherwise.
         """
+        dump = self.redis_client.lpop(LINK_TAG)
+        if dump is None:
+            return False
         try:
-            link, tags = json.loads(self.redis_client.lpop("link_tag_queue"))
-            print(f"Databasing: link: {link}    tags: {tags}")
-            self.mysql_cursor.execute("INSERT IGNORE INTO links (link) VALUES (%s)", (link,))
-            tag_tuple = *tags,
-            self.mysql_cursor.executemany("INSERT IGNORE INTO tags VALUES %s", tag_tuple)
-
-            # get all ids for link and all tags
-            self.mysql_cursor.execute("SELECT id FROM links WHERE link_id = %s", (link,))
-            link_id = self.mysql_cursor.fetchone()[0]
-            self.mysql_cursor.execute("INSERT IGNORE INTO junction VALUES %s", (link_id,))
-            junction_row = []
-            for tag in tags:
-                self.mysql_cursor.execute("SELECT id FROM tags WHERE link = %s", (tag,))
-                tag_id = self.mysql_cursor.fetchone()[0]
-                junction_row.append((link_id, tag_id))
-
-            # fill in junction table.
-            self.mysql_cursor.executemany("INSERT IGNORE INTO junction VALUES (%s, %s)", junction_row)
-            self.mysql_connection.commit()
-
-            return True
-        except TypeError:
+            link, tags = self.codec.decode(dump)
+        except ValueError:
+            print("Databaser decode error.")
             return False
+        self.storage.store(link, tags)
+        return True
+
+    def transfer_batch(self):
+        """
+        Transfers up to batch_size link-tags pairs into the database in one transaction.
+        Pairs the database rejects are split out and moved to the dead letter list, the rest are stored.
+        Pairs not stored because the database failed are put back at the head of the Redis list, in order.
+        :return: Number of pairs taken off the list for good.
+        """
+        dumps = self.redis_client.lpop(LINK_TAG, self.batch_size)
+        if not dumps:
+            return 0
+        entries = []
+        for dump in dumps:
+            try:
+                link, tags = self.codec.decode(dump)
+            except ValueError:
+                print("Databaser decode error.")
+                self.redis_client.rpush(DEAD_LETTER, dump)
+                continue
+            entries.append((dump, link, tags))
+        retry = self.store_entries(entries) if entries else []
+        if retry:
+            self.redis_client.lpush(LINK_TAG, *reversed([dump for dump, _, _ in retry]))
+        return len(dumps) - len(retry)
+
+    def store_entries(self, entries):
+        """
+        Store dump, link, tags entries in one transaction. A batch with data the database rejects
+        is halved until the bad pair is on its own, and that pair goes to the dead letter list.
+        :param entries: List of dump, link, tags tuples.
+        :return: The entries not stored because the database failed, in order.
+        """
+        pairs = {}
+        for _, link, tags in entries:
+            pairs.setdefault(link, set()).update(tags)
+        try:
+            self.storage.store_many(pairs)
+            return []
+        except Exception as e:
+            if not data_error(e):
+                print("Error transferring batch:", e)
+                return entries
+            if len(pairs) == 1:
+                print("Database rejected a pair, moving it to the dead letter list:", e)
+                self.redis_client.rpush(DEAD_LETTER, *(dump for dump, _, _ in entries))
+                return []
+        half = len(entries) // 2
+        retry = self.store_entries(entries[:half])
+        if retry:
+            return retry + entries[half:]
+        return self.store_entries(entries[half:])
 
 
 def run():
@@ -134,18 +177,18 @@ def run():
 
     databaser = Databaser(
         sync_period=args.sync_period,
-        timeout=args.timeout
+        timeout=args.timeout,
+        batch_size=args.batch_size,
+        tag_cache=args.tag_cache,
     )
 
-    databaser.connect(
-        args.redis_host,
-        args.redis_port,
-        args.mysql_host,
-        args.mysql_port,
-        args.mysql_user,
-        args.mysql_password,
-        args.mysql_database
-    )
+    if args.storage == "mysql":
+        options = dict(host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                       password=args.mysql_password, database=args.mysql_database)
+    else:
+        options = dict(path=args.storage_path)
+    databaser.connect(args.redis_host, args.redis_port, args.storage, **options)
+    databaser.await_stream()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,406 @@
+import hashlib
+import sqlite3
+from collections import OrderedDict
+
+try:
+    import mysql.connector
+except ImportError:
+    mysql = None
+
+try:
+    import duckdb
+    import numpy as np
+except ImportError:
+    duckdb = None
+
+# longest tag stored, longer tags are cut.
+TAG_LENGTH = 64
+# rows per multi-row statement, keeping statements well under max_allowed_packet.
+STATEMENT_ROWS = 1000
+
+
+def data_error(error):
+    """
+    :return: True if the database rejected the data, as DB-API DataError and IntegrityError do,
+        rather than failing to run the statement at all.
+    """
+    return any(cls.__name__ in ("DataError", "IntegrityError") for cls in type(error).__mro__)
+
+
+def link_hash(link):
+    """
+    Fixed size key of a link, since links are too long for a unique index.
+    """
+    return hashlib.md5(link.encode("utf-8")).digest()
+
+
+def chunks(items, size=STATEMENT_ROWS):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class IdCache:
+    def __init__(self, size=100000):
+        """
+        Least recently used map of names to database ids, so names seen in earlier batches
+        are not looked up again. Ids are only put once their rows are committed.
+        :param size: Most names kept, 0 keeps none.
+        """
+        self.size = size
+        self.ids = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_many(self, names):
+        """
+        :param names: Iterable of names.
+        :return: Dictionary of the cached names to their ids, and a list of the names not cached.
+        """
+        found = {}
+        missing = []
+        for name in names:
+            row_id = self.ids.get(name)
+            if row_id is None:
+                missing.append(name)
+            else:
+                self.ids.move_to_end(name)
+                found[name] = row_id
+        self.hits += len(found)
+        self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, ids):
+        """
+        :param ids: Dictionary of names to ids.
+        """
+        for name, row_id in ids.items():
+            self.ids[name] = row_id
+            self.ids.move_to_end(name)
+        while len(self.ids) > self.size:
+            self.ids.popitem(last=False)
+
+
+class Storage:
+    """
+    Links, tags and the junction table pairing their ids, in some database.
+    Subclasses give the schema, the driver's parameter marker and how rows are inserted skipping
+    rows whose unique key is already stored. Batching, id lookups and the tag cache are shared,
+    so every backend stores the same rows.
+    store writes a pair at a time with 2 + 2 x tags statements. store_many writes a batch in one
+    transaction: links and uncached tags are inserted, their ids read back with one SELECT ... IN
+    for links and one for tags, then the junction rows are inserted and the batch committed once.
+    """
+    name = None
+    # parameter marker of the driver.
+    marker = "%s"
+    schema = []
+
+    def __init__(self, connection, tag_cache=100000):
+        """
+        :param connection: DB-API connection.
+        :param tag_cache: Most tag ids cached.
+        """
+        self.connection = connection
+        self.cursor = connection.cursor()
+        self.tag_ids = IdCache(tag_cache)
+
+    def insert(self, table, columns, values):
+        """
+        Insert rows, skipping those whose unique key is already stored.
+        :param table: Table name.
+        :param columns: Tuple of column names.
+        :param values: List of row tuples.
+        """
+        raise NotImplementedError
+
+    def setup(self):
+        for statement in self.schema:
+            self.cursor.execute(statement)
+        self.connection.commit()
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+    def placeholders(self, count):
+        return ", ".join([self.marker] * count)
+
+    def rows(self, count, width):
+        """
+        :return: VALUES list of count rows of width markers, as "(%s, %s), (%s, %s)".
+        """
+        return ", ".join(["(" + self.placeholders(width) + ")"] * count)
+
+    def store(self, link, tags):
+        """
+        Store one link-tags pair, a statement and round trip at a time.
+        """
+        self.begin()
+        self.insert("links", ("link", "link_hash"), [(link, link_hash(link))])
+        self.cursor.execute(f"SELECT id FROM links WHERE link_hash = {self.marker}", (link_hash(link),))
+        link_id = self.cursor.fetchone()[0]
+        junction_rows = []
+        for tag in dict.fromkeys(tag[:TAG_LENGTH] for tag in tags):
+            self.insert("tags", ("tag",), [(tag,)])
+            self.cursor.execute(f"SELECT id FROM tags WHERE tag = {self.marker}", (tag,))
+            junction_rows.append((link_id, self.cursor.fetchone()[0]))
+        self.insert("junction", ("link_id", "tag_id"), junction_rows)
+        self.commit()
+
+    def store_many(self, pairs):
+        """
+        Store a batch in one transaction, rolled back if any statement fails.
+        :param pairs: Dictionary of link to set of tags.
+        """
+        self.begin()
+        try:
+            link_ids = self.upsert_links(list(pairs))
+            tag_ids, new_tags = self.upsert_tags({tag[:TAG_LENGTH] for tags in pairs.values() for tag in tags})
+            junction_rows = list(dict.fromkeys(
+                (link_ids[link], tag_ids[tag[:TAG_LENGTH]]) for link, tags in pairs.items() for tag in tags))
+            self.insert("junction", ("link_id", "tag_id"), junction_rows)
+            self.commit()
+        except Exception:
+            self.rollback()
+            raise
+        # ids of a rolled back batch would not exist, so only committed ones are cached.
+        self.tag_ids.put_many(new_tags)
+
+    def select_ids(self, table, column, keys):
+        """
+        :return: Dictionary of each key found in the column to its row id.
+        """
+        ids = {}
+        for chunk in chunks(keys):
+            self.cursor.execute(f"SELECT id, {column} FROM {table} WHERE {column} IN ({self.placeholders(len(chunk))})",
+                                chunk)
+            # drivers give binary columns as bytearray or bytes.
+            ids.update((bytes(key) if isinstance(key, bytearray) else key, row_id)
+                       for row_id, key in self.cursor.fetchall())
+        return ids
+
+    def upsert_links(self, links):
+        """
+        :param links: List of distinct links.
+        :return: Dictionary of link to id.
+        """
+        hashes = {link_hash(link): link for link in links}
+        self.insert("links", ("link", "link_hash"), [(link, key) for key, link in hashes.items()])
+        return {hashes[key]: row_id for key, row_id in self.select_ids("links", "link_hash", list(hashes)).items()}
+
+    def upsert_tags(self, tags):
+        """
+        :param tags: Set of distinct tags.
+        :return: Dictionary of every tag to its id, and of the tags that were not cached.
+        """
+        tag_ids, missing = self.tag_ids.get_many(tags)
+        self.insert("tags", ("tag",), [(tag,) for tag in missing])
+        new_tags = self.select_ids("tags", "tag", missing)
+        tag_ids.update(new_tags)
+        return tag_ids, new_tags
+
+    def tags_of(self, link):
+        """
+        :return: Sorted list of the link's tags.
+        """
+        self.cursor.execute("SELECT tags.tag FROM links JOIN junction ON junction.link_id = links.id "
+                            "JOIN tags ON tags.id = junction.tag_id "
+                            f"WHERE links.link_hash = {self.marker} ORDER BY tags.tag", (link_hash(link),))
+        return [tag for tag, in self.cursor.fetchall()]
+
+    def links_with(self, tags, count=100):
+        """
+        :param tags: List of tags.
+        :param count: Most links.
+        :return: List of links with every tag, oldest first.
+        """
+        tags = list(dict.fromkeys(tag[:TAG_LENGTH] for tag in tags))
+        if not tags:
+            return []
+        self.cursor.execute("SELECT links.link FROM links JOIN junction ON junction.link_id = links.id "
+                            "JOIN tags ON tags.id = junction.tag_id "
+                            f"WHERE tags.tag IN ({self.placeholders(len(tags))}) "
+                            f"GROUP BY links.id, links.link HAVING COUNT(*) = {self.marker} "
+                            f"ORDER BY links.id LIMIT {self.marker}", tags + [len(tags), count])
+        return [link for link, in self.cursor.fetchall()]
+
+    def top_tags(self, count=10):
+        """
+        :return: List of tag, link count pairs of the most used tags, ties by tag.
+        """
+        self.cursor.execute("SELECT tags.tag, COUNT(*) AS used FROM junction JOIN tags ON tags.id = junction.tag_id "
+                            f"GROUP BY tags.tag ORDER BY used DESC, tags.tag LIMIT {self.marker}", (count,))
+        return [(tag, used) for tag, used in self.cursor.fetchall()]
+
+    def counts(self):
+        """
+        :return: Dictionary of table to rows.
+        """
+        found = {}
+        for table in ("links", "tags", "junction"):
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            found[table] = self.cursor.fetchone()[0]
+        return found
+
+
+class MySQLStorage(Storage):
+    """
+    MySQL server, inserting a batch with multi-row INSERT ... ON DUPLICATE KEY statements.
+    """
+    name = "mysql"
+    schema = [
+        "CREATE TABLE IF NOT EXISTS links ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, "
+        "link VARCHAR(2048) NOT NULL, "
+        "link_hash BINARY(16) NOT NULL UNIQUE)",
+        # binary collation, so tags differing only in case or accents get their own rows.
+        "CREATE TABLE IF NOT EXISTS tags ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, "
+        f"tag VARCHAR({TAG_LENGTH}) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS junction ("
+        "link_id INT, "
+        "tag_id INT, "
+        "PRIMARY KEY (link_id, tag_id),"
+        "FOREIGN KEY (link_id) REFERENCES links(id) ON DELETE CASCADE,"
+        "FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE)",
+    ]
+
+    def __init__(self, host="localhost", port=3306, user="user", password="pw", database="db", tag_cache=100000):
+        if mysql is None:
+            raise ImportError("mysql storage backend requires the mysql-connector-python package.")
+        super().__init__(mysql.connector.connect(host=host, port=port, user=user, password=password,
+                                                 database=database), tag_cache)
+
+    def insert(self, table, columns, values):
+        for chunk in chunks(values):
+            self.cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) "
+                                f"VALUES {self.rows(len(chunk), len(columns))} "
+                                f"ON DUPLICATE KEY UPDATE {columns[0]} = {columns[0]}",
+                                [value for row in chunk for value in row])
+
+
+class SQLiteStorage(Storage):
+    """
+    Embedded SQLite file, for single node deployments and tests with no database server.
+    Runs in WAL mode, so readers do not block the writer, with synchronous NORMAL:
+    a crash of the process loses nothing committed, a power loss at most the last transactions.
+    A batch is inserted with executemany over one prepared statement per table.
+    """
+    name = "sqlite"
+    marker = "?"
+    schema = [
+        "CREATE TABLE IF NOT EXISTS links ("
+        "id INTEGER PRIMARY KEY, "
+        "link TEXT NOT NULL, "
+        "link_hash BLOB NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS tags ("
+        "id INTEGER PRIMARY KEY, "
+        "tag TEXT NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS junction ("
+        "link_id INTEGER REFERENCES links(id) ON DELETE CASCADE, "
+        "tag_id INTEGER REFERENCES tags(id) ON DELETE CASCADE, "
+        "PRIMARY KEY (link_id, tag_id)) WITHOUT ROWID",
+    ]
+
+    def __init__(self, path="links.db", tag_cache=100000):
+        """
+        :param path: Database file, created if missing.
+        :param tag_cache: Most tag ids cached.
+        """
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        super().__init__(connection, tag_cache)
+
+    def insert(self, table, columns, values):
+        if values:
+            self.cursor.executemany(f"INSERT INTO {table} ({', '.join(columns)}) "
+                                    f"VALUES ({self.placeholders(len(columns))}) ON CONFLICT DO NOTHING", values)
+
+
+class DuckDBStorage(Storage):
+    """
+    Embedded DuckDB file. Columnar, so analytical queries such as top_tags over the whole
+    junction table run far faster than on SQLite, while row at a time writes are slower.
+    Bound parameters cost DuckDB a conversion each, so a batch of ids is scanned from numpy arrays
+    and text is passed as one list per column, unnested in the statement.
+    """
+    name = "duckdb"
+    marker = "?"
+    schema = [
+        "CREATE SEQUENCE IF NOT EXISTS link_ids",
+        "CREATE SEQUENCE IF NOT EXISTS tag_ids",
+        "CREATE TABLE IF NOT EXISTS links ("
+        "id INTEGER PRIMARY KEY DEFAULT nextval('link_ids'), "
+        "link VARCHAR NOT NULL, "
+        "link_hash BLOB NOT NULL UNIQUE)",
+        "CREATE TABLE IF NOT EXISTS tags ("
+        "id INTEGER PRIMARY KEY DEFAULT nextval('tag_ids'), "
+        "tag VARCHAR NOT NULL UNIQUE)",
+        # DuckDB has no cascading deletes, links are never deleted.
+        "CREATE TABLE IF NOT EXISTS junction ("
+        "link_id INTEGER, "
+        "tag_id INTEGER, "
+        "PRIMARY KEY (link_id, tag_id))",
+    ]
+
+    def __init__(self, path="links.duckdb", tag_cache=100000):
+        """
+        :param path: Database file, created if missing.
+        :param tag_cache: Most tag ids cached.
+        """
+        if duckdb is None:
+            raise ImportError("duckdb storage backend requires the duckdb and numpy packages.")
+        super().__init__(duckdb.connect(path), tag_cache)
+        # a DuckDB cursor is a separate connection with its own transactions, so statements go through this one.
+        self.cursor = self.connection
+
+    def begin(self):
+        self.connection.begin()
+
+    def insert(self, table, columns, values):
+        if not values:
+            return
+        names = ", ".join(columns)
+        if all(isinstance(value, int) for value in values[0]):
+            self.connection.register("batch", dict(zip(columns, np.array(values, dtype=np.int64).T)))
+            try:
+                self.cursor.execute(f"INSERT INTO {table} ({names}) SELECT {names} FROM batch ON CONFLICT DO NOTHING")
+            finally:
+                self.connection.unregister("batch")
+            return
+        self.cursor.execute(f"INSERT INTO {table} ({names}) SELECT {', '.join(['UNNEST(?)'] * len(columns))} "
+                            "ON CONFLICT DO NOTHING", [list(column) for column in zip(*values)])
+
+    def select_ids(self, table, column, keys):
+        if not keys:
+            return {}
+        self.cursor.execute(f"SELECT id, {column} FROM {table} WHERE {column} IN (SELECT UNNEST(?))", [list(keys)])
+        return {key: row_id for row_id, key in self.cursor.fetchall()}
+
+
+STORAGES = {storage.name: storage for storage in (MySQLStorage, SQLiteStorage, DuckDBStorage)}
+
+
+def get_storage(name, **options):
+    """
+    Build a storage backend by name.
+    :param name: One of STORAGES.
+    :param options: Connection options of the backend and tag_cache.
+    :return: Storage instance.
+    """
+    if name not in STORAGES:
+        raise ValueError(f"Unknown storage backend {name}, choose from {', '.join(STORAGES)}.")
+    return STORAGES[name](**options)
@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from Databaser.app.Storage import STORAGES, get_storage
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Rows/sec stored a pair at a time against batched transfers.")
+    parser.add_argument("--storages", type=str, nargs="+", default=["sqlite", "duckdb"], choices=list(STORAGES),
+                        help="Backends to load, mysql needs a server.")
+    parser.add_argument("--pairs", type=int, default=20000, help="Generated link-tags pairs per batched run.")
+    parser.add_argument("--single_pairs", type=int, default=1000,
+                        help="Generated link-tags pairs stored one at a time.")
+    parser.add_argument("--tags", type=int, default=5, help="Tags per link, as the Indexer emits.")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct tags.")
+    parser.add_argument("--batch_sizes", type=int, nargs="+", default=[100, 500, 2000], help="Batch sizes to try.")
+    parser.add_argument("--mysql_host", type=str, default="127.0.0.1", help="MySQL host.")
+    parser.add_argument("--mysql_port", type=int, default=3306, help="MySQL port.")
+    parser.add_argument("--mysql_user", type=str, default="user")
+    parser.add_argument("--mysql_password", type=str, default="pw")
+    parser.add_argument("--mysql_database", type=str, default="db")
+    return parser.parse_args()
+
+
+def pairs(count, tags, vocabulary, seed):
+    """
+    Link, tags pairs with Zipf distributed tags, links unique to the seed.
+    """
+    rng = random.Random(seed)
+    words = [f"tag{i}" for i in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return [(f"https://site{i % 500}.com/{seed}/{i}", sorted(set(rng.choices(words, weights, k=tags))))
+            for i in range(count)]
+
+
+def fresh(args, name, directory):
+    """
+    :return: Storage with empty tables.
+    """
+    if name == "mysql":
+        storage = get_storage(name, host=args.mysql_host, port=args.mysql_port, user=args.mysql_user,
+                              password=args.mysql_password, database=args.mysql_database)
+        for table in ["junction", "links", "tags"]:
+            storage.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    else:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        storage = get_storage(name, path=os.path.join(directory, f"links.{name}"))
+    storage.setup()
+    return storage
+
+
+def report(name, batch, elapsed):
+    rows = sum(len(tags) for _, tags in batch)
+    print(f"{name:>24}: {len(batch) / elapsed:8.0f} links/sec, {rows / elapsed:8.0f} junction rows/sec")
+
+
+def run():
+    args = parse_args()
+    directory = tempfile.mkdtemp(prefix="storage-")
+
+    for name in args.storages:
+        storage = fresh(args, name, directory)
+        batch = pairs(args.single_pairs, args.tags, args.vocabulary, 0)
+        start = time.perf_counter()
+        for link, tags in batch:
+            storage.store(link, tags)
+        report(f"{name} a pair at a time", batch, time.perf_counter() - start)
+        storage.close()
+
+        for batch_size in args.batch_sizes:
+            storage = fresh(args, name, directory)
+            batch = pairs(args.pairs, args.tags, args.vocabulary, batch_size)
+            start = time.perf_counter()
+            for i in range(0, len(batch), batch_size):
+                storage.store_many({link: set(tags) for link, tags in batch[i:i + batch_size]})
+            report(f"{name} batches of {batch_size}", batch, time.perf_counter() - start)
+            cache = storage.tag_ids
+            print(f"{'':>24}  tag cache hit rate {cache.hits / (cache.hits + cache.misses):.0%}")
+
+            start = time.perf_counter()
+            storage.top_tags(10)
+            print(f"{'':>24}  top 10 tags in {(time.perf_counter() - start) * 1000:.1f} ms")
+            storage.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,164 @@
+import fakeredis
+import pytest
+
+from Databaser.app.Databaser import DEAD_LETTER, LINK_TAG, Databaser
+from Databaser.app.Storage import STORAGES, TAG_LENGTH, IdCache, chunks, get_storage
+from shared.utils.Codec import Codec
+
+
+class DataError(Exception):
+    pass
+
+
+class OperationalError(Exception):
+    pass
+
+
+class FakeStorage:
+    def __init__(self):
+        """
+        Keeps stored pairs in a dictionary, rejecting links with "bad" in them as a strict database would.
+        """
+        self.pairs = {}
+        self.down = False
+        self.calls = 0
+
+    def store_many(self, pairs):
+        self.calls += 1
+        if self.down:
+            raise OperationalError("server has gone away")
+        if any("bad" in link for link in pairs):
+            raise DataError("data too long")
+        for link, tags in pairs.items():
+            self.pairs.setdefault(link, set()).update(tags)
+
+
+def make_databaser(links):
+    client = fakeredis.FakeRedis()
+    codec = Codec()
+    client.rpush(LINK_TAG, *(codec.encode([link, ["tag"]]) for link in links))
+    databaser = Databaser(batch_size=100)
+    storage = FakeStorage()
+    databaser.attach(client, storage)
+    return databaser, client, storage
+
+
+def test_id_cache_evicts_least_recently_used():
+    cache = IdCache(size=2)
+    cache.put_many({"a": 1, "b": 2})
+    assert cache.get_many(["a", "c"]) == ({"a": 1}, ["c"])
+    cache.put_many({"c": 3})
+    # "b" went unused longest.
+    assert cache.get_many(["a", "b", "c"]) == ({"a": 1, "c": 3}, ["b"])
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+def test_chunks():
+    assert [len(chunk) for chunk in chunks(list(range(2500)))] == [1000, 1000, 500]
+
+
+def embedded_storages():
+    names = []
+    for name in STORAGES:
+        if name == "mysql":
+            continue
+        try:
+            get_storage(name, path=":memory:").close()
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+
+def open_storage(name, path):
+    path.mkdir(exist_ok=True)
+    storage = get_storage(name, path=str(path / f"links.{name}"))
+    storage.setup()
+    return storage
+
+
+@pytest.mark.parametrize("name", embedded_storages())
+def test_batches_persist_and_query(name, tmp_path):
+    pairs = {f"https://a.com/{i}": {f"tag{i % 7}", f"tag{i % 3}", "Tag0", "tag0"} for i in range(2100)}
+    storage = open_storage(name, tmp_path)
+    # overlapping batches, each over a statement's rows.
+    storage.store_many(dict(list(pairs.items())[:1500]))
+    storage.store_many(dict(list(pairs.items())[1000:]))
+    assert storage.counts() == {"links": 2100, "tags": 8, "junction": sum(len(tags) for tags in pairs.values())}
+    assert storage.tags_of("https://a.com/5") == ["Tag0", "tag0", "tag2", "tag5"]
+    assert storage.links_with(["tag6", "tag2"], count=3) == ["https://a.com/20", "https://a.com/41", "https://a.com/62"]
+    assert storage.top_tags(2) == [("Tag0", 2100), ("tag0", 2100)]
+    assert storage.tag_ids.hits > 0
+    storage.close()
+    assert open_storage(name, tmp_path).counts()["links"] == 2100
+
+
+@pytest.mark.parametrize("name", embedded_storages())
+def test_pairs_match_batches(name, tmp_path):
+    pairs = {f"https://a.com/{i}": [f"tag{i % 5}", f"tag{i % 3}", "ünï"] for i in range(60)}
+    batched = open_storage(name, tmp_path / "batched")
+    batched.store_many({link: set(tags) for link, tags in pairs.items()})
+    single = open_storage(name, tmp_path / "single")
+    for link, tags in pairs.items():
+        single.store(link, tags)
+    single.store("https://a.com/0", pairs["https://a.com/0"])
+    assert single.counts() == batched.counts()
+    for link in pairs:
+        assert single.tags_of(link) == batched.tags_of(link)
+    assert single.top_tags(3) == batched.top_tags(3)
+
+
+@pytest.mark.parametrize("name", embedded_storages())
+def test_failed_batch_rolls_back(name, tmp_path):
+    storage = open_storage(name, tmp_path)
+    storage.store_many({"https://a.com/": {"x" * (TAG_LENGTH + 5)}})
+    assert storage.tags_of("https://a.com/") == ["x" * TAG_LENGTH]
+
+    insert = storage.insert
+
+    def fail_junction(table, columns, values):
+        if table == "junction":
+            raise RuntimeError("junction failed")
+        insert(table, columns, values)
+
+    storage.insert = fail_junction
+    with pytest.raises(RuntimeError):
+        storage.store_many({"https://b.com/": {"new"}})
+    storage.insert = insert
+    assert storage.counts() == {"links": 1, "tags": 1, "junction": 1}
+    # the rolled back tag id was not cached.
+    assert storage.tag_ids.get_many(["new"]) == ({}, ["new"])
+    storage.store_many({"https://b.com/": {"new"}})
+    assert storage.tags_of("https://b.com/") == ["new"]
+
+
+def test_transfer_batch_stores_pairs():
+    databaser, client, storage = make_databaser(["a", "b", "a"])
+    assert databaser.transfer_batch() == 3
+    assert storage.pairs == {"a": {"tag"}, "b": {"tag"}} and storage.calls == 1
+    assert client.llen(LINK_TAG) == 0
+
+
+def test_rejected_pair_goes_to_dead_letter():
+    links = [f"https://a.com/{i}" for i in range(8)]
+    links[5] = "https://bad.com/"
+    databaser, client, storage = make_databaser(links)
+    client.rpush(LINK_TAG, b"not a pair")
+
+    assert databaser.transfer_batch() == 9
+    assert sorted(storage.pairs) == sorted(link for link in links if "bad" not in link)
+    dead = client.lrange(DEAD_LETTER, 0, -1)
+    assert dead[0] == b"not a pair" and Codec().decode(dead[1])[0] == "https://bad.com/"
+    assert client.llen(LINK_TAG) == 0
+
+
+def test_failed_database_keeps_batch_in_order():
+    databaser, client, storage = make_databaser(["a", "b", "c"])
+    client.rpush(LINK_TAG, Codec().encode(["d", ["tag"]]))
+    databaser.batch_size = 3
+    storage.down = True
+
+    assert databaser.transfer_batch() == 0
+    # retried later from the head, nothing split or dead lettered.
+    assert storage.calls == 1 and client.llen(DEAD_LETTER) == 0
+    assert [Codec().decode(dump)[0] for dump in client.lrange(LINK_TAG, 0, -1)] == ["a", "b", "c", "d"]
@@ -1,13 +1,23 @@
 import json
-from collections import Counter
-from math import log
 import threading
 import time
 import queue
 import redis
+from collections import Counter
 from shared.utils.Syncer import Syncer
+from shared.utils.Codec import Codec
+from shared.utils.Backpressure import BackpressureMonitor
+from shared.utils.Tokenizer import Tokenizer
+from shared.utils.FrequencySketch import FrequencySketch
+from shared.utils.Snapshots import Snapshots
 import argparse
-from utils import delayed_action
+
+try:
+    from utils import delayed_action
+    from TagPool import TagPool, frequencies, sparse_tags, tfidf, top_tags
+except ImportError:
+    from Indexer.app.utils import delayed_action
+    from Indexer.app.TagPool import TagPool, frequencies, sparse_tags, tfidf, top_tags
 
 
 def parse_args():
@@ -15,6 +25,35 @@ def parse_args():
     parser.add_argument("--timeout", type=int, default=120, help="Timeout in seconds.")
     parser.add_argument("--redis_host", type=str, default="none", help="Redis host.")
     parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--sync_mode", type=str, default="poll", choices=["poll", "blocking"],
+                        help="Sync with Redis every sync period, or as soon as items arrive.")
+    parser.add_argument("--sync_period", type=float, default=5, help="Seconds between polled syncs.")
+    parser.add_argument("--transport", type=str, default="list", choices=["list", "stream"],
+                        help="Pop link_text from a list, or read it through a stream consumer group shared by replicas.")
+    parser.add_argument("--codec", type=str, default="json", choices=["json", "msgpack"],
+                        help="Encoding of items sent to Redis, every service reads both.")
+    parser.add_argument("--compression", type=str, default="none", choices=["none", "zstd", "lz4"],
+                        help="Compression of large msgpack items.")
+    parser.add_argument("--queue_size", type=int, default=0,
+                        help="Most pages and tags held in memory, 0 for unbounded queues.")
+    parser.add_argument("--link_tag_limit", type=int, default=0,
+                        help="Most tags left waiting in Redis before indexing slows, 0 for no limit.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Tagging processes, 0 tags on one thread in this process.")
+    parser.add_argument("--snapshot_period", type=float, default=5,
+                        help="Seconds between document frequency snapshots sent to the tagging processes.")
+    parser.add_argument("--df_memory", type=float, default=0,
+                        help="Megabytes for document frequency in a Count-Min Sketch, 0 counts every word exactly.")
+    parser.add_argument("--df_heavy", type=int, default=10000,
+                        help="Most frequent words counted exactly within the document frequency memory.")
+    parser.add_argument("--stats_dir", type=str, default="none",
+                        help="Directory to save document frequency to and load it from at startup.")
+    parser.add_argument("--stats_period", type=float, default=60, help="Seconds between document frequency saves.")
+    parser.add_argument("--scoring", type=str, default="dict", choices=["dict", "sparse"],
+                        help="Score a text at a time, or a whole batch as a sparse term matrix.")
+    parser.add_argument("--batch_size", type=int, default=64, help="Most pages tagged together.")
+    parser.add_argument("--consumer", type=str, default=None,
+                        help="Name of this replica in the stream consumer group, host and pid by default.")
     return parser.parse_args()
 
 # Convert everything to lowercase.
@@ -24,71 +63,98 @@ def parse_args():
 
 # At the same time, train Inverse Document Frequency
 
-def clean(words_list, to_remove):
-    for char in to_remove:
-        words_list.remove(char)
-
-
-def sand(words_list, to_remove):
-    """
-    Remove the most common words from a wordlist
-    :param words_list: List to operate on.
-    :param to_remove: Elements to remove.
-    """
-    words_list[:] = [word for word in words_list if word not in to_remove]
-
 
 class Indexer:
-    def __init__(self, timeout=120, worker_timeout=2):
+    def __init__(self, timeout=120, worker_timeout=2, queue_size=0, batch_size=64, workers=0, snapshot_period=5,
+                 df_memory=0, df_heavy=10000, stats_dir=None, stats_period=60,
+                 scoring="dict"):
         """
         Take a queue of link, text pairs and put them into a link, tag pair into an out queue.
+        With a queue size, a full out queue stalls tagging and a full in queue stops pulls,
+        so pages wait in Redis instead of in memory.
         :param timeout: Class timeout in seconds.
         :param worker_timeout: Workers timeout in seconds.
+        :param queue_size: Most items in each queue, 0 for unbounded.
+        :param batch_size: Most pages tokenized and scored together.
+        :param workers: Tagging processes, 0 tags on the loop thread.
+            Workers tag against a document frequency snapshot at most snapshot_period seconds old.
+        :param snapshot_period: Seconds between document frequency snapshots sent to the workers.
+        :param df_memory: Bytes for document frequency, 0 counts every word in a Counter that grows without bound.
+            Otherwise the df_heavy most frequent words are counted exactly and the rest share a Count-Min Sketch.
+        :param df_heavy: Words counted exactly within df_memory.
+        :param stats_dir: Directory document frequency is saved to every stats_period seconds,
+            and loaded from at startup so a restart tags with the IDF it had. None to start empty.
+        :param stats_period: Seconds between saves.
+        :param scoring: "dict" scores a text at a time, "sparse" scores each batch as a sparse term matrix.
         """
-        self.in_queue = queue.Queue()
-        self.out_queue = queue.Queue()
+        self.in_queue = queue.Queue(queue_size)
+        self.out_queue = queue.Queue(queue_size)
         self.lock = threading.Lock()
-        self.document_frequency = {}
+        self.document_frequency = FrequencySketch(df_memory, heavy=df_heavy) if df_memory else Counter()
         self.document_count = 0
-        self.common_words = [
-            "the", "be", "to", "of", "and", "a", "in", "that", "have", "I",
-            "it", "for", "not", "on", "with", "he", "as", "you", "do", "at",
-            "this", "but", "his", "by", "from", "they", "we", "say", "her", "she",
-            "or", "an", "will", "my", "one", "all", "would", "there", "their", "what",
-            "so", "up", "out", "if", "about", "who", "get", "which", "go", "me",
-            "when", "make", "can", "like", "time", "no", "just", "him", "know", "take",
-            "people", "into", "year", "your", "good", "some", "could", "them", "see", "other",
-            "than", "then", "now", "look", "only", "come", "its", "over", "think", "also",
-            "back", "after", "use", "two", "how", "our", "work", "first", "well", "way",
-            "even", "new", "want", "because", "any", "these", "give", "day", "most", "us", "was", "is"
-        ]
-        self.punctuation = [
-            '.', ',', ';', ':', '!', '?', '-', '_', '=', '+', '*', '/', '%', '(', ')', '[', ']', '{', '}',
-            "'", '"', '“', '”', '‘', '’', '<', '>', '©', '®', '™', '$', '#', '@', '&', '^', '~', '|', '\\',
-            '€', '£', '¥', '•', '¶', '…', '—', '›', '‹', '•', '...', '–'
-        ]
+        self.snapshots = None
+        # counts added since the last save.
+        self.unsaved = Counter()
+        self.stats_period = stats_period
+        if stats_dir:
+            self.snapshots = Snapshots(stats_dir)
+            self.load_stats()
+        self.tokenizer = Tokenizer()
+        self.batch_size = batch_size
+        self.sparse = scoring == "sparse"
+        self.pool = TagPool(workers) if workers else None
+        self.snapshot_period = snapshot_period
+        # batches handed to the pool and not yet merged, bounded so pages stay in the in queue.
+        self.in_flight = 0
+        self.max_in_flight = max(1, workers * 2)
+        # batches the pool has finished, merged on the loop thread so the pool never waits on a full out queue.
+        self.finished = queue.Queue()
         self.syncer = None
+        self.monitor = None
+        # stream pulls come as message id, page pairs that are acknowledged once tagged.
+        self.streamed = False
         self.timeout = timeout
         self.active = False
         self.worker_timeout = worker_timeout
         self.start(self.timeout)
 
-    def connect_redis(self, host, port, sync_period):
+    def connect_redis(self, host, port, sync_period, sync_mode="poll", transport="list", consumer=None,
+                      codec=None, link_tag_limit=0):
         """
         Start agent that syncs to redis.
         Link text is pulled, and pushed as link tags.
         :param host: Host to connect to.
         :param port: Port to connect to.
         :param sync_period: Time between syncs.
+        :param sync_mode: "poll" syncs every sync_period, "blocking" syncs as soon as items arrive.
+        :param transport: "list" pops link_text, "stream" reads it through the "indexers" consumer group,
+            so replicas share the pages and unacknowledged pages of a crashed replica are redelivered.
+        :param consumer: Name of this replica in the consumer group.
+        :param codec: Codec of items sent to Redis, plain JSON if None.
+        :param link_tag_limit: Most tags left waiting in Redis before tags back up locally, 0 for no limit.
         """
         redis_client = redis.Redis(host=host, port=port, db=0)
+        self.streamed = transport == "stream"
         self.syncer = Syncer(
             redis_client=redis_client,
             push_map=[(self.out_queue, "link_tag", False, -1, "queue")],
             pull_map=[(self.in_queue, "link_text", False, -1)],
-            sync_period=sync_period
+            sync_period=sync_period,
+            mode=sync_mode,
+            streams=["link_text"] if self.streamed else None,
+            group="indexers",
+            consumer=consumer,
+            codec=codec,
+            remote_limits={"link_tag": link_tag_limit} if link_tag_limit else None,
         )
         self.syncer.start()
+        self.monitor = BackpressureMonitor(
+            redis_client,
+            "backpressure:indexer",
+            queues={"link_text": self.in_queue, "link_tag": self.out_queue},
+            syncer=self.syncer,
+        )
+        self.monitor.start()
 
     def start(self, timeout):
         """
@@ -96,6 +162,10 @@ class Indexer:
         :param timeout: Time until shutdown.
         """
         self.active = True
+        if self.pool:
+            self.pool.start()
+        if self.snapshots:
+            threading.Thread(target=self.save_loop, daemon=True).start()
         delayed_action(timeout, self.quit)
         thread = threading.Thread(
             target=self.loop
@@ -108,8 +178,60 @@ class Indexer:
         """
         self.active = False
         time.sleep(10)
+        if self.pool:
+            self.pool.stop()
+        if self.snapshots:
+            self.save_stats()
         if self.syncer:
             self.syncer.stop()
+        if self.monitor:
+            self.monitor.stop()
+
+    def load_stats(self):
+        """
+        Start from the latest saved document frequency.
+        A saved Counter is folded into a configured sketch, a saved sketch can not become a Counter again.
+        """
+        loaded = self.snapshots.load()
+        if not loaded:
+            return
+        frequency, document_count, version = loaded
+        if isinstance(self.document_frequency, FrequencySketch) and not isinstance(frequency, FrequencySketch):
+            self.document_frequency.update(frequency)
+        elif isinstance(self.document_frequency, FrequencySketch) == isinstance(frequency, FrequencySketch):
+            self.document_frequency = frequency
+        else:
+            print("Saved document frequency is a sketch, starting empty.")
+            # the next save starts a new base rather than a delta on the old one.
+            self.snapshots.base_words = 0
+            return
+        self.document_count = document_count
+        print(f"Loaded document frequency version {version}, {document_count} documents.")
+
+    def save_stats(self):
+        """
+        Save the counts added since the last save. Only a copy is taken under the lock,
+        and for a Counter only when the save writes a whole new base.
+        """
+        with self.lock:
+            if not self.unsaved:
+                return
+            delta, self.unsaved = self.unsaved, Counter()
+            document_count = self.document_count
+            frequency = self.document_frequency
+            frequency = frequency.copy() if self.snapshots.needs_base(frequency, delta) else None
+        try:
+            self.snapshots.save(frequency, document_count, delta)
+        except OSError as e:
+            print("Error saving document frequency:", e)
+            with self.lock:
+                delta.update(self.unsaved)
+                self.unsaved = delta
+
+    def save_loop(self):
+        while self.active:
+            time.sleep(self.stats_period)
+            self.save_stats()
 
     def tfidf_score(self, text, is_document=True):
         """
@@ -118,26 +240,45 @@ class Indexer:
         :param is_document: If the text counts towards the total weightings.
         :return: Scoring dictionary.
         """
-        # find term frequency
-        words_list = text.lower().split()
-        sand(words_list, self.common_words)
-        sand(words_list, self.punctuation)
-        counts = Counter(words_list)
-        if is_document:
-            with self.lock:
-                self.document_count += 1
-                for term, value in counts.items():
-                    self.document_frequency[term] = self.document_frequency.get(term, 0) + value
+        return self.tfidf_scores([text], is_document)[0]
+
+    def tfidf_scores(self, texts, is_document=True):
+        """
+        Score many texts at once.
+        :param texts: List of texts to score.
+        :param is_document: If the texts count towards the total weightings.
+        :return: List of scoring dictionaries.
+        """
+        return self.weigh(
+            texts,
+            lambda all_counts, frequency, document_count: [
+                tfidf(counts, frequency, document_count) for counts in all_counts
+            ],
+            is_document,
+        )
+
+    def weigh(self, texts, score, is_document=True):
+        """
+        Tokens of every text are counted in one pass, and the weightings are updated and read under a single lock.
+        :param texts: List of texts.
+        :param score: Function of the texts' Counters, a document frequency function and the document count.
+        :param is_document: If the texts count towards the total weightings.
+        :return: What score returns.
+        """
+        all_counts = self.tokenizer.count_many(texts)
+        batch = Counter()
+        for counts in all_counts:
+            batch.update(counts)
 
-        # Calculate scores per word in place.
         with self.lock:
-            scores = {
-                word: (count / len(words_list)) *
-                      (log((1 + self.document_count) / (1 + self.document_frequency[word])) + 1)
-                for word, count in counts.items()
-            }
+            if is_document:
+                self.document_count += len(all_counts)
+                self.document_frequency.update(batch)
+                if self.snapshots:
+                    self.unsaved.update(batch)
 
-        return scores
+            # Calculate scores per word in place.
+            return score(all_counts, frequencies(self.document_frequency, batch.keys()), self.document_count)
 
     def tag(self, text, count=3):
         """
@@ -146,25 +287,112 @@ class Indexer:
         :param count: How many labels to make
         :return: list of strings
         """
-        if not text:
-            return []
+        return self.tag_many([text], count)[0]
 
-        scores = self.tfidf_score(text)
-        top_n = sorted(scores.items(), key = lambda item: item[1], reverse=True)[:count]
-        return [word for word, _ in top_n]
+    def tag_many(self, texts, count=3):
+        """
+        Returns ideal tags for many texts, scored together.
+        In sparse scoring the whole batch is scored with array operations, with the same tags as a text at a time.
+        :param texts: List of texts to index.
+        :param count: How many labels to make per text.
+        :return: List of lists of strings.
+        """
+        indexed = [i for i, text in enumerate(texts) if text]
+        tags = [[] for _ in texts]
+        if self.sparse:
+            all_tags = self.weigh(
+                [texts[i] for i in indexed],
+                lambda all_counts, frequency, document_count: sparse_tags(all_counts, frequency, document_count, count),
+            )
+        else:
+            all_tags = [top_tags(scores, count) for scores in self.tfidf_scores([texts[i] for i in indexed])]
+        for i, text_tags in zip(indexed, all_tags):
+            tags[i] = text_tags
+        return tags
 
     def loop(self):
         """
         Primary loop of Indexer object. Pop link and text into a link and tag queue.
-        :return:
+        Takes whatever pages are waiting, up to the batch size, and tags them together.
         """
+        published = 0
         while self.active:
+            self.collect()
             try:
-                link, text = self.in_queue.get_nowait()
-                tags = self.tag(text, count=5)
-                self.out_queue.put((link, tags))
+                # wakes as soon as a page arrives instead of sleeping out the timeout,
+                # and soon enough to pass on finished batches while the pool works.
+                items = [self.in_queue.get(timeout=self.worker_timeout if not self.in_flight else 0.05)]
             except queue.Empty:
-                time.sleep(self.worker_timeout)
+                continue
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.in_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            pages = [item if not self.streamed else item[1] for item in items]
+            if not self.pool:
+                self.emit(items, pages, self.tag_many([text for _, text in pages], count=5))
+                continue
+
+            if time.monotonic() - published >= self.snapshot_period:
+                published = time.monotonic()
+                with self.lock:
+                    frequency, document_count = self.document_frequency.copy(), self.document_count
+                self.pool.publish(frequency, document_count)
+            while self.in_flight >= self.max_in_flight:
+                self.collect(wait=True)
+            self.in_flight += 1
+            future = self.pool.submit([text for _, text in pages], 5, self.sparse)
+            future.add_done_callback(lambda done, items=items, pages=pages: self.finished.put((done, items, pages)))
+
+        # batches still in the pool are passed on before the loop ends.
+        while self.in_flight:
+            self.collect(wait=True)
+
+    def collect(self, wait=False):
+        """
+        Finish the batches the pool is done with, on the loop thread.
+        :param wait: Wait up to worker_timeout for a batch if none is done yet.
+        """
+        while self.in_flight:
+            try:
+                if wait:
+                    future, items, pages = self.finished.get(timeout=self.worker_timeout)
+                else:
+                    future, items, pages = self.finished.get_nowait()
+            except queue.Empty:
+                return
+            wait = False
+            self.in_flight -= 1
+            self.finish(future, items, pages)
+
+    def finish(self, future, items, pages):
+        """
+        Merge a worker's document frequency counts and pass its tags on.
+        A batch the pool failed is tagged here instead, so its pages are not lost.
+        """
+        try:
+            all_tags, delta, documents = future.result()
+        except Exception as e:
+            print("Error tagging batch in the pool, tagging it here:", e)
+            self.emit(items, pages, self.tag_many([text for _, text in pages], count=5))
+            return
+        with self.lock:
+            self.document_count += documents
+            self.document_frequency.update(delta)
+            if self.snapshots:
+                self.unsaved.update(delta)
+        self.emit(items, pages, all_tags)
+
+    def emit(self, items, pages, all_tags):
+        """
+        Queue link, tags pairs, then acknowledge their pages when they came from a stream.
+        """
+        for item, (link, _), tags in zip(items, pages, all_tags):
+            self.out_queue.put((link, tags))
+            if self.streamed:
+                self.syncer.ack("link_text", item[0])
 
 
 def run():
@@ -172,10 +400,22 @@ def run():
 
     indexer = Indexer(
         timeout=args.timeout,
+        queue_size=args.queue_size,
+        batch_size=args.batch_size,
+        scoring=args.scoring,
+        workers=args.workers,
+        snapshot_period=args.snapshot_period,
+        df_memory=int(args.df_memory * 2 ** 20),
+        df_heavy=args.df_heavy,
+        stats_dir=None if args.stats_dir == "none" else args.stats_dir,
+        stats_period=args.stats_period,
     )
 
     if args.redis_host != "none":
-        indexer.connect_redis(args.redis_host, args.redis_port, sync_period=5)
+        indexer.connect_redis(args.redis_host, args.redis_port, sync_period=args.sync_period,
+                              sync_mode=args.sync_mode, transport=args.transport, consumer=args.consumer,
+                              codec=Codec(args.codec, None if args.compression == "none" else args.compression),
+                              link_tag_limit=args.link_tag_limit)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,218 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from math import log
+
+import numpy as np
+
+from shared.utils.Tokenizer import Tokenizer
+
+
+def tfidf(counts, frequency, document_count):
+    """
+    Term Frequency X Inverse Document Frequency of every word in one text.
+    :param counts: Counter of the text's tokens.
+    :param frequency: Function giving the document frequency of a word.
+    :param document_count: Documents counted so far.
+    :return: Scoring dictionary.
+    """
+    total = sum(counts.values())
+    return {
+        word: (count / total) * (log((1 + document_count) / (1 + frequency(word))) + 1)
+        for word, count in counts.items()
+    }
+
+
+def frequencies(store, words):
+    """
+    Look up the document frequency of many words, all at once when the store can.
+    :param store: Counter or FrequencySketch.
+    :param words: Collection of words.
+    :return: Function giving the document frequency of one of the words.
+    """
+    if hasattr(store, "get_many"):
+        return store.get_many(words).__getitem__
+    if isinstance(store, Counter):
+        # missing words give 0.
+        return store.__getitem__
+    return lambda word: store.get(word, 0)
+
+
+def top_tags(scores, count):
+    """
+    :param scores: Scoring dictionary.
+    :param count: How many labels to make.
+    :return: The highest scoring words.
+    """
+    top_n = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:count]
+    return [word for word, _ in top_n]
+
+
+def sparse_tags(all_counts, frequency, document_count, count):
+    """
+    Tag a whole batch with array operations, giving the same tags as tfidf and top_tags per text.
+    The batch is laid out as a CSR term matrix, one row per text and one column per distinct word,
+    then the count-th best score of each row is found with argpartition and only scores at or above it are sorted.
+    :param all_counts: List of Counters, one per text.
+    :param frequency: Function giving the document frequency of a word.
+    :param document_count: Documents counted so far.
+    :param count: How many labels to make per text.
+    :return: List of lists of strings.
+    """
+    lengths = np.fromiter((len(counts) for counts in all_counts), dtype=np.intp, count=len(all_counts))
+    width = int(lengths.max(initial=0))
+    if not width or count < 1:
+        return [[] for _ in all_counts]
+
+    # words interned in the order they first appear, iterated without a Python level loop.
+    vocabulary = list(dict.fromkeys(chain.from_iterable(all_counts)))
+    columns = dict(zip(vocabulary, range(len(vocabulary))))
+    indices = np.fromiter(map(columns.__getitem__, chain.from_iterable(all_counts)),
+                          dtype=np.intp, count=int(lengths.sum()))
+    data = np.fromiter(chain.from_iterable(map(Counter.values, all_counts)), dtype=np.float64, count=len(indices))
+    # math.log per distinct word, so scores are bit for bit those of tfidf.
+    ratios = (1 + document_count) / (1 + np.fromiter(map(frequency, vocabulary), dtype=np.float64, count=len(vocabulary)))
+    idf = np.fromiter(map(log, ratios.tolist()), dtype=np.float64, count=len(vocabulary)) + 1
+
+    rows = np.repeat(np.arange(len(all_counts)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    totals = np.add.reduceat(data, starts[lengths > 0])
+    row_totals = np.zeros(len(all_counts))
+    row_totals[lengths > 0] = totals
+    scores = data / row_totals[rows] * idf[indices]
+
+    # rows padded to the longest, short rows are filled with -inf.
+    positions = np.arange(len(indices)) - starts[rows]
+    padded = np.full((len(all_counts), width), -np.inf)
+    padded[rows, positions] = scores
+    kth = width - min(count, width)
+    best = np.argpartition(padded, kth, axis=1)[:, kth]
+    threshold = padded[np.arange(len(all_counts)), best]
+
+    # ties keep the order words first appear in, as the stable sort of top_tags does.
+    candidates = np.flatnonzero(scores >= threshold[rows])
+    candidates = candidates[np.lexsort((candidates, -scores[candidates], rows[candidates]))]
+    candidate_rows = rows[candidates]
+    first = np.searchsorted(candidate_rows, candidate_rows)
+    kept = candidates[np.arange(len(candidates)) - first < count]
+
+    tags = [[] for _ in all_counts]
+    for row, column in zip(rows[kept].tolist(), indices[kept].tolist()):
+        tags[row].append(vocabulary[column])
+    return tags
+
+
+# state of each worker process, filled by _init_worker.
+_worker = {}
+
+
+def _init_worker():
+    _worker.update(tokenizer=Tokenizer(), version=-1, frequency=Counter(), document_count=0, delta=Counter(),
+                   delta_count=0)
+
+
+def _load_snapshot(version, path):
+    """
+    Swap in a newer document frequency snapshot. The snapshot already holds the deltas this worker sent,
+    so the local delta starts over.
+    """
+    if version == _worker["version"]:
+        return
+    if path:
+        with open(path, "rb") as file:
+            frequency, document_count = pickle.load(file)
+    else:
+        frequency, document_count = Counter(), 0
+    _worker.update(version=version, frequency=frequency, document_count=document_count,
+                   delta=Counter(), delta_count=0)
+
+
+def _tag_batch(texts, count, version, path, sparse=False):
+    """
+    Tag texts against the latest snapshot plus what this worker has counted since.
+    :return: Tags per text, Counter of the batch's document frequency, number of documents counted.
+    """
+    _load_snapshot(version, path)
+    texts = list(texts)
+    indexed = [i for i, text in enumerate(texts) if text]
+    all_counts = _worker["tokenizer"].count_many([texts[i] for i in indexed])
+
+    batch = Counter()
+    for counts in all_counts:
+        batch.update(counts)
+    delta = _worker["delta"]
+    delta.update(batch)
+    _worker["delta_count"] += len(all_counts)
+
+    snapshot = frequencies(_worker["frequency"], batch.keys())
+    document_count = _worker["document_count"] + _worker["delta_count"]
+
+    def frequency(word):
+        return snapshot(word) + delta[word]
+
+    tags = [[] for _ in texts]
+    if sparse:
+        for i, text_tags in zip(indexed, sparse_tags(all_counts, frequency, document_count, count)):
+            tags[i] = text_tags
+    else:
+        for i, counts in zip(indexed, all_counts):
+            tags[i] = top_tags(tfidf(counts, frequency, document_count), count)
+    return tags, batch, len(all_counts)
+
+
+class TagPool:
+    def __init__(self, workers):
+        """
+        Tags batches of texts in worker processes, so tagging uses every core instead of one under the GIL.
+        Workers count document frequency locally and send it back with each batch for the parent to merge.
+        The parent publishes the merged table as a snapshot file every so often, and workers tag against
+        the newest snapshot plus their own counts since.
+        :param workers: Number of worker processes.
+        """
+        self.workers = workers
+        self.executor = None
+        self.directory = None
+        self.path = None
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix="tagpool-")
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+
+    def stop(self):
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        if self.directory:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
+
+    def publish(self, frequency, document_count):
+        """
+        Hand workers a new snapshot. Written to a new file then renamed, so workers never read half of one.
+        :param frequency: Counter or FrequencySketch of document frequency, not modified.
+        :param document_count: Documents counted so far.
+        """
+        with self.lock:
+            path = os.path.join(self.directory, "frequency.pickle")
+            temporary = path + ".tmp"
+            with open(temporary, "wb") as file:
+                pickle.dump((frequency, document_count), file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+            self.path = path
+            self.version += 1
+
+    def submit(self, texts, count, sparse=False):
+        """
+        :param texts: List of texts.
+        :param count: How many labels to make per text.
+        :param sparse: Score with sparse_tags rather than per text.
+        :return: Future of (tags per text, Counter of document frequency to merge, documents counted).
+        """
+        return self.executor.submit(_tag_batch, texts, count, self.version, self.path, sparse)
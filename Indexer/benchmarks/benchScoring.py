@@ -0,0 +1,50 @@
+import argparse
+import time
+from collections import Counter
+
+from Indexer.app.TagPool import frequencies, sparse_tags, tfidf, top_tags
+from shared.benchmarks.benchTokenizer import generate
+from shared.utils.Tokenizer import Tokenizer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Docs/sec scoring and tagging per text against the sparse batch path.")
+    parser.add_argument("--documents", type=int, default=4000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=700, help="Words per generated document.")
+    parser.add_argument("--batch", type=int, nargs="+", default=[16, 64, 256], help="Documents per batch.")
+    return parser.parse_args()
+
+
+def run():
+    args = parse_args()
+    tokenizer = Tokenizer()
+    all_counts = tokenizer.count_many(generate(args.documents, args.words))
+    frequency = Counter()
+    for counts in all_counts:
+        frequency.update(counts)
+    document_count = len(all_counts)
+    print(f"{document_count} documents, {len(frequency)} distinct words, scoring only")
+
+    for size in args.batch:
+        batches = [all_counts[i:i + size] for i in range(0, len(all_counts), size)]
+        runs = [
+            ("dict", lambda counts_batch, lookup: [
+                top_tags(tfidf(counts, lookup, document_count), 5) for counts in counts_batch
+            ]),
+            ("sparse", lambda counts_batch, lookup: sparse_tags(counts_batch, lookup, document_count, 5)),
+        ]
+        results = {}
+        for name, action in runs:
+            start = time.perf_counter()
+            results[name] = [
+                tags
+                for counts_batch in batches
+                for tags in action(counts_batch, frequencies(frequency, set().union(*counts_batch)))
+            ]
+            elapsed = time.perf_counter() - start
+            print(f"batch {size:>4} {name:>7}: {document_count / elapsed:10.0f} docs/sec")
+        assert results["dict"] == results["sparse"]
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,95 @@
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from math import log
+
+from Indexer.app.TagPool import frequencies, tfidf, top_tags
+from shared.benchmarks.benchTokenizer import generate
+from shared.utils.FrequencySketch import FrequencySketch
+from shared.utils.Tokenizer import Tokenizer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="IDF error and tag overlap of FrequencySketch against exact counts.")
+    parser.add_argument("--documents", type=int, default=3000, help="Generated documents counted.")
+    parser.add_argument("--words", type=int, default=500, help="Words per generated document.")
+    parser.add_argument("--junk", type=float, default=0.05,
+                        help="Share of words replaced by one-off tokens, like IDs, hashes and misspellings.")
+    parser.add_argument("--memory", type=float, nargs="+", default=[1, 2, 4, 8], help="Sketch budgets in MB.")
+    parser.add_argument("--heavy", type=int, default=2000, help="Words counted exactly.")
+    parser.add_argument("--held_out", type=int, default=300, help="Documents tagged but not counted.")
+    parser.add_argument("--batch", type=int, default=64, help="Documents per update.")
+    return parser.parse_args()
+
+
+def with_junk(texts, share):
+    rng = random.Random(1)
+    out = []
+    for text in texts:
+        words = text.split()
+        for i in rng.sample(range(len(words)), int(len(words) * share)):
+            words[i] = f"{rng.getrandbits(40):x}"
+        out.append(" ".join(words))
+    return out
+
+
+def counter_bytes(counter):
+    return sys.getsizeof(counter) + sum(sys.getsizeof(word) + sys.getsizeof(count) for word, count in counter.items())
+
+
+def idf(document_count, frequency):
+    return log((1 + document_count) / (1 + frequency)) + 1
+
+
+def fill(store, all_counts, batch):
+    start = time.perf_counter()
+    for i in range(0, len(all_counts), batch):
+        merged = Counter()
+        for counts in all_counts[i:i + batch]:
+            merged.update(counts)
+        store.update(merged)
+    return time.perf_counter() - start
+
+
+def tags(store, document_count, held_out):
+    words = set().union(*held_out)
+    frequency = frequencies(store, words)
+    return [top_tags(tfidf(counts, frequency, document_count), 5) for counts in held_out]
+
+
+def run():
+    args = parse_args()
+    texts = with_junk(generate(args.documents + args.held_out, args.words), args.junk)
+    tokenizer = Tokenizer()
+    all_counts = tokenizer.count_many(texts[:args.documents])
+    held_out = tokenizer.count_many(texts[args.documents:])
+    document_count = len(all_counts)
+
+    exact = Counter()
+    elapsed = fill(exact, all_counts, args.batch)
+    exact_tags = tags(exact, document_count, held_out)
+    words = sorted(set().union(*held_out))
+    print(f"{document_count} documents, {len(exact)} distinct words, "
+          f"exact Counter {counter_bytes(exact) / 2 ** 20:.1f} MB, {elapsed:.2f}s")
+    print(f"{'budget':>8} {'used':>8} {'mean idf err':>13} {'max idf err':>12} {'tag overlap':>12} {'time':>7}")
+
+    for megabytes in args.memory:
+        sketch = FrequencySketch(int(megabytes * 2 ** 20), heavy=args.heavy)
+        elapsed = fill(sketch, all_counts, args.batch)
+        estimates = sketch.get_many(words)
+        errors = [
+            abs(idf(document_count, estimates[word]) - idf(document_count, exact[word])) / idf(document_count, exact[word])
+            for word in words
+        ]
+        overlap = [
+            len(set(a) & set(b)) / max(len(set(a) | set(b)), 1)
+            for a, b in zip(exact_tags, tags(sketch, document_count, held_out))
+        ]
+        print(f"{megabytes:>6.1f}MB {sketch.nbytes / 2 ** 20:>6.1f}MB {sum(errors) / len(errors):>12.2%} "
+              f"{max(errors):>11.2%} {sum(overlap) / len(overlap):>11.2%} {elapsed:>6.2f}s")
+
+
+if __name__ == "__main__":
+    run()
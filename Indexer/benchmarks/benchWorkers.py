@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+
+from Indexer.app.TagPool import TagPool
+from shared.benchmarks.benchTokenizer import generate
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Documents/sec tagged by TagPool at each worker count.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to try.")
+    parser.add_argument("--documents", type=int, default=4000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=700, help="Words per generated document.")
+    parser.add_argument("--batch", type=int, default=64, help="Documents per submitted batch.")
+    return parser.parse_args()
+
+
+def tag_all(pool, texts, batch, in_flight):
+    """
+    Submit every batch, keeping at most in_flight waiting, and merge the returned counts like the Indexer does.
+    """
+    frequency = {}
+    document_count = 0
+    pending = []
+    for i in range(0, len(texts), batch):
+        pending.append(pool.submit(texts[i:i + batch], 5))
+        while len(pending) >= in_flight or (i + batch >= len(texts) and pending):
+            _, delta, documents = pending.pop(0).result()
+            document_count += documents
+            for term, value in delta.items():
+                frequency[term] = frequency.get(term, 0) + value
+    return frequency, document_count
+
+
+def run():
+    args = parse_args()
+    texts = generate(args.documents, args.words)
+    print(f"{len(texts)} documents, {os.cpu_count()} cores")
+
+    baseline = None
+    for workers in args.workers:
+        pool = TagPool(workers)
+        pool.start()
+        pool.publish({}, 0)
+        # start every worker process before timing.
+        for future in [pool.submit(["warm up"], 1) for _ in range(workers)]:
+            future.result()
+
+        start = time.perf_counter()
+        _, document_count = tag_all(pool, texts, args.batch, workers * 2)
+        elapsed = time.perf_counter() - start
+        pool.stop()
+
+        rate = document_count / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>3} workers: {rate:10.0f} docs/sec, {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    run()
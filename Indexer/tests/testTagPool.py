@@ -0,0 +1,86 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from Indexer.app.Indexer import Indexer
+from Indexer.app.TagPool import TagPool, sparse_tags, tfidf, top_tags
+from shared.utils.Tokenizer import Tokenizer
+
+PAGES = [("https://a.com/", "apple banana apple"), ("https://b.com/", ""), ("https://c.com/", "cherry banana")]
+
+
+def batch(documents=200, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(300)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [Counter(rng.choices(vocabulary, weights, k=rng.randint(0, 40))) for _ in range(documents)]
+
+
+def run_pages(indexer, pages):
+    for page in pages:
+        indexer.in_queue.put(page)
+    try:
+        return dict(indexer.out_queue.get(timeout=10) for _ in pages)
+    finally:
+        indexer.active = False
+        time.sleep(0.3)
+        indexer.pool.stop()
+
+
+def test_sparse_matches_per_text():
+    all_counts = batch()
+    frequency = Counter()
+    for counts in all_counts:
+        frequency.update(counts)
+    lookup = lambda word: frequency.get(word, 0)
+    for count in [1, 5, 50]:
+        expected = [top_tags(tfidf(counts, lookup, 200), count) if counts else [] for counts in all_counts]
+        assert sparse_tags(all_counts, lookup, 200, count) == expected
+
+
+def test_sparse_ties_keep_first_seen_order():
+    all_counts = [Counter(["c", "b", "a", "d", "d"]), Counter(), Counter(["x"])]
+    assert sparse_tags(all_counts, lambda word: 0, 1, 3) == [["d", "c", "b"], [], ["x"]]
+    assert sparse_tags([Counter(), Counter()], lambda word: 0, 1, 3) == [[], []]
+
+
+def test_pool_merges_counts():
+    tokenizer = Tokenizer()
+    texts = [text for _, text in PAGES]
+    pool = TagPool(1)
+    pool.start()
+    try:
+        pool.publish(Counter({"banana": 10}), 10)
+        for sparse in [False, True]:
+            tags, delta, documents = pool.submit(texts, 2, sparse).result()
+            assert tags[1] == [] and documents == 2
+            assert delta == tokenizer.count(texts[0]) + tokenizer.count(texts[2])
+            assert tags[0] == ["apple", "banana"]
+    finally:
+        pool.stop()
+
+
+def test_indexer_merges_worker_counts():
+    indexer = Indexer(timeout=600, worker_timeout=0.1, workers=1)
+    tags = run_pages(indexer, PAGES)
+
+    assert tags["https://a.com/"][0] == "apple" and tags["https://b.com/"] == []
+    # the worker's counts are merged back into the Indexer's table.
+    assert indexer.document_count == 2
+    assert indexer.document_frequency == {"apple": 2, "banana": 2, "cherry": 1}
+
+
+def test_failed_batch_is_tagged_here():
+    indexer = Indexer(timeout=600, worker_timeout=0.1, workers=1)
+
+    def submit(texts, count, sparse=False):
+        future = Future()
+        future.set_exception(RuntimeError("worker died"))
+        return future
+
+    indexer.pool.submit = submit
+    tags = run_pages(indexer, PAGES)
+
+    assert set(tags) == {link for link, _ in PAGES}
+    assert tags["https://c.com/"] and indexer.document_count == 2
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import signal
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+from aiohttp import web
+
+from shared.index.IndexFeeder import IndexFeeder
+from shared.index.QueryEngine import QueryEngine
+from shared.index.SegmentedIndex import SegmentedIndex
+from shared.utils.Codec import Codec
+from shared.utils.ResultCache import ResultCache
+from shared.utils.Tokenizer import Tokenizer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Run the Searcher to answer queries over HTTP.')
+    parser.add_argument("--timeout", type=int, default=0, help="Timeout in seconds, 0 to serve until stopped.")
+    parser.add_argument("--host", type=str, default="0.0.0.0", help="Address to serve on.")
+    parser.add_argument("--port", type=int, default=8080, help="Port to serve on.")
+    parser.add_argument("--index_dir", type=str, default="index", help="Directory of index segments.")
+    parser.add_argument("--read_only", action="store_true",
+                        help="Serve an index another Searcher writes, reloading it as it changes.")
+    parser.add_argument("--reload_period", type=float, default=5,
+                        help="Seconds between checks for new segments of a read only index.")
+    parser.add_argument("--buffer_documents", type=int, default=50000,
+                        help="Documents buffered in memory before they are written as a segment.")
+    parser.add_argument("--flush_period", type=float, default=30,
+                        help="Most seconds a fed page waits to be written as a segment and acknowledged.")
+    parser.add_argument("--scoring", type=str, default="bm25", choices=["bm25", "tfidf"], help="Ranking function.")
+    parser.add_argument("--cache_size", type=int, default=10000, help="Most query results cached.")
+    parser.add_argument("--cache_ttl", type=float, default=30, help="Seconds a cached result is served.")
+    parser.add_argument("--query_threads", type=int, default=4, help="Threads running searches.")
+    parser.add_argument("--max_results", type=int, default=100, help="Most results a query can ask for.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--sync_mode", type=str, default="blocking", choices=["poll", "blocking"],
+                        help="Sync with Redis every sync period, or as soon as items arrive.")
+    parser.add_argument("--sync_period", type=float, default=5, help="Seconds between polled syncs.")
+    parser.add_argument("--codec", type=str, default="json", choices=["json", "msgpack"],
+                        help="Encoding of items sent to Redis, every service reads both.")
+    parser.add_argument("--compression", type=str, default="none", choices=["none", "zstd", "lz4"],
+                        help="Compression of large msgpack items.")
+    parser.add_argument("--consumer", type=str, default=None,
+                        help="Name of this replica in the stream consumer group, host and pid by default.")
+    return parser.parse_args()
+
+
+class Searcher:
+    def __init__(self, index_dir, timeout=0, read_only=False, reload_period=5, buffer_documents=50000,
+                 scoring="bm25", cache_size=10000, cache_ttl=30, query_threads=4, max_results=100, flush_period=30):
+        """
+        Serves /search?q= over HTTP from a segmented index of the link_text stream.
+        A Searcher either feeds its own index from Redis, with new pages searchable as they arrive,
+        or reads an index another Searcher writes, picking up its new segments every reload_period.
+        A reload swaps the segments under a short lock, so queries already running finish on the old
+        segments and no request waits or fails.
+        Searches run on a thread pool, and results are cached by normalized query: the tokens,
+        deduplicated and sorted, so "Cats and dogs" and "dogs cats" share an entry.
+        :param index_dir: Directory of index segments.
+        :param timeout: Seconds to serve, 0 to serve until stopped.
+        :param read_only: Serve an index written by another process.
+        :param reload_period: Seconds between checks for new segments of a read only index.
+        :param buffer_documents: Documents buffered in memory before a flush.
+        :param scoring: "bm25" or "tfidf".
+        :param cache_size: Most results cached.
+        :param cache_ttl: Seconds a result is served from the cache.
+        :param query_threads: Threads running searches.
+        :param max_results: Most results a query can ask for.
+        :param flush_period: Most seconds a fed page waits to be written as a segment and acknowledged.
+        """
+        self.index = SegmentedIndex(index_dir, buffer_documents=buffer_documents, read_only=read_only)
+        self.engine = QueryEngine(self.index, scoring=scoring)
+        self.cache = ResultCache(cache_size, cache_ttl)
+        self.tokenizer = Tokenizer()
+        self.executor = ThreadPoolExecutor(query_threads)
+        self.timeout = timeout
+        self.read_only = read_only
+        self.reload_period = reload_period
+        self.max_results = max_results
+        self.flush_period = flush_period
+        # part of every cache key, so results of an index before a reload are never served after it.
+        self.version = 0
+        self.reloads = 0
+        self.feeder = None
+        self.runner = None
+        self.reloader = None
+        self.running = False
+
+    def connect_redis(self, host, port, sync_period, sync_mode="blocking", consumer=None, codec=None):
+        """
+        Feed the index from the link_text stream, through the "search" consumer group.
+        :param host: Host to connect to.
+        :param port: Port to connect to.
+        :param sync_period: Time between polled syncs.
+        :param sync_mode: "poll" or "blocking".
+        :param consumer: Name of this replica in the consumer group.
+        :param codec: Codec of items in Redis, plain JSON if None.
+        """
+        if self.read_only:
+            raise ValueError("a read only Searcher does not feed its index")
+        self.feeder = IndexFeeder(self.index, flush_period=self.flush_period)
+        self.feeder.connect_redis(redis.Redis(host=host, port=port, db=0), sync_period, sync_mode,
+                                  consumer=consumer, codec=codec)
+        self.feeder.start()
+
+    def app(self):
+        app = web.Application()
+        app.add_routes([web.get("/search", self.handle_search), web.get("/stats", self.handle_stats)])
+        return app
+
+    def normalize(self, query):
+        """
+        :return: Tuple of the query's distinct tokens, sorted.
+        """
+        return tuple(sorted(set(self.tokenizer.tokenize(query))))
+
+    async def search(self, query, k=10):
+        """
+        :return: List of link, score pairs, and where they came from as for ResultCache.
+        """
+        terms = self.normalize(query)
+        if not terms:
+            return [], "empty"
+        loop = asyncio.get_running_loop()
+        return await self.cache.get_or_compute(
+            (self.version, terms, k),
+            lambda: loop.run_in_executor(self.executor, self.engine.search, list(terms), k),
+        )
+
+    async def handle_search(self, request):
+        query = request.query.get("q", "")
+        try:
+            k = int(request.query.get("k", 10))
+        except ValueError:
+            raise web.HTTPBadRequest(text="k must be a number")
+        if not 1 <= k <= self.max_results:
+            raise web.HTTPBadRequest(text=f"k must be from 1 to {self.max_results}")
+        start = time.perf_counter()
+        results, source = await self.search(query, k)
+        return web.json_response({
+            "query": query,
+            "results": [{"link": link, "score": score} for link, score in results],
+            "cache": source,
+            "ms": round((time.perf_counter() - start) * 1000, 3),
+        })
+
+    async def handle_stats(self, request):
+        return web.json_response({
+            "documents": len(self.index),
+            "segments": len(self.index.segments),
+            "generation": self.index.generation,
+            "reloads": self.reloads,
+            "cache": self.cache.stats(),
+        })
+
+    async def reload_loop(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            await asyncio.sleep(self.reload_period)
+            try:
+                changed = await loop.run_in_executor(self.executor, self.index.refresh)
+            except OSError as e:
+                # a merge removed a segment while it was being opened, the next check sees the new manifest.
+                print("Error reloading index:", e)
+                continue
+            if changed:
+                self.version += 1
+                self.reloads += 1
+
+    async def serve(self, host="0.0.0.0", port=8080):
+        """
+        Start answering requests without waiting for the timeout.
+        """
+        self.running = True
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        if self.read_only:
+            self.reloader = asyncio.create_task(self.reload_loop())
+        print(f"Searcher serving {len(self.index)} documents on {host}:{port}.")
+
+    async def start(self, host="0.0.0.0", port=8080):
+        """
+        Serve until the timeout or a SIGTERM or SIGINT, then quit.
+        """
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopped.set)
+        await self.serve(host, port)
+        try:
+            await asyncio.wait_for(stopped.wait(), self.timeout or None)
+        except asyncio.TimeoutError:
+            pass
+        await self.quit()
+
+    async def quit(self):
+        """
+        Stop serving, then write what the feeder indexed as a segment.
+        """
+        self.running = False
+        if self.reloader:
+            self.reloader.cancel()
+        if self.runner:
+            await self.runner.cleanup()
+        if self.feeder:
+            self.feeder.stop()
+        if not self.read_only:
+            self.index.close()
+        self.executor.shutdown()
+
+
+def run():
+    args = parse_args()
+
+    searcher = Searcher(
+        args.index_dir,
+        timeout=args.timeout,
+        read_only=args.read_only,
+        reload_period=args.reload_period,
+        buffer_documents=args.buffer_documents,
+        scoring=args.scoring,
+        cache_size=args.cache_size,
+        cache_ttl=args.cache_ttl,
+        query_threads=args.query_threads,
+        max_results=args.max_results,
+        flush_period=args.flush_period,
+    )
+
+    if args.redis_host != "none" and not args.read_only:
+        searcher.connect_redis(args.redis_host, args.redis_port, sync_period=args.sync_period,
+                               sync_mode=args.sync_mode, consumer=args.consumer,
+                               codec=Codec(args.codec, None if args.compression == "none" else args.compression))
+
+    asyncio.run(searcher.start(args.host, args.port))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+from aiohttp import ClientSession
+
+from shared.benchmarks.benchIndex import documents, percentile, zipf
+from shared.index.SegmentedIndex import SegmentedIndex
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test a Searcher, reporting QPS and latency percentiles.")
+    parser.add_argument("--url", type=str, default="none",
+                        help="Searcher to load, or none to start one over a generated index.")
+    parser.add_argument("--documents", type=int, default=200000, help="Documents of the generated index.")
+    parser.add_argument("--vocabulary", type=int, default=100000, help="Distinct terms of generated documents.")
+    parser.add_argument("--distinct", type=int, default=2000,
+                        help="Distinct queries, drawn by Zipf so popular ones repeat as real traffic does.")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests sent.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight.")
+    parser.add_argument("--port", type=int, default=8089, help="Port of a started Searcher.")
+    parser.add_argument("--cache_size", type=int, default=10000, help="Cache size of a started Searcher, 0 for none.")
+    return parser.parse_args()
+
+
+def queries(distinct, requests, vocabulary, rng):
+    """
+    :return: List of query strings, repeating distinct queries with Zipf popularity.
+    """
+    p = zipf(vocabulary)
+    pool = [" ".join(f"t{i}" for i in rng.choice(vocabulary, rng.integers(1, 4), p=p)) for _ in range(distinct)]
+    return [pool[i] for i in rng.choice(distinct, requests, p=zipf(distinct))]
+
+
+def start_searcher(directory, args):
+    index = SegmentedIndex(directory)
+    index.add_many(documents(args.documents, 40, args.vocabulary))
+    index.close()
+    process = subprocess.Popen(
+        [sys.executable, "Searcher.py", "--read_only", "--index_dir", directory, "--port", str(args.port),
+         "--cache_size", str(args.cache_size), "--cache_ttl", "600"],
+        cwd=os.path.join(ROOT, "Searcher", "app"),
+        env={**os.environ, "PYTHONPATH": ROOT},
+    )
+    return process, f"http://127.0.0.1:{args.port}"
+
+
+async def wait_ready(session, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(f"{url}/stats") as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+        await asyncio.sleep(0.2)
+
+
+async def load(url, batch, concurrency):
+    """
+    :return: Seconds taken, latencies in milliseconds, Counter of cache sources and of failed requests.
+    """
+    latencies = []
+    sources = Counter()
+    failures = Counter()
+    pending = iter(batch)
+
+    async def client(session):
+        for query in pending:
+            start = time.perf_counter()
+            try:
+                async with session.get(f"{url}/search", params={"q": query}) as response:
+                    if response.status != 200:
+                        failures[response.status] += 1
+                        continue
+                    sources[(await response.json())["cache"]] += 1
+            except OSError as e:
+                failures[type(e).__name__] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    async with ClientSession() as session:
+        await wait_ready(session, url)
+        start = time.perf_counter()
+        await asyncio.gather(*[client(session) for _ in range(concurrency)])
+        return time.perf_counter() - start, latencies, sources, failures
+
+
+def run():
+    args = parse_args()
+    process = None
+    directory = None
+    url = args.url
+    if url == "none":
+        directory = tempfile.mkdtemp(prefix="searcher-")
+        process, url = start_searcher(directory, args)
+    try:
+        batch = queries(args.distinct, args.requests, args.vocabulary, np.random.default_rng(1))
+        elapsed, latencies, sources, failures = asyncio.run(load(url, batch, args.concurrency))
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+            shutil.rmtree(directory)
+    print(f"{len(latencies)} requests at concurrency {args.concurrency}: {len(latencies) / elapsed:.0f} QPS, "
+          f"p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    print("cache:", dict(sources), "failures:", dict(failures))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,61 @@
+import asyncio
+from collections import Counter
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from Searcher.app.Searcher import Searcher
+from shared.index.SegmentedIndex import SegmentedIndex
+
+
+def pages(start, count):
+    return [(f"https://a.com/{i}", Counter({"cats": 1 + i % 3, f"page{i}": 1})) for i in range(start, start + count)]
+
+
+@pytest.mark.asyncio
+async def test_search_cache_and_normalized_queries(tmp_path):
+    searcher = Searcher(str(tmp_path))
+    searcher.index.add_many(pages(0, 20))
+    async with TestClient(TestServer(searcher.app())) as client:
+        first = await (await client.get("/search", params={"q": "Cats page7"})).json()
+        assert first["results"][0]["link"] == "https://a.com/7" and first["cache"] == "miss"
+        # the same tokens in another order and case share the cache entry.
+        again = await (await client.get("/search", params={"q": "page7, the CATS cats"})).json()
+        assert again["cache"] == "hit" and again["results"] == first["results"]
+        assert (await (await client.get("/search", params={"q": "the"})).json())["results"] == []
+        assert (await client.get("/search", params={"q": "cats", "k": "0"})).status == 400
+
+        responses = await asyncio.gather(*[client.get("/search", params={"q": "cats"}) for _ in range(10)])
+        sources = [(await response.json())["cache"] for response in responses]
+        assert sources.count("miss") == 1
+        stats = await (await client.get("/stats")).json()
+        assert stats["documents"] == 20 and stats["cache"]["misses"] == 2
+    await searcher.quit()
+
+
+@pytest.mark.asyncio
+async def test_read_only_reload_keeps_serving(tmp_path):
+    writer = SegmentedIndex(str(tmp_path), buffer_documents=10, merge_factor=2)
+    writer.add_many(pages(0, 10))
+    writer.flush()
+    searcher = Searcher(str(tmp_path), read_only=True, reload_period=0.01)
+    server = TestServer(searcher.app())
+    async with TestClient(server) as client:
+        searcher.running = True
+        searcher.reloader = asyncio.create_task(searcher.reload_loop())
+        assert (await (await client.get("/search", params={"q": "page15"})).json())["results"] == []
+
+        # queries keep being answered while the writer flushes and merges underneath.
+        writer.add_many(pages(10, 30))
+        writer.flush()
+        for _ in range(100):
+            response = await client.get("/search", params={"q": "cats", "k": "50"})
+            assert response.status == 200
+            if len((await response.json())["results"]) == 40:
+                break
+            await asyncio.sleep(0.01)
+        found = await (await client.get("/search", params={"q": "page15"})).json()
+        assert found["results"][0]["link"] == "https://a.com/15"
+        assert searcher.reloads >= 1
+    await searcher.quit()
+    writer.close()
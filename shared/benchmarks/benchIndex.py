@@ -0,0 +1,67 @@
+import argparse
+import time
+from collections import Counter
+
+import numpy as np
+
+from shared.index.InvertedIndex import InvertedIndex
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build rate and BM25 query latency percentiles of InvertedIndex.")
+    parser.add_argument("--documents", type=int, default=1000000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=40, help="Tokens per document.")
+    parser.add_argument("--vocabulary", type=int, default=100000, help="Distinct terms.")
+    parser.add_argument("--queries", type=int, default=500, help="Queries timed.")
+    parser.add_argument("--k", type=int, default=10, help="Results per query.")
+    return parser.parse_args()
+
+
+def zipf(size):
+    weights = 1 / np.arange(1, size + 1)
+    return weights / weights.sum()
+
+
+def documents(count, words, vocabulary, chunk=10000):
+    """
+    Link, Counter pairs of Zipf distributed terms.
+    """
+    rng = np.random.default_rng(0)
+    terms = [f"t{i}" for i in range(vocabulary)]
+    p = zipf(vocabulary)
+    for start in range(0, count, chunk):
+        rows = rng.choice(vocabulary, size=(min(chunk, count - start), words), p=p)
+        for offset, row in enumerate(rows.tolist()):
+            yield f"https://site{(start + offset) % 1000}.com/{start + offset}", \
+                Counter(terms[i] for i in row)
+
+
+def percentile(values, p):
+    return sorted(values)[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run():
+    args = parse_args()
+    index = InvertedIndex()
+    start = time.perf_counter()
+    index.add_many(documents(args.documents, args.words, args.vocabulary))
+    elapsed = time.perf_counter() - start
+    postings = sum(len(ids) for ids, _ in index.terms.values())
+    print(f"{len(index)} documents, {postings} postings, {len(index.terms)} terms, "
+          f"built at {len(index) / elapsed:.0f} docs/sec")
+
+    rng = np.random.default_rng(1)
+    p = zipf(args.vocabulary)
+    for terms in [1, 2, 3]:
+        latencies = []
+        for _ in range(args.queries):
+            query = [f"t{i}" for i in rng.choice(args.vocabulary, size=terms, p=p)]
+            start = time.perf_counter()
+            index.search(query, args.k)
+            latencies.append((time.perf_counter() - start) * 1000)
+        print(f"{terms} term queries: p50 {percentile(latencies, 50):.2f} ms, p95 {percentile(latencies, 95):.2f} ms, "
+              f"p99 {percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,91 @@
+import argparse
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+from shared.index.Postings import intersect, union
+from shared.index.TagIndex import TagIndex
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory per posting and AND/OR speed of TagIndex against the old "
+                                                 "nested dict of links.")
+    parser.add_argument("--links", type=int, default=200000, help="Tagged links.")
+    parser.add_argument("--tags", type=int, default=20000, help="Distinct tags.")
+    parser.add_argument("--per_link", type=int, default=5, help="Tags per link, as the Indexer makes.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per kind.")
+    return parser.parse_args()
+
+
+def tagged_links(count, tags, per_link):
+    rng = np.random.default_rng(0)
+    weights = 1 / np.arange(1, tags + 1)
+    chosen = rng.choice(tags, size=(count, per_link * 2), p=weights / weights.sum())
+    for i, row in enumerate(chosen.tolist()):
+        yield [f"tag{tag}" for tag in dict.fromkeys(row)][:per_link], f"https://site{i % 5000}.example.com/page/{i}"
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, size, elapsed
+
+
+def old_build(items):
+    index = defaultdict(lambda: defaultdict(int))
+    for tags, link in items:
+        for tag in tags:
+            index[tag][link] += 1
+    return index
+
+
+def new_build(items):
+    index = TagIndex()
+    for tags, link in items:
+        index.add_tagged_link(tags, link)
+    return index
+
+
+def timed(action, pairs):
+    start = time.perf_counter()
+    for pair in pairs:
+        action(pair)
+    return (time.perf_counter() - start) / len(pairs) * 1e6
+
+
+def run():
+    args = parse_args()
+    items = list(tagged_links(args.links, args.tags, args.per_link))
+    postings = sum(len(tags) for tags, _ in items)
+
+    old, old_bytes, old_time = measure(lambda: old_build(items))
+    new, new_bytes, new_time = measure(lambda: new_build(items))
+    bitmaps = sum(posting_list.bitmap is not None for posting_list in new.tags.values())
+    print(f"{args.links} links, {postings} postings, {bitmaps} tags kept as bitmaps")
+    print(f"nested dict: {old_bytes / postings:7.1f} bytes/posting, built in {old_time:.2f}s")
+    print(f"TagIndex:    {new_bytes / postings:7.1f} bytes/posting with link table, "
+          f"{new.nbytes / postings:.2f} in postings data, built in {new_time:.2f}s")
+
+    rng = np.random.default_rng(1)
+    kinds = {
+        "common AND common": [(f"tag{a}", f"tag{b}") for a, b in rng.integers(0, 10, (args.queries, 2))],
+        "common AND rare": [(f"tag{a}", f"tag{b}") for a, b in zip(rng.integers(0, 10, args.queries),
+                                                                  rng.integers(1000, 5000, args.queries))],
+        "mid AND mid": [(f"tag{a}", f"tag{b}") for a, b in rng.integers(50, 500, (args.queries, 2))],
+    }
+    for name, pairs in kinds.items():
+        old_and = timed(lambda pair: old[pair[0]].keys() & old[pair[1]].keys(), pairs)
+        new_and = timed(lambda pair: intersect([new.tags[pair[0]], new.tags[pair[1]]]), pairs)
+        old_or = timed(lambda pair: old[pair[0]].keys() | old[pair[1]].keys(), pairs)
+        new_or = timed(lambda pair: union([new.tags[pair[0]], new.tags[pair[1]]]), pairs)
+        print(f"{name:>18}: AND {old_and:9.1f} us -> {new_and:8.1f} us, OR {old_or:9.1f} us -> {new_or:8.1f} us")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,65 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from shared.benchmarks.benchIndex import documents, percentile, zipf
+from shared.index.QueryEngine import QueryEngine
+from shared.index.SegmentedIndex import SegmentedIndex
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Top k latency of MaxScore against exhaustive scoring.")
+    parser.add_argument("--documents", type=int, default=300000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=40, help="Tokens per document.")
+    parser.add_argument("--vocabulary", type=int, default=100000, help="Distinct terms.")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per kind.")
+    parser.add_argument("--k", type=int, default=10, help="Results per query.")
+    return parser.parse_args()
+
+
+def queries(count, vocabulary, rng):
+    """
+    Kinds of query: only common terms, common terms with a rarer one, and terms drawn by frequency.
+    """
+    p = zipf(vocabulary)
+    return {
+        "common + common": [[f"t{i}" for i in rng.integers(0, 20, 2)] for _ in range(count)],
+        "common + rare": [[f"t{rng.integers(0, 20)}", f"t{rng.integers(1000, 20000)}"] for _ in range(count)],
+        "3 zipf terms": [[f"t{i}" for i in rng.choice(vocabulary, 3, p=p)] for _ in range(count)],
+    }
+
+
+def timed(search, batch):
+    times = []
+    for query in batch:
+        start = time.perf_counter()
+        search(query)
+        times.append((time.perf_counter() - start) * 1000)
+    return f"p50 {percentile(times, 50):7.2f} ms, p99 {percentile(times, 99):7.2f} ms"
+
+
+def run():
+    args = parse_args()
+    directory = tempfile.mkdtemp(prefix="queries-")
+    index = SegmentedIndex(directory)
+    index.add_many(documents(args.documents, args.words, args.vocabulary))
+    index.flush()
+    print(f"{len(index)} documents in {len(index.segments)} segments")
+
+    for scoring in ["bm25", "tfidf"]:
+        engine = QueryEngine(index, scoring=scoring)
+        for name, batch in queries(args.queries, args.vocabulary, np.random.default_rng(1)).items():
+            for query in batch[:20]:
+                assert [link for link, _ in engine.search(query, args.k)] == \
+                       [link for link, _ in engine.search(query, args.k, exhaustive=True)]
+            print(f"{scoring:>5} {name:>16}: exhaustive {timed(lambda q: engine.search(q, args.k, True), batch)} | "
+                  f"MaxScore {timed(lambda q: engine.search(q, args.k), batch)}")
+    index.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,57 @@
+import argparse
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from shared.benchmarks.benchIndex import documents, percentile, zipf
+from shared.index.SegmentedIndex import SegmentedIndex
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build rate, reopen time and query latency of SegmentedIndex.")
+    parser.add_argument("--documents", type=int, default=300000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=40, help="Tokens per document.")
+    parser.add_argument("--vocabulary", type=int, default=100000, help="Distinct terms.")
+    parser.add_argument("--buffer", type=int, default=50000, help="Documents per flushed segment.")
+    parser.add_argument("--queries", type=int, default=300, help="Queries timed.")
+    parser.add_argument("--directory", type=str, default=None, help="Index directory, a temporary one if not given.")
+    return parser.parse_args()
+
+
+def latencies(index, vocabulary, queries):
+    rng = np.random.default_rng(1)
+    p = zipf(vocabulary)
+    times = []
+    for _ in range(queries):
+        query = [f"t{i}" for i in rng.choice(vocabulary, size=2, p=p)]
+        start = time.perf_counter()
+        index.search(query, 10)
+        times.append((time.perf_counter() - start) * 1000)
+    return f"p50 {percentile(times, 50):.2f} ms, p99 {percentile(times, 99):.2f} ms"
+
+
+def run():
+    args = parse_args()
+    directory = args.directory or tempfile.mkdtemp(prefix="segments-")
+    index = SegmentedIndex(directory, buffer_documents=args.buffer)
+    start = time.perf_counter()
+    index.add_many(documents(args.documents, args.words, args.vocabulary))
+    index.flush()
+    elapsed = time.perf_counter() - start
+    print(f"{len(index)} documents in {len(index.segments)} segments, built at {len(index) / elapsed:.0f} docs/sec")
+    print("two term queries:", latencies(index, args.vocabulary, args.queries))
+    index.close()
+
+    start = time.perf_counter()
+    reopened = SegmentedIndex(directory, buffer_documents=args.buffer)
+    print(f"reopened in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print("two term queries after reopening:", latencies(reopened, args.vocabulary, args.queries))
+    reopened.close()
+    if not args.directory:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,75 @@
+import argparse
+import threading
+import time
+import redis
+from queue import Queue, Empty
+
+from shared.utils.Syncer import Syncer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Pages/sec of Indexer-like replicas sharing a link_text stream.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of pages in the stream.")
+    parser.add_argument("--work_ms", type=float, default=2, help="Milliseconds each replica spends on a page.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def replica(client, name, work, stop):
+    """
+    One Indexer stand-in: reads pages through the consumer group, waits work seconds per page and pushes a tag.
+    """
+    in_queue, out_queue = Queue(), Queue()
+    syncer = Syncer(client, push_map=[(out_queue, "link_tag", False, -1, "queue")],
+                    pull_map=[(in_queue, "link_text", False, 100)], mode="blocking", block_timeout=0.1,
+                    streams=["link_text"], group="indexers", consumer=name)
+    syncer.start()
+    while not stop.is_set():
+        try:
+            message_id, (link, text) = in_queue.get(timeout=0.1)
+        except Empty:
+            continue
+        time.sleep(work)
+        out_queue.put((link, ["tag"]))
+        syncer.ack("link_text", message_id)
+    syncer.stop()
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+
+    for replicas in (1, 2, 4, 8):
+        client.flushdb()
+        pages = Queue()
+        for i in range(args.pages):
+            pages.put((f"https://en.wikipedia.org/wiki/Article_{i}", "Some page text"))
+        Syncer(client, streams=["link_text"]).push(pages, "link_text", False, -1, "queue")
+
+        stop = threading.Event()
+        threads = [threading.Thread(target=replica, args=(client, f"replica-{i}", args.work_ms / 1000, stop))
+                   for i in range(replicas)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while client.llen("link_tag:list") < args.pages:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        for thread in threads:
+            thread.join()
+        pending = client.xpending("link_text:stream", "indexers")["pending"]
+        print(f"{replicas} replicas: {args.pages / elapsed:8.0f} pages/sec ({pending} pending)")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
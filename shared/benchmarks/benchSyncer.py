@@ -0,0 +1,75 @@
+import argparse
+import time
+import redis
+from queue import Queue
+
+from shared.utils.Syncer import Syncer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Items/sec of Syncer pushes and pulls at different batch sizes.")
+    parser.add_argument("--redis_host", type=str, default="none", help="Redis host, none uses fakeredis.")
+    parser.add_argument("--redis_port", type=int, default=6379, help="Redis port.")
+    parser.add_argument("--items", type=int, default=20000, help="Number of items moved each way.")
+    parser.add_argument("--latency_items", type=int, default=20, help="Items sent one at a time for latency.")
+    return parser.parse_args()
+
+
+def connect(host, port):
+    if host == "none":
+        import fakeredis
+        return fakeredis.FakeRedis()
+    return redis.Redis(host=host, port=port, db=15)
+
+
+def latency(client, mode, count):
+    """
+    Seconds from an item entering a push queue to it leaving a pull queue, through two Syncers.
+    """
+    out_queue, in_queue = Queue(), Queue()
+    pusher = Syncer(client, push_map=[(out_queue, "link_text", False, -1, "queue")], sync_period=1, mode=mode)
+    puller = Syncer(client, pull_map=[(in_queue, "link_text", False, -1)], sync_period=1, mode=mode)
+    pusher.start()
+    puller.start()
+    waits = []
+    for i in range(count):
+        start = time.perf_counter()
+        out_queue.put(i)
+        in_queue.get()
+        waits.append(time.perf_counter() - start)
+    pusher.stop()
+    puller.stop()
+    return sum(waits) / len(waits)
+
+
+def run():
+    args = parse_args()
+    client = connect(args.redis_host, args.redis_port)
+    items = [[f"https://en.wikipedia.org/wiki/Article_{i}", "Some page text " * 20] for i in range(args.items)]
+
+    for batch in (1, 10, 100, 1000):
+        client.flushdb()
+        syncer = Syncer(client, push_batch=batch, pull_batch=batch)
+        q = Queue()
+        for item in items:
+            q.put(item)
+
+        start = time.perf_counter()
+        syncer.push(q, "link_text", False, -1, "queue")
+        push = time.perf_counter() - start
+
+        start = time.perf_counter()
+        syncer.pull(q, "link_text", False, -1)
+        pull = time.perf_counter() - start
+
+        print(f"batch {batch:>5}: push {len(items) / push:10.0f} items/sec, pull {len(items) / pull:10.0f} items/sec "
+              f"({q.qsize()} pulled)")
+
+    for mode in ("poll", "blocking"):
+        client.flushdb()
+        print(f"{mode:>8}: {latency(client, mode, args.latency_items) * 1000:8.1f} ms mean push to pull latency")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    run()
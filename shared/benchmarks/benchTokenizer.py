@@ -0,0 +1,85 @@
+import argparse
+import os
+import random
+import time
+from collections import Counter
+
+from shared.utils.Tokenizer import STOPWORDS, Tokenizer
+
+PUNCTUATION = [
+    '.', ',', ';', ':', '!', '?', '-', '_', '=', '+', '*', '/', '%', '(', ')', '[', ']', '{', '}',
+    "'", '"', '“', '”', '‘', '’', '<', '>', '©', '®', '™', '$', '#', '@', '&', '^', '~', '|', '\\',
+    '€', '£', '¥', '•', '¶', '…', '—', '›', '‹', '•', '...', '–'
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tokens/sec of the old split and list filter against Tokenizer.")
+    parser.add_argument("--corpus", type=str, default=None,
+                        help="Directory of .txt pages, a generated Wikipedia-like corpus if not given.")
+    parser.add_argument("--documents", type=int, default=2000, help="Generated documents.")
+    parser.add_argument("--words", type=int, default=700, help="Words per generated document.")
+    parser.add_argument("--batch", type=int, default=64, help="Documents per count_many call.")
+    return parser.parse_args()
+
+
+def generate(documents, words):
+    """
+    Zipf distributed words with capitals and punctuation attached, roughly the shape of article text.
+    """
+    rng = random.Random(0)
+    vocabulary = list(STOPWORDS) + [f"term{i}" for i in range(50000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    texts = []
+    for _ in range(documents):
+        tokens = rng.choices(vocabulary, weights, k=words)
+        for i in range(0, words, 9):
+            tokens[i] = tokens[i].capitalize()
+        for i in range(4, words, 7):
+            tokens[i] += rng.choice(",.;:)")
+        texts.append(" ".join(tokens))
+    return texts
+
+
+def load(corpus):
+    texts = []
+    for name in sorted(os.listdir(corpus)):
+        if name.endswith(".txt"):
+            with open(os.path.join(corpus, name), encoding="utf-8", errors="replace") as file:
+                texts.append(file.read())
+    return texts
+
+
+def old_count(text, common_words, punctuation):
+    """
+    The Indexer's previous path: whitespace split, then two list scans per token.
+    """
+    words_list = text.lower().split()
+    words_list[:] = [word for word in words_list if word not in common_words]
+    words_list[:] = [word for word in words_list if word not in punctuation]
+    return Counter(words_list)
+
+
+def run():
+    args = parse_args()
+    texts = load(args.corpus) if args.corpus else generate(args.documents, args.words)
+    tokens = sum(len(text.split()) for text in texts)
+    print(f"{len(texts)} documents, {tokens} whitespace tokens")
+
+    common_words = sorted(STOPWORDS)
+    tokenizer = Tokenizer()
+    runs = [
+        ("old split", lambda: [old_count(text, common_words, PUNCTUATION) for text in texts]),
+        ("count", lambda: [tokenizer.count(text) for text in texts]),
+        (f"count_many {args.batch}",
+         lambda: [tokenizer.count_many(texts[i:i + args.batch]) for i in range(0, len(texts), args.batch)]),
+    ]
+    for name, action in runs:
+        start = time.perf_counter()
+        action()
+        elapsed = time.perf_counter() - start
+        print(f"{name:>14}: {tokens / elapsed:12.0f} tokens/sec")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,121 @@
+import queue
+import threading
+import time
+
+from shared.utils.Syncer import Syncer
+from shared.utils.Tokenizer import Tokenizer
+
+
+class IndexFeeder:
+    def __init__(self, index, batch_size=256, queue_size=10000, worker_timeout=1, flush_period=30):
+        """
+        Adds the pages of the link_text stream to an index.
+        Reads through its own consumer group, so the Indexer's group still gets every page.
+        Pages of a SegmentedIndex are acknowledged once the segment holding them is on disk,
+        so a crash loses no page: unacknowledged pages are redelivered, and links already written are skipped.
+        Pages of an in memory index are acknowledged once they are in it.
+        :param index: SegmentedIndex or InvertedIndex, or anything with add(link, counts).
+        :param batch_size: Most pages tokenized together.
+        :param queue_size: Most pages held in memory before pulls wait.
+        :param worker_timeout: Seconds the loop waits for a page before checking if it should stop.
+        :param flush_period: Seconds between writes of a SegmentedIndex's buffer, keep it under the Syncer's
+            claim_idle so pages are acknowledged before other consumers claim them.
+        """
+        self.index = index
+        self.batch_size = batch_size
+        self.worker_timeout = worker_timeout
+        self.flush_period = flush_period
+        # a SegmentedIndex tells when pages are written, anything else holds them once added.
+        self.durable = hasattr(index, "on_flush")
+        if self.durable:
+            index.on_flush = self.written
+        # when the oldest page not yet handed to a flush was indexed.
+        self.unflushed_since = None
+        self.in_queue = queue.Queue(queue_size)
+        self.tokenizer = Tokenizer()
+        self.syncer = None
+        self.active = False
+        self.thread = None
+
+    def connect_redis(self, redis_client, sync_period=5, sync_mode="blocking", group="search", consumer=None,
+                      codec=None):
+        """
+        :param redis_client: Redis client instance.
+        :param sync_period: Time between polled syncs.
+        :param sync_mode: "poll" or "blocking", as for Syncer.
+        :param group: Consumer group of the feeders, separate from the Indexer's "indexers" group.
+        :param consumer: Name of this feeder in the group.
+        :param codec: Codec of items in Redis, plain JSON if None.
+        """
+        self.syncer = Syncer(
+            redis_client=redis_client,
+            pull_map=[(self.in_queue, "link_text", False, -1)],
+            sync_period=sync_period,
+            mode=sync_mode,
+            streams=["link_text"],
+            group=group,
+            consumer=consumer,
+            codec=codec,
+        )
+        self.syncer.start()
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+        Stop feeding, then write what was indexed so its pages are acknowledged before the Syncer stops.
+        """
+        self.active = False
+        if self.thread:
+            self.thread.join()
+        if self.unflushed_since is not None:
+            self.index.flush()
+        if self.syncer:
+            self.syncer.stop()
+
+    def feed(self, items):
+        """
+        Index message id, (link, text) pairs, to be acknowledged once they are written.
+        :param items: List of pulled stream items.
+        """
+        pages = [page for _, page in items]
+        all_counts = self.tokenizer.count_many([text or "" for _, text in pages])
+        for (message_id, _), (link, _), counts in zip(items, pages, all_counts):
+            if self.durable:
+                self.index.add(link, counts, message_id)
+            else:
+                self.index.add(link, counts)
+        if not self.durable:
+            self.written([message_id for message_id, _ in items])
+        elif self.unflushed_since is None:
+            self.unflushed_since = time.monotonic()
+
+    def written(self, message_ids):
+        """
+        Acknowledge pages that are in the index for good.
+        :param message_ids: Stream ids of the pages.
+        """
+        if self.syncer:
+            for message_id in message_ids:
+                self.syncer.ack("link_text", message_id)
+
+    def loop(self):
+        while self.active:
+            since = self.unflushed_since
+            if since is not None and time.monotonic() - since >= self.flush_period:
+                # pages in the buffer wait on disk for their acknowledgement, so write it every so often.
+                self.unflushed_since = None
+                self.index.flush(wait=False)
+            try:
+                items = [self.in_queue.get(timeout=self.worker_timeout)]
+            except queue.Empty:
+                continue
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self.in_queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.feed(items)
@@ -0,0 +1,216 @@
+import threading
+from array import array
+from bisect import bisect_right
+from math import log
+
+import numpy as np
+
+
+def bm25_idf(document_count, frequency):
+    """
+    BM25 inverse document frequency, never negative.
+    :param document_count: Documents in the index.
+    :param frequency: Documents containing the term.
+    """
+    return log(1 + (document_count - frequency + 0.5) / (frequency + 0.5))
+
+
+def bm25_search(sources, terms, k=10, k1=1.2, b=0.75):
+    """
+    Rank documents of several sources together, a term at a time over the whole postings of each.
+    Document frequency, document count and average length are summed over every source.
+    :param sources: List of InvertedIndex or Segment, holding separate document ids.
+    :param terms: List of query tokens, repeated tokens count once.
+    :param k: Most results.
+    :param k1: BM25 term frequency saturation.
+    :param b: BM25 length normalization.
+    :return: List of link, score pairs, best first, ties by lower document id.
+    """
+    stats = [source.stats() for source in sources]
+    document_count = sum(count for count, _ in stats)
+    if not document_count or k < 1:
+        return []
+    average = sum(length for _, length in stats) / document_count
+    all_ids = []
+    all_weights = []
+    for term in dict.fromkeys(terms):
+        found = [postings for postings in (source.postings(term) for source in sources) if postings]
+        idf = bm25_idf(document_count, sum(len(ids) for ids, _, _ in found))
+        for ids, tf, lengths in found:
+            all_ids.append(ids)
+            all_weights.append(idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths / average)))
+    if not all_ids:
+        return []
+    ids, scores = combine(all_ids, all_weights)
+    best = top_k(ids, scores, k)
+    bases = [source.base for source in sources]
+    order = sorted(range(len(sources)), key=bases.__getitem__)
+    starts = [bases[i] for i in order]
+    return [
+        (sources[order[bisect_right(starts, doc_id) - 1]].link(doc_id), score)
+        for doc_id, score in zip(ids[best].tolist(), scores[best].tolist())
+    ]
+
+
+class InvertedIndex:
+    def __init__(self, k1=1.2, b=0.75, base=0):
+        """
+        Term to postings index of link text, ranked with BM25.
+        Every link gets the next integer document id, so each term's postings are appended already sorted:
+        an array of document ids and an array of how often the term appears in each.
+        Document lengths in tokens are kept for BM25's length normalization.
+        Links are only indexed once, a link seen again is skipped.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 length normalization, 0 for none and 1 for full.
+        :param base: First document id, so several indexes can be searched together.
+        """
+        self.k1 = k1
+        self.b = b
+        self.base = base
+        self.links = []
+        self.ids = {}
+        self.lengths = array("I")
+        self.total_length = 0
+        # term to document ids and term frequencies.
+        self.terms = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.links)
+
+    def add(self, link, counts):
+        """
+        :param link: Link of the document.
+        :param counts: Counter of the document's tokens.
+        :return: Document id, or None if the link was already indexed.
+        """
+        with self.lock:
+            if link in self.ids:
+                return None
+            doc_id = self.base + len(self.links)
+            self.ids[link] = doc_id
+            self.links.append(link)
+            length = sum(counts.values())
+            self.lengths.append(length)
+            self.total_length += length
+            postings = self.terms
+            for term, count in counts.items():
+                if term not in postings:
+                    postings[term] = (array("I"), array("I"))
+                ids, frequencies = postings[term]
+                ids.append(doc_id)
+                frequencies.append(count)
+            return doc_id
+
+    def add_many(self, documents):
+        """
+        :param documents: Iterable of link, Counter pairs.
+        :return: Number of documents added.
+        """
+        return sum(self.add(link, counts) is not None for link, counts in documents)
+
+    def frequency(self, term):
+        postings = self.terms.get(term)
+        return len(postings[0]) if postings else 0
+
+    def stats(self):
+        """
+        :return: Documents and their total length.
+        """
+        with self.lock:
+            return len(self.links), self.total_length
+
+    def postings(self, term):
+        """
+        :param term: Token.
+        :return: Copies of the document ids, term frequencies and document lengths of the term's postings,
+            or None if no document has it.
+        """
+        with self.lock:
+            postings = self.terms.get(term)
+            if not postings:
+                return None
+            ids = np.frombuffer(postings[0], dtype=np.uint32).astype(np.intp)
+            tf = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float64)
+            lengths = np.frombuffer(self.lengths, dtype=np.uint32)[ids - self.base].astype(np.float64)
+            return ids, tf, lengths
+
+    def bounds(self, term):
+        """
+        :return: Document frequency, highest term frequency, shortest document and highest term frequency
+            over document length of the term, or None.
+        """
+        postings = self.postings(term)
+        if postings is None:
+            return None
+        ids, tf, lengths = postings
+        return len(ids), int(tf.max()), int(lengths.min()), float((tf / np.maximum(lengths, 1)).max())
+
+    def lookup(self, term, doc_ids):
+        """
+        :param term: Token.
+        :param doc_ids: Sorted array of document ids in this index.
+        :return: Array of term frequencies, 0 where the document does not have the term.
+        """
+        found = np.zeros(len(doc_ids))
+        with self.lock:
+            postings = self.terms.get(term)
+            if not postings or not len(doc_ids):
+                return found
+            ids = np.frombuffer(postings[0], dtype=np.uint32)
+            positions = np.minimum(np.searchsorted(ids, doc_ids), len(ids) - 1)
+            hit = ids[positions] == doc_ids
+            found[hit] = np.frombuffer(postings[1], dtype=np.uint32)[positions[hit]]
+            del ids
+        return found
+
+    def document_lengths(self, doc_ids):
+        with self.lock:
+            return np.frombuffer(self.lengths, dtype=np.uint32)[doc_ids - self.base].astype(np.float64)
+
+    def link(self, doc_id):
+        return self.links[doc_id - self.base]
+
+    def readers(self):
+        """
+        :return: List of the sources to search, only this index.
+        """
+        return [self]
+
+    def search(self, terms, k=10):
+        """
+        Rank documents containing any of the terms.
+        :param terms: List of query tokens, repeated tokens count once.
+        :param k: Most results.
+        :return: List of link, score pairs, best first, ties by link order.
+        """
+        return bm25_search([self], terms, k, self.k1, self.b)
+
+
+def combine(all_ids, all_weights):
+    """
+    Sum the weights of each document over every term.
+    :param all_ids: List of document id arrays, each sorted and unique.
+    :param all_weights: List of weight arrays matching all_ids.
+    :return: Sorted unique document ids and their summed weights.
+    """
+    if len(all_ids) == 1:
+        return all_ids[0], all_weights[0]
+    ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+    return ids, np.bincount(inverse, np.concatenate(all_weights), minlength=len(ids))
+
+
+def top_k(ids, scores, k):
+    """
+    :param ids: Document ids.
+    :param scores: Scores of the ids.
+    :param k: Most results.
+    :return: Positions of the k best scores, best first, ties by lower id.
+    """
+    if len(scores) > k:
+        # everything scoring at least the k-th best, ties at the edge included.
+        threshold = scores[np.argpartition(scores, len(scores) - k)[len(scores) - k]]
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.lexsort((ids[candidates], -scores[candidates]))][:k]
@@ -0,0 +1,164 @@
+from functools import reduce
+
+import numpy as np
+
+try:
+    from pyroaring import BitMap
+except ImportError:
+    BitMap = None
+
+EMPTY = np.zeros(0, dtype=np.uint64)
+
+
+def encode(values):
+    """
+    LEB128 varint encoding, 7 bits a byte with the high bit set on every byte but the last of a value.
+    :param values: Array of non negative integers.
+    :return: uint8 array of the encoded bytes, and the byte offset each value starts at.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.intp)
+    for shift in range(7, 64, 7):
+        sizes += values >= np.uint64(1 << shift)
+    offsets = np.cumsum(sizes) - sizes
+    data = np.empty(int(sizes.sum()), dtype=np.uint8)
+    for byte in range(int(sizes.max(initial=0))):
+        present = sizes > byte
+        chunk = (values[present] >> np.uint64(7 * byte)) & np.uint64(0x7F)
+        more = (sizes[present] > byte + 1).astype(np.uint64) << np.uint64(7)
+        data[offsets[present] + byte] = chunk | more
+    return data, offsets
+
+
+def decode(data):
+    """
+    :param data: uint8 array or bytes from encode.
+    :return: uint64 array of the values.
+    """
+    data = np.frombuffer(data, dtype=np.uint8) if isinstance(data, (bytes, bytearray)) else data
+    if not len(data):
+        return EMPTY
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty(len(ends), dtype=np.intp)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    payload = (data & 0x7F).astype(np.uint64) << (position * 7).astype(np.uint64)
+    # the 7 bit groups of a value never overlap, so adding them joins them.
+    return np.add.reduceat(payload, starts)
+
+
+def deltas(ids):
+    """
+    :param ids: Sorted array of document ids.
+    :return: Gaps between neighbouring ids, the first against 0.
+    """
+    ids = np.asarray(ids, dtype=np.uint64)
+    return np.diff(ids, prepend=np.uint64(0))
+
+
+def bitmap_ids(bitmap):
+    return np.frombuffer(bitmap.to_array(), dtype=np.uint32).astype(np.uint64)
+
+
+def varint(value):
+    """
+    Encode one value in pure Python, for appends of a single posting.
+    """
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+    return out
+
+
+class PostingList:
+    def __init__(self, heavy=256):
+        """
+        Document ids of one term, ascending, appended a posting at a time.
+        Kept as delta varint bytes, about a byte a posting while gaps stay under 128.
+        A list reaching heavy ids turns into a roaring bitmap, at most 2 bytes a posting and a bit a posting
+        when dense, which is intersected container by container without decoding the whole list.
+        Bitmaps need pyroaring, without it every list stays varint encoded.
+        :param heavy: Ids in a list before it becomes a bitmap.
+        """
+        self.data = bytearray()
+        self.bitmap = None
+        self.count = 0
+        self.last = 0
+        self.heavy = heavy
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        if self.bitmap is not None:
+            statistics = self.bitmap.get_statistics()
+            return sum(statistics[f"n_bytes_{kind}_containers"] for kind in ("array", "run", "bitset"))
+        return len(self.data)
+
+    def append(self, doc_id):
+        """
+        :param doc_id: Id above every id already in the list.
+        """
+        if self.count and doc_id <= self.last:
+            raise ValueError(f"document id {doc_id} is not above {self.last}")
+        if self.bitmap is not None:
+            self.bitmap.add(doc_id)
+        else:
+            self.data += varint(doc_id - self.last if self.count else doc_id)
+        self.count += 1
+        self.last = doc_id
+        if self.count == self.heavy and BitMap:
+            self.bitmap = BitMap(self.ids().astype(np.uint32))
+            self.bitmap.run_optimize()
+            self.data = bytearray()
+
+    def ids(self):
+        """
+        :return: uint64 array of the document ids.
+        """
+        if self.bitmap is not None:
+            return bitmap_ids(self.bitmap)
+        return np.cumsum(decode(self.data), dtype=np.uint64)
+
+    def as_bitmap(self):
+        return self.bitmap if self.bitmap is not None else BitMap(self.ids().astype(np.uint32))
+
+
+def intersect(lists):
+    """
+    Ids in every list. Starts from the shortest list and stops as soon as nothing is left.
+    Bitmaps are intersected in roaring form, varint lists are decoded a list at a time.
+    :param lists: List of PostingList.
+    :return: Sorted uint64 array of ids.
+    """
+    if not lists:
+        return EMPTY
+    lists = sorted(lists, key=len)
+    if BitMap and all(posting_list.bitmap is not None for posting_list in lists):
+        return bitmap_ids(BitMap.intersection(*[posting_list.bitmap for posting_list in lists]))
+    found = lists[0].ids()
+    for posting_list in lists[1:]:
+        if not len(found):
+            break
+        if posting_list.bitmap is not None:
+            found = bitmap_ids(BitMap(found.astype(np.uint32)) & posting_list.bitmap)
+        else:
+            found = np.intersect1d(found, posting_list.ids(), assume_unique=True)
+    return found
+
+
+def union(lists):
+    """
+    Ids in any list.
+    :param lists: List of PostingList.
+    :return: Sorted uint64 array of ids.
+    """
+    if not lists:
+        return EMPTY
+    if BitMap:
+        return bitmap_ids(BitMap.union(*[posting_list.as_bitmap() for posting_list in lists]))
+    return reduce(np.union1d, [posting_list.ids() for posting_list in lists])
@@ -0,0 +1,173 @@
+from bisect import bisect_right
+from math import log
+
+import numpy as np
+
+from shared.index.InvertedIndex import bm25_idf, combine, top_k
+
+EMPTY = np.zeros(0, dtype=np.intp)
+# scoring a document by lookups costs about this many postings of a full decode and combine.
+LOOKUP_COST = 16
+
+
+class QueryEngine:
+    def __init__(self, index, scoring="bm25", k1=1.2, b=0.75):
+        """
+        Top k multi-term queries over an InvertedIndex or SegmentedIndex, pruned with MaxScore.
+        Every term has an upper bound on what it adds to a score, from its highest term frequency and
+        shortest document for BM25, or its highest share of a document for TF-IDF.
+        The rarest terms are scored first to find a k-th best score, then every term
+        whose bound, added to the bounds of the terms below it, can not reach that score is non-essential:
+        a document with only non-essential terms can not make the top k, so only documents of the essential
+        terms are scored. Non-essential terms are looked up for those documents a block at a time
+        rather than decoded whole, so common terms do not force a full postings scan.
+        When the documents to score come near the postings of the query, such as for only common terms,
+        every posting is scored instead, which is then cheaper.
+        :param index: InvertedIndex or SegmentedIndex.
+        :param scoring: "bm25", or "tfidf" for the Indexer's term frequency times inverse document frequency.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 length normalization.
+        """
+        if scoring not in ("bm25", "tfidf"):
+            raise ValueError(f"unknown scoring {scoring}")
+        self.index = index
+        self.scoring = scoring
+        self.k1 = k1
+        self.b = b
+
+    def idf(self, document_count, frequency):
+        if self.scoring == "bm25":
+            return bm25_idf(document_count, frequency)
+        return log((1 + document_count) / (1 + frequency)) + 1
+
+    def weight(self, idf, tf, lengths, average):
+        """
+        What a term adds to the scores of documents, 0 where tf is 0.
+        """
+        if self.scoring == "bm25":
+            return idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * lengths / average))
+        return tf / np.maximum(lengths, 1) * idf
+
+    def plan(self, sources, terms):
+        """
+        :return: Documents, average length, and the idf, upper bound and document frequency of each term found,
+            highest bound first.
+        """
+        stats = [source.stats() for source in sources]
+        document_count = sum(count for count, _ in stats)
+        if not document_count:
+            return 0, 0, []
+        average = sum(length for _, length in stats) / document_count
+        planned = []
+        for term in dict.fromkeys(terms):
+            bounds = [found for found in (source.bounds(term) for source in sources) if found]
+            if not bounds:
+                continue
+            frequency = sum(found[0] for found in bounds)
+            idf = self.idf(document_count, frequency)
+            if self.scoring == "bm25":
+                max_tf = max(found[1] for found in bounds)
+                min_length = min(found[2] for found in bounds)
+                bound = float(self.weight(idf, np.float64(max_tf), np.float64(min_length), average))
+            else:
+                bound = idf * max(found[3] for found in bounds)
+            planned.append((term, idf, bound, frequency))
+        planned.sort(key=lambda item: -item[2])
+        return document_count, average, planned
+
+    def postings(self, sources, term):
+        """
+        :return: Sorted array of the ids of every document with the term.
+        """
+        found = [postings[0] for postings in (source.postings(term) for source in sources) if postings]
+        return np.concatenate(found) if found else EMPTY
+
+    def score(self, sources, ids, planned, average):
+        """
+        Full scores of some documents, looking each term up only for them.
+        :param ids: Sorted array of document ids.
+        """
+        scores = np.zeros(len(ids))
+        for source in sources:
+            count, _ = source.stats()
+            start, end = np.searchsorted(ids, [source.base, source.base + count])
+            if start == end:
+                continue
+            part = ids[start:end]
+            lengths = source.document_lengths(part)
+            for term, idf, _, _ in planned:
+                scores[start:end] += self.weight(idf, source.lookup(term, part), lengths, average)
+        return scores
+
+    def search(self, terms, k=10, exhaustive=False):
+        """
+        :param terms: List of query tokens, repeated tokens count once.
+        :param k: Most results.
+        :param exhaustive: Score every document with any term, for comparison.
+        :return: List of link, score pairs, best first, ties by lower document id.
+        """
+        sources = self.index.readers()
+        document_count, average, planned = self.plan(sources, terms)
+        if not planned or k < 1:
+            return []
+        if exhaustive:
+            ids, scores = self.exhaustive(sources, planned, average)
+        else:
+            ids, scores = self.max_score(sources, planned, average, k)
+        best = top_k(ids, scores, k)
+        return self.resolve(sources, ids[best], scores[best])
+
+    def exhaustive(self, sources, planned, average):
+        all_ids = []
+        all_weights = []
+        for term, idf, _, _ in planned:
+            for postings in (source.postings(term) for source in sources):
+                if postings:
+                    ids, tf, lengths = postings
+                    all_ids.append(ids)
+                    all_weights.append(self.weight(idf, tf, lengths, average))
+        return combine(all_ids, all_weights)
+
+    def max_score(self, sources, planned, average, k):
+        # postings a full scan would score, the cost lookups are weighed against.
+        budget = sum(frequency for _, _, _, frequency in planned) / (LOOKUP_COST * len(planned))
+        # score documents of the rarest terms until there are k of them.
+        ids = EMPTY
+        used = set()
+        for term, _, _, frequency in sorted(planned, key=lambda item: item[3]):
+            if len(ids) >= k:
+                break
+            if len(ids) + frequency >= budget:
+                return self.exhaustive(sources, planned, average)
+            ids = np.union1d(ids, self.postings(sources, term))
+            used.add(term)
+        scores = self.score(sources, ids, planned, average)
+        if len(used) == len(planned) or len(ids) < k:
+            return ids, scores
+
+        # documents without the rarest terms score at most the bounds of the others. the lowest bound
+        # terms that can not reach the k-th best score together are non-essential.
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        remaining = [item for item in planned if item[0] not in used]
+        total = 0
+        essential = len(remaining)
+        for i in range(len(remaining) - 1, -1, -1):
+            if total + remaining[i][2] >= threshold:
+                break
+            total += remaining[i][2]
+            essential = i
+        if not essential:
+            return ids, scores
+        if len(ids) + sum(frequency for _, _, _, frequency in remaining[:essential]) >= budget:
+            return self.exhaustive(sources, planned, average)
+        extra = np.unique(np.concatenate([self.postings(sources, term) for term, _, _, _ in remaining[:essential]]))
+        more = np.setdiff1d(extra, ids, assume_unique=True)
+        return np.concatenate([ids, more]), np.concatenate([scores, self.score(sources, more, planned, average)])
+
+    def resolve(self, sources, ids, scores):
+        bases = sorted((source.base, i) for i, source in enumerate(sources))
+        starts = [base for base, _ in bases]
+        return [
+            (sources[bases[bisect_right(starts, doc_id) - 1][1]].link(doc_id), score)
+            for doc_id, score in zip(ids.tolist(), scores.tolist())
+        ]
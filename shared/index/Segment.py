@@ -0,0 +1,414 @@
+import hashlib
+import heapq
+from bisect import bisect_left
+from itertools import groupby
+
+import numpy as np
+
+from shared.index.Postings import decode, encode
+from shared.utils.Snapshots import ArrayWriter, pack_words, read_arrays
+
+
+class Words:
+    def __init__(self, offsets, blob):
+        """
+        Read only sequence over packed words, decoding only the words looked at.
+        Words are sorted, so a word is found with bisect in a few decodes.
+        :param offsets: Offsets array from pack_words.
+        :param blob: Joined UTF-8 bytes from pack_words.
+        """
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[int(self.offsets[i]):int(self.offsets[i + 1])].tobytes().decode("utf-8")
+
+    def index(self, word):
+        """
+        :return: Position of the word, or -1.
+        """
+        i = bisect_left(self, word)
+        return i if i < len(self) and self[i] == word else -1
+
+
+# postings per block, the unit decoded by lookups.
+BLOCK = 128
+# postings or documents a merge holds in memory before writing them out.
+MERGE_CHUNK = 1 << 20
+DTYPES = {
+    "term_offsets": np.uint64,
+    "term_words": np.uint8,
+    "sizes": np.uint32,
+    "max_frequencies": np.uint32,
+    "min_lengths": np.uint32,
+    "max_shares": np.float64,
+    "term_blocks": np.uint64,
+    "block_last": np.uint64,
+    "block_id_starts": np.uint64,
+    "block_frequency_starts": np.uint64,
+    "doc_ids": np.uint8,
+    "frequencies": np.uint8,
+    "lengths": np.uint32,
+    "link_offsets": np.uint64,
+    "link_words": np.uint8,
+    "link_hashes": np.uint64,
+    "link_order": np.uint32,
+}
+
+
+def reduce_terms(ufunc, values, firsts):
+    """
+    :return: ufunc reduced over each term's values, such as its highest term frequency.
+    """
+    if not len(firsts):
+        return values[:0]
+    return ufunc.reduceat(values, firsts)
+
+
+def block_ranges(starts, blocks):
+    """
+    :param starts: Byte offset of every block, and the total at the end.
+    :param blocks: Array of block numbers.
+    :return: Positions of every byte of the blocks, in order, and the bytes of each block.
+    """
+    begin = starts[blocks].astype(np.intp)
+    sizes = starts[blocks + 1].astype(np.intp) - begin
+    positions = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes - begin, sizes)
+    return positions, sizes
+
+
+def link_hash(link):
+    return int.from_bytes(hashlib.blake2b(link.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def link_index(links):
+    """
+    :param links: List of links.
+    :return: Sorted array of the links' hashes, and the position of the link behind each hash.
+    """
+    hashes = np.fromiter((link_hash(link) for link in links), dtype=np.uint64, count=len(links))
+    order = np.argsort(hashes, kind="stable")
+    return hashes[order], order
+
+
+def term_entries(segment, n):
+    """
+    :return: Iterator of term, segment number and term position over a segment's sorted terms.
+    """
+    return ((segment.terms[i], n, i) for i in range(len(segment.terms)))
+
+
+class Segment:
+    def __init__(self, path):
+        """
+        Immutable, memory mapped part of an index, covering document ids base to base + count.
+        Opening only maps the file, terms and postings are read from the page cache as queries touch them,
+        so segments can be larger than memory together.
+        The file holds a sorted term dictionary with each term's document frequency, highest term frequency,
+        shortest document and highest share of a document, the document ids of every term as delta varints
+        and their term frequencies as varints, each back to back in blocks of BLOCK postings with the byte
+        and last id of each block, the length and link of each document, and the sorted hashes of the links,
+        so a link is looked up in a few page reads without loading the links.
+        :param path: Segment file written by Segment.write.
+        """
+        header, arrays = read_arrays(path)
+        self.path = path
+        self.base = header["base"]
+        self.count = header["count"]
+        self.total_length = header["total_length"]
+        self.level = header["level"]
+        self.terms = Words(arrays["term_offsets"], arrays["term_words"])
+        self.sizes = arrays["sizes"]
+        self.max_frequencies = arrays["max_frequencies"]
+        self.min_lengths = arrays["min_lengths"]
+        self.max_shares = arrays["max_shares"]
+        self.term_blocks = arrays["term_blocks"]
+        self.block_last = arrays["block_last"]
+        self.block_id_starts = arrays["block_id_starts"]
+        self.block_frequency_starts = arrays["block_frequency_starts"]
+        self.doc_ids = arrays["doc_ids"]
+        self.frequencies = arrays["frequencies"]
+        self.lengths = arrays["lengths"]
+        self.links = Words(arrays["link_offsets"], arrays["link_words"])
+        if "link_hashes" in arrays:
+            self.link_hashes = arrays["link_hashes"]
+            self.link_order = arrays["link_order"]
+        else:
+            # segments written before links were hashed.
+            self.link_hashes, self.link_order = link_index(self.links)
+
+    @staticmethod
+    def write(path, base, links, lengths, postings, level=0):
+        """
+        :param path: File to write, atomically.
+        :param base: First document id.
+        :param links: List of links, one per document id from base.
+        :param lengths: Array of document lengths.
+        :param postings: Dictionary of term to arrays of document ids and term frequencies, ids ascending.
+        :param level: Merges the documents went through.
+        """
+        writer = SegmentWriter(path, base, level)
+        try:
+            lengths = np.asarray(lengths, dtype=np.uint32)
+            writer.add_documents(*pack_words(links), lengths)
+            writer.add_link_index(*link_index(links))
+            terms = sorted(postings)
+            empty = np.zeros(0, dtype=np.uint64)
+            ids = np.concatenate([postings[term][0] for term in terms] or [empty]).astype(np.uint64)
+            values = np.concatenate([postings[term][1] for term in terms] or [empty]).astype(np.uint64)
+            sizes = [len(postings[term][0]) for term in terms]
+            writer.add_terms(terms, sizes, ids, values, lengths[(ids - np.uint64(base)).astype(np.intp)])
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    @staticmethod
+    def merge(path, segments, level):
+        """
+        Write one segment holding the documents of segments with consecutive id ranges, oldest first.
+        A k-way merge over the sorted term dictionaries, written out every MERGE_CHUNK postings,
+        so a merge holds a chunk in memory rather than the postings of every segment.
+        """
+        writer = SegmentWriter(path, segments[0].base, level)
+        try:
+            for segment in segments:
+                writer.add_documents(segment.links.offsets, segment.links.blob, segment.lengths)
+            # hashes are spread evenly, so ranges of the hash space each hold about MERGE_CHUNK links.
+            count = sum(segment.count for segment in segments)
+            ranges = max(1, count // MERGE_CHUNK)
+            bounds = [np.uint64((r << 64) // ranges) for r in range(ranges)]
+            for r in range(ranges):
+                hashes, order = [], []
+                for segment in segments:
+                    start = np.searchsorted(segment.link_hashes, bounds[r])
+                    end = np.searchsorted(segment.link_hashes, bounds[r + 1]) if r + 1 < ranges else segment.count
+                    hashes.append(segment.link_hashes[start:end])
+                    order.append(segment.link_order[start:end].astype(np.uint64) + np.uint64(segment.base - writer.base))
+                hashes = np.concatenate(hashes)
+                sort = np.argsort(hashes, kind="stable")
+                writer.add_link_index(hashes[sort], np.concatenate(order)[sort])
+
+            terms, sizes, ids, values, lengths = [], [], [], [], []
+            held = 0
+            entries = heapq.merge(*[term_entries(segment, n) for n, segment in enumerate(segments)])
+            for term, group in groupby(entries, key=lambda entry: entry[0]):
+                size = 0
+                # segments come in id order, so each term's ids stay ascending.
+                for _, n, i in group:
+                    segment = segments[n]
+                    term_ids, frequencies = segment.decode(i)
+                    ids.append(term_ids)
+                    values.append(frequencies)
+                    lengths.append(segment.lengths[(term_ids - np.uint64(segment.base)).astype(np.intp)])
+                    size += len(term_ids)
+                terms.append(term)
+                sizes.append(size)
+                held += size
+                if held >= MERGE_CHUNK:
+                    writer.add_terms(terms, sizes, np.concatenate(ids), np.concatenate(values), np.concatenate(lengths))
+                    terms, sizes, ids, values, lengths = [], [], [], [], []
+                    held = 0
+            if terms:
+                writer.add_terms(terms, sizes, np.concatenate(ids), np.concatenate(values), np.concatenate(lengths))
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+
+    def stats(self):
+        return self.count, self.total_length
+
+    def decode(self, i, blocks=None):
+        """
+        :param i: Position of a term.
+        :param blocks: Array of the term's block numbers to decode, ascending, every block if None.
+        :return: Document ids and term frequencies in those blocks.
+        """
+        first, last = int(self.term_blocks[i]), int(self.term_blocks[i + 1])
+        if blocks is None:
+            blocks = np.arange(first, last)
+        positions, _ = block_ranges(self.block_id_starts, blocks)
+        gaps = decode(self.doc_ids[positions])
+        frequencies = decode(self.frequencies[block_ranges(self.block_frequency_starts, blocks)[0]])
+        # postings per block, BLOCK but for the term's last block.
+        counts = np.minimum(BLOCK, int(self.sizes[i]) - (blocks - first) * BLOCK)
+        # gaps restart from the previous block's last id, and from 0 in the first block.
+        previous = np.where(blocks > first, self.block_last[np.maximum(blocks - 1, 0)], 0).astype(np.uint64)
+        totals = np.cumsum(gaps, dtype=np.uint64)
+        before = np.repeat(np.append(np.uint64(0), totals[np.cumsum(counts)[:-1] - 1]), counts)
+        return totals - before + np.repeat(previous, counts), frequencies
+
+    def bounds(self, term):
+        """
+        :return: Document frequency, highest term frequency, shortest document and highest term frequency
+            over document length of the term, or None.
+        """
+        i = self.terms.index(term)
+        if i < 0:
+            return None
+        return int(self.sizes[i]), int(self.max_frequencies[i]), int(self.min_lengths[i]), float(self.max_shares[i])
+
+    def lookup(self, term, doc_ids):
+        """
+        Term frequencies of some documents, decoding only the blocks that could hold them.
+        :param term: Token.
+        :param doc_ids: Sorted array of document ids in this segment.
+        :return: Array of term frequencies, 0 where the document does not have the term.
+        """
+        found = np.zeros(len(doc_ids))
+        i = self.terms.index(term)
+        if i < 0 or not len(doc_ids):
+            return found
+        first, last = int(self.term_blocks[i]), int(self.term_blocks[i + 1])
+        blocks = first + np.searchsorted(self.block_last[first:last], doc_ids.astype(np.uint64))
+        blocks = np.unique(blocks[blocks < last])
+        if not len(blocks):
+            return found
+        ids, frequencies = self.decode(i, blocks)
+        positions = np.minimum(np.searchsorted(ids, doc_ids.astype(np.uint64)), len(ids) - 1)
+        hit = ids[positions] == doc_ids
+        found[hit] = frequencies[positions[hit]]
+        return found
+
+    def document_lengths(self, doc_ids):
+        return self.lengths[doc_ids - self.base].astype(np.float64)
+
+    def frequency(self, term):
+        i = self.terms.index(term)
+        return int(self.sizes[i]) if i >= 0 else 0
+
+    def postings(self, term):
+        """
+        :return: Document ids, term frequencies and document lengths of the term's postings, or None.
+        """
+        i = self.terms.index(term)
+        if i < 0:
+            return None
+        ids, frequencies = self.decode(i)
+        ids = ids.astype(np.intp)
+        return ids, frequencies.astype(np.float64), self.lengths[ids - self.base].astype(np.float64)
+
+    def link(self, doc_id):
+        return self.links[doc_id - self.base]
+
+    def has_link(self, link, hashed=None):
+        """
+        :param link: Link to look for.
+        :param hashed: link_hash of the link, when already computed.
+        :return: True if one of the segment's documents has the link.
+        """
+        hashed = np.uint64(link_hash(link) if hashed is None else hashed)
+        start = np.searchsorted(self.link_hashes, hashed)
+        end = np.searchsorted(self.link_hashes, hashed, side="right")
+        # a hash collision is told apart by the link itself.
+        return any(self.links[int(i)] == link for i in self.link_order[start:end])
+
+
+class SegmentWriter:
+    def __init__(self, path, base, level=0):
+        """
+        Write a segment a run of terms at a time, in the layout Segment reads.
+        Documents are added in id order, terms in sorted order, each run of terms with its postings.
+        :param path: File to write, atomically on close.
+        :param base: First document id.
+        :param level: Merges the documents went through.
+        """
+        self.writer = ArrayWriter(path, DTYPES, MERGE_CHUNK)
+        self.base = base
+        self.level = level
+        self.count = 0
+        self.total_length = 0
+        self.link_bytes = 0
+        self.term_bytes = 0
+        self.id_bytes = 0
+        self.frequency_bytes = 0
+        self.blocks = 0
+        zero = np.zeros(1, dtype=np.uint64)
+        for name in ("term_offsets", "term_blocks", "link_offsets"):
+            self.writer.append(name, zero)
+
+    def add_documents(self, offsets, words, lengths):
+        """
+        :param offsets: Offsets array of the documents' links from pack_words, or a slice of one.
+        :param words: Packed link bytes the offsets point into.
+        :param lengths: Array of the documents' lengths.
+        """
+        first = int(offsets[0])
+        for start in range(0, len(lengths), MERGE_CHUNK):
+            chunk = offsets[start + 1:start + MERGE_CHUNK + 1].astype(np.uint64)
+            self.writer.append("link_offsets", chunk - np.uint64(first) + np.uint64(self.link_bytes))
+        self.writer.append("link_words", words[first:int(offsets[-1])])
+        self.writer.append("lengths", lengths)
+        self.link_bytes += int(offsets[-1]) - first
+        self.count += len(lengths)
+        self.total_length += int(np.asarray(lengths).sum(dtype=np.uint64))
+
+    def add_link_index(self, hashes, order):
+        """
+        :param hashes: Sorted link hashes, after every hash added before.
+        :param order: Position from base of the link behind each hash.
+        """
+        self.writer.append("link_hashes", hashes)
+        self.writer.append("link_order", order)
+
+    def add_terms(self, terms, sizes, ids, values, posting_lengths):
+        """
+        :param terms: Sorted terms, after every term added before.
+        :param sizes: Postings of each term.
+        :param ids: Document ids of every term's postings back to back, ascending within a term.
+        :param values: Term frequencies of the postings.
+        :param posting_lengths: Length of each posting's document.
+        """
+        if not len(terms):
+            return
+        sizes = np.asarray(sizes, dtype=np.intp)
+        ids = np.asarray(ids, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.uint64)
+        firsts = np.cumsum(sizes) - sizes
+        gaps = np.diff(ids, prepend=np.uint64(0))
+        # each term's first id is stored whole, not as a gap from the previous term's last.
+        gaps[firsts] = ids[firsts]
+        doc_ids, id_offsets = encode(gaps)
+        frequencies, frequency_offsets = encode(values)
+
+        # blocks of BLOCK postings, so a lookup decodes only the blocks holding the ids it wants.
+        local = np.arange(len(ids)) - np.repeat(firsts, sizes)
+        block_firsts = np.flatnonzero(local % BLOCK == 0)
+        block_lasts = np.append(block_firsts[1:], len(ids)) - 1
+        term_offsets, term_words = pack_words(terms)
+
+        append = self.writer.append
+        append("term_offsets", term_offsets[1:] + np.uint64(self.term_bytes))
+        append("term_words", term_words)
+        append("sizes", sizes)
+        append("max_frequencies", reduce_terms(np.maximum, values, firsts))
+        append("min_lengths", reduce_terms(np.minimum, posting_lengths, firsts))
+        append("max_shares", reduce_terms(np.maximum, values / np.maximum(posting_lengths, 1), firsts))
+        append("term_blocks", np.cumsum(-(-sizes // BLOCK)) + self.blocks)
+        append("block_last", ids[block_lasts])
+        append("block_id_starts", id_offsets[block_firsts] + self.id_bytes)
+        append("block_frequency_starts", frequency_offsets[block_firsts] + self.frequency_bytes)
+        append("doc_ids", doc_ids)
+        append("frequencies", frequencies)
+        self.term_bytes += int(term_offsets[-1])
+        self.blocks += len(block_firsts)
+        self.id_bytes += len(doc_ids)
+        self.frequency_bytes += len(frequencies)
+
+    def close(self):
+        # the block starts end with the total, so every block has an end.
+        self.writer.append("block_id_starts", [self.id_bytes])
+        self.writer.append("block_frequency_starts", [self.frequency_bytes])
+        self.writer.close({
+            "base": self.base,
+            "count": self.count,
+            "total_length": self.total_length,
+            "level": self.level,
+        })
+
+    def abort(self):
+        self.writer.abort()
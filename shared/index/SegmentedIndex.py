@@ -0,0 +1,273 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from shared.index.InvertedIndex import InvertedIndex, bm25_search
+from shared.index.Segment import Segment, link_hash
+
+MANIFEST = "manifest.json"
+
+
+class SegmentedIndex:
+    def __init__(self, directory, buffer_documents=50000, merge_factor=4, k1=1.2, b=0.75, read_only=False,
+                 retry_delay=5):
+        """
+        Inverted index kept as immutable segment files, log-structured.
+        New documents go to an in memory InvertedIndex buffer. A full buffer is frozen and written
+        as a segment by a background thread while a new buffer takes writes.
+        Merges are tiered: once merge_factor segments share a level, they are merged into one segment
+        of the next level, so the number of segments grows with the log of the documents.
+        The manifest listing the live segments is replaced atomically after every flush and merge.
+        Queries take the current segments and buffers under a short lock and search them without it,
+        so neither writes nor background flushes and merges wait for queries or hold them up.
+        Links are only indexed once across every segment and buffer, a link seen again is skipped,
+        so redelivered and recrawled pages never show up twice in results or in document frequency.
+        Written segments are checked through their sorted link hashes, so startup reads no links.
+        :param directory: Directory of segment files and the manifest, created if missing.
+        :param buffer_documents: Documents buffered in memory before a flush.
+        :param merge_factor: Segments of one level merged together.
+        :param k1: BM25 term frequency saturation.
+        :param b: BM25 length normalization.
+        :param read_only: Only search segments another process writes, leaving its files alone,
+            and pick up its flushes and merges with refresh.
+        :param retry_delay: Seconds before a failed flush is tried again. A buffer is retried until it is written,
+            keeping the buffers behind it and their tokens waiting, so document ids stay contiguous.
+        Set on_flush to a function to learn when documents are on disk: it is called from the background
+        thread with the tokens passed to add, once the segment holding their documents and the manifest
+        listing it are written.
+        """
+        self.directory = directory
+        self.buffer_documents = buffer_documents
+        self.merge_factor = merge_factor
+        self.k1 = k1
+        self.b = b
+        os.makedirs(directory, exist_ok=True)
+        self.read_only = read_only
+        self.generation = 0
+        self.segments = ()
+        state = self.read_manifest()
+        if state:
+            self.generation = state["generation"]
+            self.segments = tuple(Segment(os.path.join(directory, name)) for name in state["segments"])
+        live = {os.path.basename(segment.path) for segment in self.segments}
+        for name in os.listdir(directory) if not read_only else []:
+            # segments and temporary files of a flush or merge cut short.
+            if name.endswith(".tmp") or name.endswith(".seg") and name not in live:
+                os.remove(os.path.join(directory, name))
+        # buffers written by the background thread but not yet in the manifest.
+        self.frozen = ()
+        self.buffer = InvertedIndex(k1, b, self.next_id())
+        # links of the buffer and frozen buffers, written segments are checked on disk through their link hashes.
+        self.buffered = set()
+        # tokens of the documents added to the buffer, handed to on_flush once it is written.
+        self.tokens = []
+        self.on_flush = None
+        self.retry_delay = retry_delay
+        # set on close, a flush still failing then gives up and leaves its tokens unreleased.
+        self.closing = threading.Event()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(1)
+
+    def next_id(self):
+        if self.segments:
+            return self.segments[-1].base + self.segments[-1].count
+        return 0
+
+    def __len__(self):
+        with self.lock:
+            return sum(source.stats()[0] for source in self.sources())
+
+    def sources(self):
+        return list(self.segments) + list(self.frozen) + [self.buffer]
+
+    def add(self, link, counts, token=None):
+        """
+        :param link: Link of the document.
+        :param counts: Counter of the document's tokens.
+        :param token: Anything handed to on_flush once the document is written, even if the link was skipped.
+        :return: Document id, or None if the link is already indexed.
+        """
+        if self.read_only:
+            raise ValueError("index is read only")
+        with self.lock:
+            if token is not None:
+                self.tokens.append(token)
+            if self.indexed(link):
+                return None
+            self.buffered.add(link)
+            doc_id = self.buffer.add(link, counts)
+            if len(self.buffer) >= self.buffer_documents:
+                self.freeze()
+            return doc_id
+
+    def indexed(self, link):
+        """
+        :return: True if a buffer or written segment already holds the link. Called under the lock.
+        """
+        if link in self.buffered:
+            return True
+        hashed = link_hash(link)
+        return any(segment.has_link(link, hashed) for segment in self.segments)
+
+    def add_many(self, documents):
+        return sum(self.add(link, counts) is not None for link, counts in documents)
+
+    def freeze(self):
+        """
+        Hand the buffer to the background thread and start a new one. Called under the lock.
+        """
+        buffer = self.buffer
+        self.frozen += (buffer,)
+        self.buffer = InvertedIndex(self.k1, self.b, buffer.base + len(buffer))
+        tokens, self.tokens = self.tokens, []
+        self.executor.submit(self.flush_buffer, buffer, tokens)
+
+    def flush(self, wait=True):
+        """
+        Write the buffer as a segment.
+        :param wait: Wait for it and any merges to finish.
+        """
+        with self.lock:
+            if len(self.buffer):
+                self.freeze()
+            elif self.tokens:
+                # only skipped links, written once the buffers ahead of them are.
+                tokens, self.tokens = self.tokens, []
+                self.executor.submit(self.release, tokens)
+        if wait:
+            self.executor.submit(lambda: None).result()
+
+    def release(self, tokens):
+        if tokens and self.on_flush:
+            self.on_flush(tokens)
+
+    def close(self):
+        self.closing.set()
+        self.flush()
+        self.executor.shutdown()
+
+    def name(self):
+        self.generation += 1
+        return f"segment-{self.generation:08d}.seg"
+
+    def read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as file:
+            return json.load(file)
+
+    def write_manifest(self, segments):
+        state = {"generation": self.generation, "segments": [os.path.basename(s.path) for s in segments]}
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + ".tmp", path)
+
+    def flush_buffer(self, buffer, tokens=()):
+        """
+        Write a frozen buffer as a segment, list it in the manifest, then hand its tokens to on_flush.
+        A failed write is retried every retry_delay seconds. Its links stay known and its tokens unreleased
+        until it is written, so nothing it holds is skipped or acknowledged while it is not on disk.
+        """
+        while not self.write_buffer(buffer):
+            if self.closing.wait(self.retry_delay):
+                print("Index buffer not written, its documents are left unacknowledged.")
+                return
+        self.release(tokens)
+        try:
+            self.merge()
+        except Exception as e:
+            print("Error merging index segments:", e)
+
+    def write_buffer(self, buffer):
+        """
+        :return: True once the buffer's segment and the manifest listing it are written.
+        """
+        path = os.path.join(self.directory, self.name())
+        try:
+            # the buffer is frozen, so its arrays are read without copying.
+            postings = {
+                term: (np.frombuffer(ids, dtype=np.uint32), np.frombuffer(frequencies, dtype=np.uint32))
+                for term, (ids, frequencies) in buffer.terms.items()
+            }
+            Segment.write(path, buffer.base, buffer.links, np.frombuffer(buffer.lengths, dtype=np.uint32), postings)
+            del postings
+            segments = self.segments + (Segment(path),)
+            self.write_manifest(segments)
+        except Exception as e:
+            print("Error flushing index buffer:", e)
+            if os.path.exists(path):
+                os.remove(path)
+            return False
+        with self.lock:
+            self.segments = segments
+            self.frozen = tuple(frozen for frozen in self.frozen if frozen is not buffer)
+            self.buffered.difference_update(buffer.links)
+        return True
+
+    def merge(self):
+        """
+        Merge the oldest run of merge_factor neighbouring segments sharing a level, until there is none.
+        """
+        while True:
+            segments = self.segments
+            run = None
+            for start in range(len(segments) - self.merge_factor + 1):
+                group = segments[start:start + self.merge_factor]
+                if all(segment.level == group[0].level for segment in group):
+                    run = start
+                    break
+            if run is None:
+                return
+            group = segments[run:run + self.merge_factor]
+            path = os.path.join(self.directory, self.name())
+            Segment.merge(path, group, group[0].level + 1)
+            # only this thread changes segments, so the run is still in place.
+            merged = self.segments[:run] + (Segment(path),) + self.segments[run + self.merge_factor:]
+            self.write_manifest(merged)
+            with self.lock:
+                self.segments = merged
+            # open maps keep the data of removed files readable for queries already running.
+            for segment in group:
+                os.remove(segment.path)
+
+    def refresh(self):
+        """
+        Pick up the segments listed in the manifest now, for a read only index.
+        Segments still listed stay open, and queries already running keep the segments they took.
+        A segment removed by a merge between reading the manifest and opening it raises FileNotFoundError,
+        leaving the index as it was.
+        :return: True if the segments changed.
+        """
+        state = self.read_manifest()
+        if not state or state["generation"] == self.generation:
+            return False
+        opened = {os.path.basename(segment.path): segment for segment in self.segments}
+        segments = tuple(opened.get(name) or Segment(os.path.join(self.directory, name)) for name in state["segments"])
+        with self.lock:
+            self.generation = state["generation"]
+            self.segments = segments
+            self.buffer = InvertedIndex(self.k1, self.b, self.next_id())
+        return True
+
+    def readers(self):
+        """
+        :return: List of the current segments and buffers, searchable without the lock.
+        """
+        with self.lock:
+            return self.sources()
+
+    def search(self, terms, k=10):
+        """
+        Rank documents of every segment and buffer together with BM25.
+        :param terms: List of query tokens.
+        :param k: Most results.
+        :return: List of link, score pairs, best first.
+        """
+        return bm25_search(self.readers(), terms, k, self.k1, self.b)
@@ -0,0 +1,85 @@
+import threading
+from array import array
+
+from shared.index.Postings import PostingList, intersect, union
+
+
+class TagIndex:
+    def __init__(self, heavy=256):
+        """
+        Tag to links index of the Indexer's link_tag output, for multi-tag AND and OR queries.
+        Each link gets a dense integer id, and each tag a PostingList of ids,
+        delta varint encoded or a roaring bitmap for common tags, rather than a dict of link strings.
+        Links are tagged once, a link seen again only counts towards its popularity.
+        :param heavy: Ids in a tag's list before it becomes a bitmap.
+        """
+        self.heavy = heavy
+        self.links = []
+        self.ids = {}
+        # times each link was added, by id.
+        self.counts = array("I")
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.links)
+
+    def add_tagged_link(self, tags, link):
+        """
+        :param tags: Tags of the link.
+        :param link: The link itself.
+        :return: If the link was added, rather than counted again.
+        """
+        with self.lock:
+            doc_id = self.ids.get(link)
+            if doc_id is not None:
+                self.counts[doc_id] += 1
+                return False
+            doc_id = len(self.links)
+            self.ids[link] = doc_id
+            self.links.append(link)
+            self.counts.append(1)
+            for tag in dict.fromkeys(tags):
+                if tag not in self.tags:
+                    self.tags[tag] = PostingList(self.heavy)
+                self.tags[tag].append(doc_id)
+            return True
+
+    def popularity(self, link):
+        """
+        :param link: Link to look up.
+        :return: Times the link was added, 0 if never.
+        """
+        with self.lock:
+            doc_id = self.ids.get(link)
+            return 0 if doc_id is None else self.counts[doc_id]
+
+    def get_links_by_tag(self, tag):
+        """
+        :param tag: Tag to search.
+        :return: Links with the tag.
+        """
+        return self.query([tag])
+
+    def query(self, tags, mode="and"):
+        """
+        :param tags: Tags to search.
+        :param mode: "and" for links with every tag, "or" for links with any.
+        :return: Links, in the order they were added.
+        """
+        with self.lock:
+            lists = [self.tags.get(tag) for tag in dict.fromkeys(tags)]
+            if mode == "and":
+                ids = intersect(lists) if all(lists) else []
+            elif mode == "or":
+                ids = union([posting_list for posting_list in lists if posting_list])
+            else:
+                raise ValueError(f"unknown query mode {mode}")
+            return [self.links[doc_id] for doc_id in ids.tolist()] if len(ids) else []
+
+    @property
+    def nbytes(self):
+        """
+        :return: Bytes of postings data, not counting links and per list overhead.
+        """
+        return sum(posting_list.nbytes for posting_list in self.tags.values())
@@ -0,0 +1,27 @@
+import fakeredis
+from queue import Queue
+
+from DataGatherer.app.Channel import Channel
+from shared.utils.Backpressure import BackpressureMonitor
+from shared.utils.Syncer import Syncer
+
+
+def test_state_reports_queues_and_remote_limits():
+    client = fakeredis.FakeRedis()
+    channel = Channel(high_water=2)
+    channel.put_many(["a", "b"])
+    bounded = Queue(maxsize=10)
+    bounded.put("c")
+    syncer = Syncer(client, remote_limits={"link_text": 100})
+    syncer.remote_lengths["link_text"] = 40
+
+    monitor = BackpressureMonitor(client, "backpressure:test", queues={"pages": channel, "tags": bounded},
+                                  syncer=syncer, counters=lambda: {"shed": 7})
+    monitor.publish()
+    state = {key.decode(): value.decode() for key, value in client.hgetall("backpressure:test").items()}
+
+    assert state["pages:size"] == "2" and state["pages:pressured"] == "1"
+    assert state["tags:size"] == "1" and state["tags:high_water"] == "10" and state["tags:pressured"] == "0"
+    assert state["link_text:remote_length"] == "40" and state["link_text:remote_limit"] == "100"
+    assert state["shed"] == "7"
+    assert state["pressured"] == "1"
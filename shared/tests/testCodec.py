@@ -0,0 +1,56 @@
+import json
+import fakeredis
+import pytest
+from queue import Queue
+
+from shared.utils.Codec import Codec, MSGPACK, MSGPACK_ZSTD, MSGPACK_LZ4
+from shared.utils.Syncer import Syncer
+
+PAGE = ["https://en.wikipedia.org/wiki/Example", "Example text of a page. " * 200]
+
+
+def test_json_is_legacy_format():
+    assert Codec().encode(PAGE) == json.dumps(PAGE)
+
+
+@pytest.mark.parametrize("compression, version", [(None, MSGPACK), ("zstd", MSGPACK_ZSTD), ("lz4", MSGPACK_LZ4)])
+def test_round_trip(compression, version):
+    codec = Codec("msgpack", compression)
+    data = codec.encode(PAGE)
+    assert data[0] == version
+    assert codec.decode(data) == PAGE
+
+
+def test_small_items_are_not_compressed():
+    codec = Codec("msgpack", "zstd", threshold=1024)
+    assert codec.encode("https://a.com/")[0] == MSGPACK
+    assert codec.decode(codec.encode("https://a.com/")) == "https://a.com/"
+
+
+def test_any_codec_decodes_every_format():
+    writers = [Codec(), Codec("msgpack"), Codec("msgpack", "zstd"), Codec("msgpack", "lz4")]
+    for reader in writers:
+        for writer in writers:
+            assert reader.decode(writer.encode(PAGE)) == PAGE
+            # redis-py returns bytes, legacy JSON included.
+            assert reader.decode(json.dumps(PAGE).encode()) == PAGE
+
+
+def test_malformed_raises_value_error():
+    codec = Codec("msgpack", "zstd")
+    with pytest.raises(ValueError):
+        codec.decode(bytes([MSGPACK_ZSTD]) + b"not zstd")
+    with pytest.raises(ValueError):
+        codec.decode(b"{not json")
+
+
+def test_syncer_mixed_codecs():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    q.put(PAGE)
+    Syncer(client, codec=Codec("msgpack", "zstd")).push(q, "link_text", False, -1, "queue")
+    q.put(PAGE)
+    Syncer(client).push(q, "link_text", False, -1, "queue")
+
+    assert Syncer(client).pull(q, "link_text", False, -1) == 2
+    assert [q.get_nowait(), q.get_nowait()] == [PAGE, PAGE]
@@ -0,0 +1,55 @@
+import pickle
+import random
+from collections import Counter
+
+import pytest
+
+from shared.utils.FrequencySketch import FrequencySketch
+
+
+def zipf_counts(documents=300, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [Counter(rng.choices(vocabulary, weights, k=50)) for _ in range(documents)]
+
+
+def test_never_underestimates():
+    sketch = FrequencySketch(memory=32 * 1024, heavy=50)
+    exact = Counter()
+    for counts in zipf_counts():
+        sketch.update(counts)
+        exact.update(counts)
+    estimates = sketch.get_many(exact.keys())
+    assert all(estimates[word] >= count for word, count in exact.items())
+    assert all(sketch.get(word) == estimates[word] for word in list(exact)[:100])
+    assert sketch.get("never seen", 0) >= 0
+
+
+def test_heavy_hitters_are_exact():
+    sketch = FrequencySketch(memory=32 * 1024, heavy=50)
+    exact = Counter()
+    for counts in zipf_counts():
+        sketch.update(counts)
+        exact.update(counts)
+    top = [word for word, _ in exact.most_common(20)]
+    assert all(word in sketch.exact for word in top)
+    assert all(sketch[word] == exact[word] for word in top)
+    assert len(sketch.exact) <= 50 + 50 // 4
+
+
+def test_memory_budget():
+    sketch = FrequencySketch(memory=1024 * 1024, depth=4, heavy=1000)
+    assert sketch.nbytes <= 1024 * 1024
+    with pytest.raises(ValueError):
+        FrequencySketch(memory=1000, heavy=1000)
+
+
+def test_copy_and_pickle():
+    sketch = FrequencySketch(memory=16 * 1024, heavy=10)
+    sketch.update({"alpha": 3, "beta": 1})
+    clone = sketch.copy()
+    sketch.update({"alpha": 2, "gamma": 1})
+    assert clone["alpha"] == 3 and sketch["alpha"] == 5
+    loaded = pickle.loads(pickle.dumps(sketch))
+    assert loaded.get_many(["alpha", "beta", "gamma"]) == sketch.get_many(["alpha", "beta", "gamma"])
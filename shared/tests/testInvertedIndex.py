@@ -0,0 +1,97 @@
+import time
+from collections import Counter
+from math import log
+from queue import Queue
+
+import fakeredis
+
+from shared.index.IndexFeeder import IndexFeeder
+from shared.index.InvertedIndex import InvertedIndex
+from shared.index.SegmentedIndex import SegmentedIndex
+from shared.utils.Syncer import Syncer
+
+
+def bm25(index, terms, link):
+    doc_id = index.ids[link]
+    average = index.total_length / len(index)
+    score = 0
+    for term in set(terms):
+        ids, frequencies = index.terms.get(term, ([], []))
+        if doc_id in ids:
+            tf = frequencies[list(ids).index(doc_id)]
+            df = len(ids)
+            idf = log(1 + (len(index) - df + 0.5) / (df + 0.5))
+            norm = index.k1 * (1 - index.b + index.b * index.lengths[doc_id] / average)
+            score += idf * tf * (index.k1 + 1) / (tf + norm)
+    return score
+
+
+def test_ranked_bm25():
+    index = InvertedIndex()
+    index.add("a", Counter({"apple": 3, "banana": 1}))
+    index.add("b", Counter({"apple": 1, "cherry": 5}))
+    index.add("c", Counter({"banana": 2, "cherry": 1, "date": 1}))
+    assert index.add("a", Counter({"zebra": 1})) is None
+    assert len(index) == 3 and index.frequency("apple") == 2
+
+    results = index.search(["apple", "banana", "apple"], k=10)
+    assert [link for link, _ in results] == sorted("abc", key=lambda link: -bm25(index, ["apple", "banana"], link))
+    for link, score in results:
+        assert abs(score - bm25(index, ["apple", "banana"], link)) < 1e-9
+    assert [link for link, _ in index.search(["cherry"], k=1)] == ["b"]
+    assert index.search(["missing"]) == []
+
+
+def test_ties_by_link_order():
+    index = InvertedIndex()
+    for link in "xyz":
+        index.add(link, Counter({"same": 1}))
+    assert [link for link, _ in index.search(["same"], k=2)] == ["x", "y"]
+
+
+def test_feeder_reads_its_own_group():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    q.put(["https://a.com/", "Apples and bananas"])
+    q.put(["https://b.com/", "Cherries"])
+    # the gatherer declares the groups, so entries are kept for indexers that start reading later.
+    Syncer(client, streams=["link_text"], stream_groups=["indexers"]).push(q, "link_text", False, -1, "queue")
+
+    index = InvertedIndex()
+    feeder = IndexFeeder(index, worker_timeout=0.05)
+    feeder.connect_redis(client, sync_mode="blocking", consumer="feeder")
+    feeder.start()
+    deadline = time.monotonic() + 5
+    while len(index) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    feeder.stop()
+
+    assert index.search(["apples"])[0][0] == "https://a.com/"
+    assert client.xpending("link_text:stream", "search")["pending"] == 0
+    # the indexers' group still gets both pages.
+    assert Syncer(client, streams=["link_text"], group="indexers").stream_pull({"link_text": Queue()}) == 2
+
+
+def test_feeder_acks_once_written(tmp_path):
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    q.put(["https://a.com/", "Apples and bananas"])
+    q.put(["https://b.com/", "Cherries"])
+    Syncer(client, streams=["link_text"]).push(q, "link_text", False, -1, "queue")
+
+    index = SegmentedIndex(str(tmp_path))
+    feeder = IndexFeeder(index, worker_timeout=0.05, flush_period=60)
+    feeder.connect_redis(client, sync_mode="blocking", consumer="feeder")
+    feeder.start()
+    deadline = time.monotonic() + 5
+    while len(index) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    # searchable, but only in memory, so a crash would get both pages again.
+    assert index.search(["apples"])[0][0] == "https://a.com/"
+    assert client.xpending("link_text:stream", "search")["pending"] == 2
+
+    feeder.stop()
+    assert len(index.segments) == 1
+    assert client.xpending("link_text:stream", "search")["pending"] == 0
+    index.close()
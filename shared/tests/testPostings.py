@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+import pytest
+
+from shared.index import Postings
+from shared.index.Postings import PostingList, decode, encode, intersect, union, varint
+from shared.index.TagIndex import TagIndex
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 32 + 5, 2 ** 63], dtype=np.uint64)
+    data, offsets = encode(values)
+    assert (decode(data) == values).all()
+    assert offsets.tolist() == [0, 1, 2, 3, 5, 7, 9, 12, 17]
+    assert bytes(data[:5]) == bytes(varint(0) + varint(1) + varint(127) + varint(128))
+    assert len(decode(b"")) == 0
+
+
+def random_lists(seed=0):
+    rng = random.Random(seed)
+    lists = []
+    for density in [0.9, 0.3, 0.01, 0.001]:
+        posting_list = PostingList()
+        for doc_id in range(20000):
+            if rng.random() < density:
+                posting_list.append(doc_id)
+        lists.append(posting_list)
+    return lists
+
+
+@pytest.mark.parametrize("roaring", [True, False])
+def test_and_or_match_sets(monkeypatch, roaring):
+    if not roaring:
+        monkeypatch.setattr(Postings, "BitMap", None)
+    lists = random_lists()
+    assert (lists[0].bitmap is not None) == roaring and lists[3].bitmap is None
+    sets = [set(posting_list.ids().tolist()) for posting_list in lists]
+    assert all(len(posting_list) == len(found) for posting_list, found in zip(lists, sets))
+    for chosen in [[0], [0, 1], [1, 2], [0, 2, 3], [3, 1]]:
+        assert intersect([lists[i] for i in chosen]).tolist() == sorted(set.intersection(*[sets[i] for i in chosen]))
+        assert union([lists[i] for i in chosen]).tolist() == sorted(set.union(*[sets[i] for i in chosen]))
+
+
+def test_append_order():
+    posting_list = PostingList()
+    posting_list.append(5)
+    with pytest.raises(ValueError):
+        posting_list.append(5)
+
+
+def test_tag_index():
+    index = TagIndex()
+    index.add_tagged_link(["python", "search"], "https://a.com/")
+    index.add_tagged_link(["python", "redis"], "https://b.com/")
+    index.add_tagged_link(["search"], "https://c.com/")
+    assert not index.add_tagged_link(["other"], "https://a.com/")
+    assert not index.add_tagged_link(["python"], "https://a.com/")
+    assert [index.popularity(link) for link in ["https://a.com/", "https://b.com/", "https://d.com/"]] == [3, 1, 0]
+    assert index.get_links_by_tag("python") == ["https://a.com/", "https://b.com/"]
+    assert index.query(["python", "search"]) == ["https://a.com/"]
+    assert index.query(["redis", "search"], mode="or") == ["https://a.com/", "https://b.com/", "https://c.com/"]
+    assert index.query(["python", "missing"]) == []
+    assert index.query(["missing"], mode="or") == []
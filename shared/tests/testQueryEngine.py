@@ -0,0 +1,59 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from shared.index.QueryEngine import QueryEngine
+from shared.index.SegmentedIndex import SegmentedIndex
+
+
+def documents(count=3000, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(400)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return [(f"https://a.com/{i}", Counter(rng.choices(vocabulary, weights, k=rng.randint(1, 30))))
+            for i in range(count)]
+
+
+def same_results(first, second):
+    assert [link for link, _ in first] == [link for link, _ in second]
+    assert np.allclose([score for _, score in first], [score for _, score in second])
+
+
+QUERIES = [["w0"], ["w0", "w1"], ["w0", "w1", "w250"], ["w3", "w399", "w120", "w0"], ["w390"], ["missing", "w5"]]
+
+
+@pytest.fixture(scope="module")
+def segmented(tmp_path_factory):
+    index = SegmentedIndex(str(tmp_path_factory.mktemp("segments")), buffer_documents=700, merge_factor=2)
+    index.add_many(documents())
+    # a flushed merge, a flushed segment and a buffer.
+    index.executor.submit(lambda: None).result()
+    yield index
+    index.close()
+
+
+@pytest.mark.parametrize("scoring", ["bm25", "tfidf"])
+def test_max_score_matches_exhaustive(segmented, scoring):
+    engine = QueryEngine(segmented, scoring=scoring)
+    for query in QUERIES:
+        for k in [1, 10, 100]:
+            same_results(engine.search(query, k), engine.search(query, k, exhaustive=True))
+
+
+def test_bm25_matches_index_search(segmented):
+    engine = QueryEngine(segmented)
+    for query in QUERIES:
+        same_results(engine.search(query, 10), segmented.search(query, 10))
+
+
+def test_segment_lookup_blocks(segmented):
+    segment = segmented.segments[0]
+    i = segment.terms.index("w0")
+    ids, frequencies = segment.decode(i)
+    assert len(ids) > 128 and (np.diff(ids.astype(np.int64)) > 0).all()
+    chosen = np.sort(np.random.default_rng(0).choice(np.arange(segment.base, segment.base + segment.count), 50,
+                                                     replace=False))
+    expected = dict(zip(ids.tolist(), frequencies.tolist()))
+    assert segment.lookup("w0", chosen).tolist() == [expected.get(doc_id, 0) for doc_id in chosen.tolist()]
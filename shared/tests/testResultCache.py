@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from shared.utils.ResultCache import MISSING, ResultCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lru_and_ttl():
+    clock = Clock()
+    cache = ResultCache(size=2, ttl=10, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    # "b" is the least recently used.
+    cache.put("c", 3)
+    assert cache.get("b") is MISSING and cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is MISSING and len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_identical_queries_share_one_computation():
+    cache = ResultCache()
+    calls = []
+    release = asyncio.Event()
+
+    async def compute():
+        calls.append(1)
+        await release.wait()
+        return ["result"]
+
+    waiting = [asyncio.create_task(cache.get_or_compute("q", compute)) for _ in range(5)]
+    await asyncio.sleep(0)
+    # a cancelled request leaves the computation running for the others.
+    waiting[0].cancel()
+    release.set()
+    results = await asyncio.gather(*waiting[1:])
+    assert len(calls) == 1
+    assert [source for _, source in results] == ["coalesced"] * 4
+    assert all(value == ["result"] for value, _ in results)
+    assert await cache.get_or_compute("q", compute) == (["result"], "hit")
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_cached():
+    cache = ResultCache()
+
+    async def fail():
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_compute("q", fail)
+    assert cache.get("q") is MISSING and not cache.pending
@@ -0,0 +1,158 @@
+import os
+import random
+from collections import Counter
+
+from shared.index import Segment as segment_module
+from shared.index.InvertedIndex import InvertedIndex
+from shared.index.Segment import Segment
+from shared.index.SegmentedIndex import SegmentedIndex
+
+
+def documents(count=40, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(30)] + ["ünï"]
+    return [(f"https://a.com/{i}", Counter(rng.choices(vocabulary, k=rng.randint(1, 12)))) for i in range(count)]
+
+
+def same_results(first, second):
+    assert [link for link, _ in first] == [link for link, _ in second]
+    assert all(abs(a - b) < 1e-9 for (_, a), (_, b) in zip(first, second))
+
+
+def test_segment_round_trip(tmp_path):
+    memory = InvertedIndex()
+    memory.add_many(documents(10))
+    path = str(tmp_path / "one.seg")
+    Segment.write(path, 0, memory.links, memory.lengths, {
+        term: (ids, frequencies) for term, (ids, frequencies) in memory.terms.items()
+    })
+    segment = Segment(path)
+    assert segment.terms.index("ünï") >= 0 and segment.terms.index("missing") == -1
+    for term in memory.terms:
+        ids, tf, lengths = memory.postings(term)
+        found = segment.postings(term)
+        assert (found[0] == ids).all() and (found[1] == tf).all() and (found[2] == lengths).all()
+    assert segment.link(3) == memory.link(3)
+
+
+def test_matches_one_index_through_flushes_and_merges(tmp_path):
+    memory = InvertedIndex()
+    segmented = SegmentedIndex(str(tmp_path), buffer_documents=3, merge_factor=2)
+    for link, counts in documents():
+        memory.add(link, counts)
+        segmented.add(link, counts)
+        # searches mid flush see every document.
+        same_results(memory.search(["w1", "w2"]), segmented.search(["w1", "w2"]))
+    segmented.flush()
+    assert len(segmented) == 40
+    # 40 documents in buffers of 3 merged in pairs leave a segment per set bit of 14 buffers.
+    assert len(segmented.segments) == bin(14).count("1")
+    for query in [["w0"], ["w3", "w7", "ünï"], ["missing"]]:
+        same_results(memory.search(query, k=5), segmented.search(query, k=5))
+    segmented.close()
+
+    reopened = SegmentedIndex(str(tmp_path), buffer_documents=3, merge_factor=2)
+    same_results(memory.search(["w5", "w9"]), reopened.search(["w5", "w9"]))
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        ["manifest.json"] + [os.path.basename(segment.path) for segment in reopened.segments])
+    reopened.add("https://b.com/", Counter({"w5": 4}))
+    assert reopened.search(["w5"], k=1)[0][0] == "https://b.com/"
+    reopened.close()
+
+
+def test_merge_writes_in_chunks(tmp_path, monkeypatch):
+    # a few postings per chunk, so merges write many runs of terms and documents.
+    monkeypatch.setattr(segment_module, "MERGE_CHUNK", 5)
+    memory = InvertedIndex()
+    segmented = SegmentedIndex(str(tmp_path), buffer_documents=8, merge_factor=2)
+    for link, counts in documents(64):
+        memory.add(link, counts)
+        segmented.add(link, counts)
+    segmented.flush()
+    assert [segment.level for segment in segmented.segments] == [3]
+    merged = segmented.segments[0]
+    for term in memory.terms:
+        ids, tf, lengths = memory.postings(term)
+        found = merged.postings(term)
+        assert (found[0] == ids).all() and (found[1] == tf).all() and (found[2] == lengths).all()
+    assert [merged.link(i) for i in range(64)] == memory.links
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+    segmented.close()
+
+
+def test_links_indexed_once_across_segments(tmp_path):
+    index = SegmentedIndex(str(tmp_path), buffer_documents=100)
+    assert index.add("a", Counter(["cat"])) == 0
+    index.flush()
+    assert index.add("a", Counter(["cat", "cat"])) is None
+    assert index.add("b", Counter(["cat", "dog"])) == 1
+    assert [link for link, _ in index.search(["cat"])] == ["a", "b"]
+    assert len(index) == 2
+    index.close()
+
+    # the links of written segments are found on disk after a restart, none are read at startup.
+    reopened = SegmentedIndex(str(tmp_path), merge_factor=2)
+    assert not reopened.buffered
+    assert reopened.add("a", Counter(["cat"])) is None
+    assert reopened.add("c", Counter(["cat"])) == 2
+    reopened.flush()
+    # and in the segment they are merged into.
+    merged, written = reopened.segments
+    assert merged.level == 1 and merged.has_link("a") and merged.has_link("b")
+    assert written.has_link("c") and not merged.has_link("c") and not merged.has_link("d")
+    assert reopened.add("b", Counter(["cat"])) is None
+    reopened.close()
+
+
+def test_read_only_refresh(tmp_path):
+    writer = SegmentedIndex(str(tmp_path), buffer_documents=5, merge_factor=2)
+    reader = SegmentedIndex(str(tmp_path), read_only=True)
+    assert not reader.refresh() and reader.search(["w1"]) == []
+    writer.add_many(documents(20))
+    writer.flush()
+    assert reader.refresh() and not reader.refresh()
+    same_results(writer.search(["w1", "w4"]), reader.search(["w1", "w4"]))
+    kept = reader.segments[0]
+    writer.add_many((link + "?new", counts) for link, counts in documents(3, seed=1))
+    writer.flush()
+    assert reader.refresh() and reader.segments[0] is kept and len(reader) == 23
+    writer.close()
+
+
+def test_on_flush_after_segment_is_written(tmp_path):
+    index = SegmentedIndex(str(tmp_path), buffer_documents=2)
+    written = []
+    index.on_flush = lambda tokens: written.append((tokens, len(index.read_manifest()["segments"])))
+    index.add("a", Counter(["cat"]), "1-0")
+    assert written == []
+    index.add("b", Counter(["dog"]), "2-0")
+    # a skipped link still gets its token back, once the buffers ahead of it are written.
+    index.add("a", Counter(["cat"]), "3-0")
+    index.flush()
+    assert written == [(["1-0", "2-0"], 1), (["3-0"], 1)]
+    index.close()
+
+
+def test_failed_flush_is_retried(tmp_path, monkeypatch):
+    index = SegmentedIndex(str(tmp_path), buffer_documents=100, retry_delay=0.01)
+    written = []
+    index.on_flush = written.append
+    write = Segment.write
+    failures = []
+
+    def flaky_write(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(args[0])
+            raise OSError("disk full")
+        write(*args, **kwargs)
+
+    monkeypatch.setattr(Segment, "write", staticmethod(flaky_write))
+    index.add("a", Counter(["cat"]), "1-0")
+    index.flush()
+    assert len(failures) == 2
+    # the tokens only come back once the segment is on disk.
+    assert written == [["1-0"]]
+    assert [link for link, _ in index.search(["cat"])] == ["a"]
+    assert index.add("a", Counter(["cat"]), "2-0") is None
+    index.close()
+    assert len(SegmentedIndex(str(tmp_path)).segments) == 1
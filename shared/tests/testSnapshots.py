@@ -0,0 +1,55 @@
+import os
+from collections import Counter
+
+import numpy as np
+
+from shared.utils.FrequencySketch import FrequencySketch
+from shared.utils.Snapshots import Snapshots, read_arrays, write_arrays
+
+
+def test_arrays_round_trip(tmp_path):
+    path = str(tmp_path / "arrays.snap")
+    table = np.arange(12, dtype=np.uint32).reshape(3, 4)
+    write_arrays(path, {"version": 3}, {"table": table, "empty": np.zeros(0, dtype=np.uint64),
+                                        "bytes": np.frombuffer(b"abc", dtype=np.uint8)})
+    header, arrays = read_arrays(path)
+    assert header["version"] == 3
+    assert (arrays["table"] == table).all()
+    assert arrays["empty"].size == 0 and arrays["bytes"].tobytes() == b"abc"
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_deltas_then_compaction(tmp_path):
+    snapshots = Snapshots(str(tmp_path), compact_ratio=0.5)
+    frequency = Counter({"alpha": 3, "beta": 1, "gamma": 2, "delta": 1})
+    assert snapshots.save(frequency, 2, frequency.copy()) == 1
+
+    for version, added in enumerate([{"alpha": 1}, {"épée": 2}], start=2):
+        frequency.update(added)
+        assert snapshots.save(None, version + 1, Counter(added)) == version
+    assert [kind for kind, _ in snapshots.files()] == ["base", "delta", "delta"]
+    assert Snapshots(str(tmp_path)).load() == (frequency, 4, 3)
+
+    # deltas now pass half the base, so the next save is a base and older files go.
+    added = {"zeta": 1}
+    frequency.update(added)
+    snapshots.save(frequency, 5, Counter(added))
+    assert snapshots.files() == [("base", 4)]
+    assert Snapshots(str(tmp_path)).load() == (frequency, 5, 4)
+
+
+def test_sketch_round_trip(tmp_path):
+    sketch = FrequencySketch(memory=64 * 1024, heavy=5)
+    for i in range(50):
+        sketch.update({f"w{i % 13}": i % 3 + 1, "common": 2})
+    snapshots = Snapshots(str(tmp_path))
+    snapshots.save(sketch, 50, Counter())
+    loaded, document_count, version = Snapshots(str(tmp_path)).load()
+    words = [f"w{i}" for i in range(13)] + ["common", "missing"]
+    assert loaded.get_many(words) == sketch.get_many(words)
+    assert (document_count, version) == (50, 1)
+    assert loaded.floor == sketch.floor
+
+
+def test_empty_directory(tmp_path):
+    assert Snapshots(str(tmp_path / "new")).load() is None
@@ -0,0 +1,316 @@
+import fakeredis
+import json
+import time
+from queue import Queue
+
+from shared.utils.Syncer import Syncer
+
+
+def test_push_batches():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for i in range(25):
+        q.put(["https://a.com/", i])
+    syncer = Syncer(client, push_batch=10)
+
+    assert syncer.push(q, "link_text", False, -1, "queue") == 25
+    assert [json.loads(item)[1] for item in client.lrange("link_text:list", 0, -1)] == list(range(25))
+    assert q.empty()
+
+
+def test_push_set_and_limit():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for item in ["a", "b", "a", "c"]:
+        q.put(item)
+    syncer = Syncer(client, push_batch=2)
+
+    assert syncer.push(q, "links", False, 3, "set") == 3
+    assert client.scard("links:set") == 2
+    assert q.qsize() == 1
+
+
+def test_push_copy_only_keeps_items():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    q.put("a")
+    syncer = Syncer(client)
+
+    syncer.push(q, "links", True, -1, "queue")
+    assert q.qsize() == 1
+    assert client.llen("links:list") == 1
+
+
+def test_pull_batches():
+    client = fakeredis.FakeRedis()
+    client.rpush("target_links:list", *(json.dumps(f"https://a.com/{i}") for i in range(25)))
+    q = Queue()
+    syncer = Syncer(client, pull_batch=10)
+
+    assert syncer.pull(q, "target_links", False, 12) == 12
+    assert [q.get() for _ in range(12)] == [f"https://a.com/{i}" for i in range(12)]
+    assert syncer.pull(q, "target_links", False, -1) == 13
+    assert client.llen("target_links:list") == 0
+
+
+def test_pull_copy_only():
+    client = fakeredis.FakeRedis()
+    client.rpush("target_links:list", *(json.dumps(i) for i in range(5)))
+    q = Queue()
+    syncer = Syncer(client, pull_batch=2)
+
+    assert syncer.pull(q, "target_links", True, -1) == 5
+    assert client.llen("target_links:list") == 5
+    assert list(q.queue) == [0, 1, 2, 3, 4]
+
+
+def test_blocking_mode_round_trip():
+    client = fakeredis.FakeRedis()
+    out_queue = Queue()
+    in_queue = Queue()
+    syncer = Syncer(client, push_map=[(out_queue, "link_text", False, -1, "queue")],
+                    pull_map=[(in_queue, "link_text", False, -1)], sync_period=5,
+                    mode="blocking", max_latency=0.01, block_timeout=0.1)
+    syncer.start()
+    try:
+        start = time.perf_counter()
+        out_queue.put(["https://a.com/", "text"])
+        assert in_queue.get(timeout=2) == ["https://a.com/", "text"]
+        # far below one sync_period.
+        assert time.perf_counter() - start < 1
+    finally:
+        syncer.stop()
+
+
+def test_blocking_pull_falls_back_to_blpop():
+    client = fakeredis.FakeRedis()
+    client.rpush("target_links:list", *(json.dumps(i) for i in range(3)))
+    q = Queue()
+    syncer = Syncer(client, mode="blocking", block_timeout=0.1)
+    syncer.use_blmpop = False
+
+    assert syncer.block_pull({"target_links:list": q}) == 3
+    assert list(q.queue) == [0, 1, 2]
+    assert syncer.block_pull({"target_links:list": q}) == 0
+
+
+def test_stop_flushes_pushes():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    syncer = Syncer(client, push_map=[(q, "link_tag", False, -1, "queue")], sync_period=60)
+    syncer.start()
+    q.put(["https://a.com/", ["tag"]])
+    syncer.stop()
+    assert client.llen("link_tag:list") == 1
+
+
+def test_blocking_pull_keeps_limit():
+    client = fakeredis.FakeRedis()
+    client.rpush("target_links:list", *(json.dumps(i) for i in range(10)))
+    q = Queue()
+    syncer = Syncer(client, pull_map=[(q, "target_links", False, 4)], mode="blocking", block_timeout=0.1)
+    syncer.start()
+    time.sleep(0.3)
+    syncer.stop()
+    assert q.qsize() == 4
+    assert client.llen("target_links:list") == 6
+
+
+def test_stream_push_pull_ack():
+    client = fakeredis.FakeRedis()
+    out_queue, in_queue, tag_queue = Queue(), Queue(), Queue()
+    producer = Syncer(client, streams=["link_text"])
+    consumer = Syncer(client, push_map=[(tag_queue, "link_tag", False, -1, "queue")], streams=["link_text"],
+                      consumer="a")
+    out_queue.put(["https://a.com/", "text"])
+    producer.push(out_queue, "link_text", False, -1, "queue")
+
+    assert consumer.stream_pull({"link_text": in_queue}) == 1
+    message_id, (link, text) = in_queue.get_nowait()
+    assert link == "https://a.com/"
+    assert client.xpending("link_text:stream", "workers")["pending"] == 1
+
+    tag_queue.put([link, ["tag"]])
+    consumer.ack("link_text", message_id)
+    consumer.flush_acks()
+    # the result is pushed before its entry is acked.
+    assert client.llen("link_tag:list") == 1
+    assert client.xpending("link_text:stream", "workers")["pending"] == 0
+
+
+def test_acked_stream_entries_are_trimmed():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for i in range(5):
+        q.put(i)
+    # a group declared by the producer holds every entry until it reads them.
+    Syncer(client, streams=["link_text"], stream_groups=["archive"]).push(q, "link_text", False, -1, "queue")
+    consumer = Syncer(client, streams=["link_text"], sync_period=0)
+
+    consumer.stream_pull({"link_text": q}, limit=3)
+    for message_id, _ in list(q.queue)[:2]:
+        consumer.ack("link_text", message_id)
+    consumer.send_acks()
+    assert client.xlen("link_text:stream") == 5
+
+    client.xgroup_destroy("link_text:stream", "archive")
+    consumer.ack("link_text", q.queue[2][0])
+    consumer.send_acks()
+    # the 2 entries nobody has read are kept.
+    assert client.xlen("link_text:stream") == 2
+
+    consumer.stream_pull({"link_text": q})
+    for message_id, _ in list(q.queue)[3:]:
+        consumer.ack("link_text", message_id)
+    consumer.send_acks()
+    assert client.xlen("link_text:stream") == 0
+
+
+def test_stream_claims_entries_of_dead_consumer():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for i in range(3):
+        q.put(i)
+    Syncer(client, streams=["link_text"]).push(q, "link_text", False, -1, "queue")
+
+    crashed = Syncer(client, streams=["link_text"], consumer="crashed")
+    assert crashed.stream_pull({"link_text": Queue()}) == 3
+
+    replica = Syncer(client, streams=["link_text"], consumer="replica", claim_idle=0)
+    assert replica.stream_pull({"link_text": q}) == 3
+    assert sorted(item for _, item in q.queue) == [0, 1, 2]
+
+
+def test_stream_replicas_share_entries():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for i in range(10):
+        q.put(i)
+    Syncer(client, streams=["link_text"]).push(q, "link_text", False, -1, "queue")
+
+    first, second = Queue(), Queue()
+    Syncer(client, streams=["link_text"], consumer="a").stream_pull({"link_text": first}, limit=4)
+    Syncer(client, streams=["link_text"], consumer="b").stream_pull({"link_text": second})
+    assert first.qsize() == 4
+    assert second.qsize() == 6
+
+
+def test_blocking_stream_round_trip():
+    client = fakeredis.FakeRedis()
+    out_queue, in_queue = Queue(), Queue()
+    producer = Syncer(client, push_map=[(out_queue, "link_text", False, -1, "queue")], mode="blocking",
+                      max_latency=0.01, block_timeout=0.1, streams=["link_text"])
+    consumer = Syncer(client, pull_map=[(in_queue, "link_text", False, -1)], mode="blocking",
+                      block_timeout=0.1, streams=["link_text"])
+    producer.start()
+    consumer.start()
+    try:
+        out_queue.put("page")
+        message_id, item = in_queue.get(timeout=2)
+        assert item == "page"
+        consumer.ack("link_text", message_id)
+    finally:
+        producer.stop()
+        consumer.stop()
+    assert client.xpending("link_text:stream", "workers")["pending"] == 0
+
+
+def test_blocking_ack_waits_for_held_batch():
+    client = fakeredis.FakeRedis()
+    out_queue, in_queue, tag_queue = Queue(), Queue(), Queue()
+    out_queue.put(["https://a.com/", "text"])
+    Syncer(client, streams=["link_text"]).push(out_queue, "link_text", False, -1, "queue")
+
+    # the push thread holds a batch for up to max_latency before sending it.
+    consumer = Syncer(client, push_map=[(tag_queue, "link_tag", False, -1, "queue")],
+                      pull_map=[(in_queue, "link_text", False, -1)], mode="blocking", max_latency=0.5,
+                      block_timeout=0.05, streams=["link_text"])
+    consumer.start()
+    try:
+        message_id, (link, text) = in_queue.get(timeout=2)
+        tag_queue.put([link, ["tag"]])
+        consumer.ack("link_text", message_id)
+
+        time.sleep(0.2)
+        # the pull thread has run, but the result is still held, so the entry is not acked.
+        assert client.llen("link_tag:list") == 0
+        assert client.xpending("link_text:stream", "workers")["pending"] == 1
+
+        deadline = time.monotonic() + 3
+        while client.xpending("link_text:stream", "workers")["pending"] and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert client.llen("link_tag:list") == 1
+        assert client.xpending("link_text:stream", "workers")["pending"] == 0
+    finally:
+        consumer.stop()
+
+
+def test_failed_push_is_retried_first():
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    q = Queue(maxsize=2)
+    q.put(1)
+    q.put(2)
+    syncer = Syncer(client, push_map=[(q, "link_tag", False, -1, "queue")])
+
+    server.connected = False
+    assert syncer.push(q, "link_tag", False, -1, "queue") is None
+    # the failed batch is held by the syncer, so the full queue is never waited on.
+    q.put(3)
+    q.put(4)
+    server.connected = True
+    assert syncer.push(q, "link_tag", False, -1, "queue") == 4
+    assert [json.loads(dump) for dump in client.lrange("link_tag:list", 0, -1)] == [1, 2, 3, 4]
+
+
+def test_remote_limit_holds_pushes():
+    client = fakeredis.FakeRedis()
+    for mode in ("poll", "blocking"):
+        client.flushall()
+        q = Queue()
+        for i in range(50):
+            q.put(i)
+        syncer = Syncer(client, push_map=[(q, "link_text", False, -1, "queue")], sync_period=0.02, mode=mode,
+                        block_timeout=0.02, max_latency=0.01, remote_limits={"link_text": 10})
+        syncer.start()
+        time.sleep(0.15)
+        assert client.llen("link_text:list") == 10
+        assert syncer.remote_lengths["link_text"] == 10
+
+        # an Indexer takes some, the syncer only tops the list back up to its limit.
+        client.lpop("link_text:list", 4)
+        time.sleep(0.15)
+        assert client.llen("link_text:list") == 10
+        assert q.qsize() == 36
+        syncer.stop()
+
+
+def test_pulls_stop_at_queue_room():
+    client = fakeredis.FakeRedis()
+    client.rpush("link_text:list", *(json.dumps(i) for i in range(10)))
+    q = Queue(maxsize=4)
+    syncer = Syncer(client, pull_map=[(q, "link_text", False, -1)], sync_period=0.05)
+    syncer.start()
+    time.sleep(0.2)
+    syncer.stop()
+
+    assert q.qsize() == 4
+    assert client.llen("link_text:list") == 6
+
+
+def test_stream_remote_length_counts_unacked():
+    client = fakeredis.FakeRedis()
+    q = Queue()
+    for i in range(5):
+        q.put(i)
+    syncer = Syncer(client, streams=["link_text"], remote_limits={"link_text": 3}, consumer="a")
+    syncer.push(q, "link_text", False, -1, "queue")
+    assert syncer.remote_length("link_text") == 5
+
+    syncer.stream_pull({"link_text": q}, limit=2)
+    # read but unacked entries still count.
+    assert syncer.remote_length("link_text") == 5
+    for message_id, _ in list(q.queue):
+        syncer.ack("link_text", message_id)
+    syncer.flush_acks()
+    assert syncer.remote_length("link_text") == 3
@@ -0,0 +1,24 @@
+from shared.utils.Tokenizer import Tokenizer
+
+
+def test_strips_punctuation_and_stopwords():
+    tokenizer = Tokenizer()
+    text = "The Quick, brown fox! (It's) jumping—over “the” lazy dog's back... I said."
+    assert tokenizer.tokenize(text) == ["quick", "brown", "fox", "it's", "jumping", "lazy", "dog's", "said"]
+
+
+def test_unicode_normalization():
+    tokenizer = Tokenizer()
+    # ligature, full width digits and case folding.
+    assert tokenizer.tokenize("ﬁle １２３ STRASSE Straße") == ["file", "123", "strasse", "strasse"]
+
+
+def test_count_many_matches_count():
+    tokenizer = Tokenizer()
+    texts = ["Alpha beta, beta.", "", "Gamma\x00delta gamma", "the and of"]
+    assert tokenizer.count_many(texts) == [tokenizer.count(text.replace("\x00", " ")) for text in texts]
+    assert tokenizer.count_many([]) == []
+
+
+def test_min_length():
+    assert Tokenizer(min_length=2).tokenize("x marks yy spot") == ["marks", "yy", "spot"]
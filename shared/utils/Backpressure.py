@@ -0,0 +1,83 @@
+import threading
+import time
+import redis
+
+
+class BackpressureMonitor:
+    def __init__(self, redis_client, key, queues=None, syncer=None, counters=None, period=1):
+        """
+        Publishes how full every stage of a service is to a Redis hash, for dashboards and other services.
+        Fields are <queue>:size, <queue>:high_water and <queue>:pressured for each local queue,
+        <name>:remote_length and <name>:remote_limit for each remote limit of the syncer,
+        the numbers returned by counters, pressured (1 if anything is full) and updated (unix time).
+
+        :param redis_client: Redis client instance.
+        :param key: Redis hash to write, such as backpressure:datagatherer.
+        :param queues: Dictionary of name to Channel or queue.Queue.
+        :param syncer: Syncer whose remote limits are reported.
+        :param counters: Function returning a dictionary of extra numbers, such as shed links.
+        :param period: Seconds between updates.
+        """
+        self.redis_client = redis_client
+        self.key = key
+        self.queues = queues or {}
+        self.syncer = syncer
+        self.counters = counters
+        self.period = period
+        self.running = False
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def state(self):
+        """
+        :return: Dictionary of the current fields.
+        """
+        fields = {}
+        pressured = False
+        for name, q in self.queues.items():
+            if hasattr(q, "pressured"):
+                high_water, full = q.high_water, q.pressured
+            else:
+                high_water, full = q.maxsize, bool(q.maxsize) and q.qsize() >= q.maxsize
+            fields[f"{name}:size"] = q.qsize()
+            fields[f"{name}:high_water"] = high_water
+            fields[f"{name}:pressured"] = int(full)
+            pressured = pressured or full
+
+        if self.syncer:
+            for name, limit in self.syncer.remote_limits.items():
+                length = self.syncer.remote_lengths.get(name, 0)
+                fields[f"{name}:remote_length"] = length
+                fields[f"{name}:remote_limit"] = limit
+                pressured = pressured or length >= limit
+
+        if self.counters:
+            fields.update(self.counters())
+        fields["pressured"] = int(pressured)
+        fields["updated"] = time.time()
+        return fields
+
+    def publish(self):
+        try:
+            self.redis_client.hset(self.key, mapping=self.state())
+        except redis.exceptions.RedisError as e:
+            print("Redis error during backpressure update:", e)
+
+    def run(self):
+        while self.running:
+            self.publish()
+            self.stopping.wait(self.period)
+
+    def start(self):
+        if not self.running:
+            self.running = True
+            self.stopping.clear()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+        self.publish()
@@ -0,0 +1,97 @@
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# First byte of a binary item. JSON text never starts with these, so legacy JSON items still decode.
+MSGPACK = 1
+MSGPACK_ZSTD = 2
+MSGPACK_LZ4 = 3
+
+
+class Codec:
+    def __init__(self, name="json", compression=None, threshold=1024, level=3):
+        """
+        Turns items into the bytes stored in Redis and back.
+        "json" writes plain JSON, as every service did before codecs.
+        "msgpack" writes a version byte then msgpack, compressed when the packed item is over threshold bytes.
+        Any codec decodes everything the others write, so services can be switched over one at a time.
+
+        :param name: "json" or "msgpack".
+        :param compression: None, "zstd" or "lz4", only used with msgpack.
+        :param threshold: Smallest packed item in bytes worth compressing.
+        :param level: Compression level.
+        """
+        if name not in ("json", "msgpack"):
+            raise ValueError(f"Unknown codec {name}.")
+        if compression not in (None, "zstd", "lz4"):
+            raise ValueError(f"Unknown compression {compression}.")
+        if name == "msgpack" and msgpack is None:
+            raise ImportError("msgpack codec requires the msgpack package.")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression requires the zstandard package.")
+        if compression == "lz4" and lz4 is None:
+            raise ImportError("lz4 compression requires the lz4 package.")
+
+        self.name = name
+        self.compression = compression if name == "msgpack" else None
+        self.threshold = threshold
+        self.level = level
+        self.compressor = zstandard.ZstdCompressor(level=level) if self.compression == "zstd" else None
+        self.decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    def encode(self, item):
+        """
+        :param item: JSON compatible item, tuples come back as lists.
+        :return: str for json, bytes for msgpack.
+        """
+        if self.name == "json":
+            return json.dumps(item)
+
+        packed = msgpack.packb(item, use_bin_type=True)
+        if self.compression is None or len(packed) < self.threshold:
+            return bytes([MSGPACK]) + packed
+        if self.compression == "zstd":
+            return bytes([MSGPACK_ZSTD]) + self.compressor.compress(packed)
+        return bytes([MSGPACK_LZ4]) + lz4.frame.compress(packed, compression_level=self.level)
+
+    def decode(self, data):
+        """
+        :param data: bytes or str written by any codec.
+        :return: Item.
+        :raises ValueError: If the data is malformed or needs a package that is not installed.
+        """
+        if isinstance(data, str):
+            return json.loads(data)
+        if not data or data[0] not in (MSGPACK, MSGPACK_ZSTD, MSGPACK_LZ4):
+            return json.loads(data)
+
+        version, body = data[0], data[1:]
+        if msgpack is None:
+            raise ValueError("Item was written with msgpack, which is not installed.")
+        try:
+            if version == MSGPACK_ZSTD:
+                if self.decompressor is None:
+                    raise ValueError("Item was compressed with zstd, which is not installed.")
+                body = self.decompressor.decompress(body)
+            elif version == MSGPACK_LZ4:
+                if lz4 is None:
+                    raise ValueError("Item was compressed with lz4, which is not installed.")
+                body = lz4.frame.decompress(body)
+            return msgpack.unpackb(body, raw=False)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError(f"Malformed item: {e}") from e
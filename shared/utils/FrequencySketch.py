@@ -0,0 +1,136 @@
+import hashlib
+import numpy as np
+
+# rough bytes per exactly counted word: the string, its count, its base and two dict slots.
+HEAVY_BYTES = 200
+
+
+def fingerprint(word):
+    """
+    Stable 64 bit hash of a word, the same in every process unlike hash().
+    """
+    return int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class FrequencySketch:
+    def __init__(self, memory=64 * 2 ** 20, depth=4, heavy=10000):
+        """
+        Document frequency in a fixed amount of memory, a drop in for a Counter of word counts.
+        The most frequent words are counted exactly, every other word shares a Count-Min Sketch,
+        a depth x width table of counters where a word adds to one counter per row.
+        Estimates of sketched words are never below the real count and overshoot by collisions,
+        which matter little to IDF since rare words are the ones affected.
+        A sketched word whose estimate passes the smallest exact count is promoted,
+        the exact set is trimmed back to the heavy count when it grows past it by a quarter.
+        :param memory: Bytes for the sketch and the exact counts together.
+        :param depth: Rows of the sketch, more rows lower the chance of a large overshoot.
+        :param heavy: Words counted exactly.
+        """
+        # the exact set may grow a quarter past heavy before it is trimmed.
+        width = (memory - (heavy + heavy // 4) * HEAVY_BYTES) // (depth * 4)
+        if width < 1:
+            raise ValueError(f"memory of {memory} bytes does not fit {heavy} exact words and a sketch")
+        self.memory = memory
+        self.depth = depth
+        self.width = width
+        self.heavy = heavy
+        self.table = np.zeros((depth, width), dtype=np.uint32)
+        # exact counts since promotion, and the estimate at promotion which stays in the sketch.
+        self.exact = {}
+        self.base = {}
+        # smallest total kept exactly, sketched words must pass it to be promoted.
+        self.floor = 0
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes + len(self.exact) * HEAVY_BYTES
+
+    def _columns(self, words):
+        """
+        :return: Array of counter columns, one row per sketch row and one column per word.
+        """
+        hashes = np.fromiter((fingerprint(word) for word in words), dtype=np.uint64, count=len(words))
+        # double hashing, row i uses low + i * high.
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = (hashes >> np.uint64(32)) | np.uint64(1)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low[None, :] + rows * high[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def _add(self, columns, values):
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], values)
+
+    def _estimate(self, columns):
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def update(self, counts):
+        """
+        Add counts, the same as Counter.update.
+        :param counts: Dictionary of word to count.
+        """
+        exact = self.exact
+        words = []
+        values = []
+        for word, value in counts.items():
+            if word in exact:
+                exact[word] += value
+            else:
+                words.append(word)
+                values.append(value)
+        if not words:
+            return
+
+        columns = self._columns(words)
+        self._add(columns, np.array(values, dtype=np.uint32))
+        estimates = self._estimate(columns)
+        for i in np.flatnonzero(estimates > self.floor):
+            word = words[i]
+            exact[word] = 0
+            self.base[word] = int(estimates[i])
+        if len(exact) > self.heavy + self.heavy // 4:
+            self._trim()
+
+    def _trim(self):
+        """
+        Keep the heavy most frequent exact words, returning the counts of the rest to the sketch.
+        """
+        exact, base = self.exact, self.base
+        ranked = sorted(exact, key=lambda word: exact[word] + base[word], reverse=True)
+        demoted = [word for word in ranked[self.heavy:] if exact[word]]
+        if demoted:
+            self._add(self._columns(demoted), np.array([exact[word] for word in demoted], dtype=np.uint32))
+        for word in ranked[self.heavy:]:
+            del exact[word]
+            del base[word]
+        if ranked[:self.heavy]:
+            last = ranked[self.heavy - 1] if len(ranked) >= self.heavy else ranked[-1]
+            self.floor = exact[last] + base[last]
+
+    def get(self, word, default=0):
+        if word in self.exact:
+            return self.exact[word] + self.base[word]
+        return int(self._estimate(self._columns([word]))[0]) or default
+
+    def __getitem__(self, word):
+        return self.get(word)
+
+    def get_many(self, words):
+        """
+        Estimate many words at once.
+        :param words: Collection of words.
+        :return: Dictionary of word to count.
+        """
+        exact, base = self.exact, self.base
+        found = {word: exact[word] + base[word] for word in words if word in exact}
+        sketched = [word for word in words if word not in exact]
+        if sketched:
+            found.update(zip(sketched, self._estimate(self._columns(sketched)).tolist()))
+        return found
+
+    def copy(self):
+        clone = FrequencySketch.__new__(FrequencySketch)
+        clone.__dict__.update(self.__dict__)
+        clone.table = self.table.copy()
+        clone.exact = dict(self.exact)
+        clone.base = dict(self.base)
+        return clone
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+# marks a key missing, since None can be a cached value.
+MISSING = object()
+
+
+class ResultCache:
+    def __init__(self, size=10000, ttl=30, clock=time.monotonic):
+        """
+        Results of recent queries, least recently used dropped first, each kept at most ttl seconds.
+        A query missing from the cache while an identical one is computed waits for that computation
+        instead of starting its own, so a burst of one query costs one search.
+        The computation runs as its own task, so a request cancelled while waiting does not cancel it
+        for the requests still waiting on it.
+        Used from one event loop, so it needs no lock.
+        :param size: Most results kept.
+        :param ttl: Seconds a result is served before it is computed again, bounding how stale it can be.
+        :param clock: Function giving the time in seconds.
+        """
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        # key to the task computing it.
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        """
+        :return: Cached value, or MISSING if absent or expired.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return MISSING
+        value, expires = entry
+        if expires <= self.clock():
+            del self.entries[key]
+            return MISSING
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = (value, self.clock() + self.ttl)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    async def get_or_compute(self, key, compute):
+        """
+        :param key: Hashable key of the normalized query.
+        :param compute: Function giving an awaitable of the value.
+        :return: Value, and "hit", "coalesced" or "miss" for where it came from.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            self.hits += 1
+            return value, "hit"
+        task = self.pending.get(key)
+        if task:
+            self.coalesced += 1
+            source = "coalesced"
+        else:
+            self.misses += 1
+            source = "miss"
+            task = asyncio.ensure_future(compute())
+            self.pending[key] = task
+            task.add_done_callback(lambda done: self.finish(key, done))
+        return await asyncio.shield(task), source
+
+    def finish(self, key, task):
+        del self.pending[key]
+        # failures are not cached, the next request tries again.
+        if not task.cancelled() and task.exception() is None:
+            self.put(key, task.result())
+
+    def stats(self):
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -0,0 +1,284 @@
+import json
+import mmap
+import os
+import re
+import shutil
+import struct
+from collections import Counter
+
+import numpy as np
+
+from shared.utils.FrequencySketch import FrequencySketch
+
+MAGIC = b"SEARCHS1"
+# magic, then the length of the JSON header that follows.
+PREFIX = struct.Struct("<8sQ")
+ALIGN = 8
+NAME = re.compile(r"^(base|delta)-(\d{12})\.snap$")
+
+
+def pack_words(words):
+    """
+    :param words: List of words.
+    :return: Offsets array with one more entry than words, and the UTF-8 bytes of every word joined.
+    """
+    encoded = [word.encode("utf-8") for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+    return offsets, np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+
+def unpack_words(offsets, blob):
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])]
+
+
+def write_arrays(path, header, arrays):
+    """
+    Write arrays after a JSON header, each aligned so it can be mapped in place.
+    Written to a temporary file, synced and renamed, so a reader never sees half a file.
+    :param path: File to write.
+    :param header: JSON compatible dictionary.
+    :param arrays: Dictionary of name to numpy array.
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, list(array.shape), offset]
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+    encoded = json.dumps(dict(header, arrays=layout)).encode("utf-8")
+    encoded += b" " * (-(PREFIX.size + len(encoded)) % ALIGN)
+
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(PREFIX.pack(MAGIC, len(encoded)))
+        file.write(encoded)
+        for array in arrays.values():
+            data = np.ascontiguousarray(array).tobytes()
+            file.write(data)
+            file.write(b"\0" * (-len(data) % ALIGN))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+class ArrayWriter:
+    def __init__(self, path, dtypes, chunk=1 << 22):
+        """
+        Write a file in the layout of write_arrays a chunk at a time, for arrays too large to hold at once.
+        Each array is appended to its own temporary file, and the parts are joined behind the header on close,
+        so memory stays at one chunk however large the arrays grow.
+        :param path: File to write.
+        :param dtypes: Dictionary of name to dtype of every array, each one dimensional.
+        :param chunk: Most elements copied out of an array per write.
+        """
+        self.path = path
+        self.chunk = chunk
+        self.parts = {name: (open(f"{path}.{name}.tmp", "w+b"), np.dtype(dtype)) for name, dtype in dtypes.items()}
+        self.lengths = dict.fromkeys(dtypes, 0)
+
+    def append(self, name, array):
+        """
+        :param name: Array to extend.
+        :param array: Values appended to it, cast to its dtype.
+        """
+        file, dtype = self.parts[name]
+        array = np.asarray(array)
+        for start in range(0, len(array), self.chunk):
+            file.write(np.ascontiguousarray(array[start:start + self.chunk], dtype=dtype).tobytes())
+        self.lengths[name] += len(array)
+
+    def close(self, header):
+        """
+        Join the parts behind the header, then sync and rename the file like write_arrays.
+        :param header: JSON compatible dictionary.
+        """
+        layout = {}
+        offset = 0
+        for name, (_, dtype) in self.parts.items():
+            layout[name] = [dtype.str, [self.lengths[name]], offset]
+            offset += -(-self.lengths[name] * dtype.itemsize // ALIGN) * ALIGN
+        encoded = json.dumps(dict(header, arrays=layout)).encode("utf-8")
+        encoded += b" " * (-(PREFIX.size + len(encoded)) % ALIGN)
+
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, "wb") as out:
+                out.write(PREFIX.pack(MAGIC, len(encoded)))
+                out.write(encoded)
+                for name, (file, dtype) in self.parts.items():
+                    file.seek(0)
+                    shutil.copyfileobj(file, out)
+                    out.write(b"\0" * (-self.lengths[name] * dtype.itemsize % ALIGN))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temporary, self.path)
+        finally:
+            self.abort()
+
+    def abort(self):
+        """
+        Remove the parts, leaving no file behind if close was never reached.
+        """
+        for file, _ in self.parts.values():
+            file.close()
+            os.remove(file.name)
+        self.parts = {}
+
+
+def read_arrays(path):
+    """
+    Map a file written by write_arrays.
+    :param path: File to read.
+    :return: Header dictionary, and dictionary of name to read only array backed by the mapped file.
+    """
+    with open(path, "rb") as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, length = PREFIX.unpack_from(mapped)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a snapshot")
+    header = json.loads(bytes(mapped[PREFIX.size:PREFIX.size + length]))
+    start = PREFIX.size + length
+    arrays = {}
+    for name, (dtype, shape, offset) in header.pop("arrays").items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape)) if shape else 1
+        arrays[name] = np.frombuffer(mapped, dtype, count, start + offset).reshape(shape)
+    return header, arrays
+
+
+def counts_arrays(counts, prefix=""):
+    words = list(counts)
+    offsets, blob = pack_words(words)
+    return {
+        prefix + "offsets": offsets,
+        prefix + "words": blob,
+        prefix + "counts": np.fromiter(counts.values(), dtype=np.uint64, count=len(words)),
+    }
+
+
+def counts_from(arrays, prefix=""):
+    words = unpack_words(arrays[prefix + "offsets"], arrays[prefix + "words"])
+    return dict(zip(words, arrays[prefix + "counts"].tolist()))
+
+
+class Snapshots:
+    def __init__(self, directory, compact_ratio=0.5):
+        """
+        Versioned document frequency snapshots in a directory, so a restarted Indexer tags with real IDF at once.
+        A Counter is saved as a base holding every word, then deltas holding only the words counted since
+        the last save, so a save costs the words that changed rather than the whole vocabulary.
+        Once the deltas hold more words than compact_ratio of the base, the next save writes a new base,
+        which keeps both the amortized save cost and the load time proportional to the vocabulary.
+        A FrequencySketch is always saved whole, its size is fixed by its memory budget.
+        Each file is named by its version, and is written atomically.
+        :param directory: Directory of snapshot files, created if missing.
+        :param compact_ratio: Delta words per base word before a new base is written.
+        """
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        os.makedirs(directory, exist_ok=True)
+        self.version = 0
+        self.base_words = 0
+        self.delta_words = 0
+        for kind, version in self.files():
+            self.version = max(self.version, version)
+
+    def files(self):
+        """
+        :return: List of kind, version pairs, oldest first.
+        """
+        found = []
+        for name in os.listdir(self.directory):
+            match = NAME.match(name)
+            if match:
+                found.append((match.group(1), int(match.group(2))))
+        return sorted(found, key=lambda item: item[1])
+
+    def path(self, kind, version):
+        return os.path.join(self.directory, f"{kind}-{version:012d}.snap")
+
+    def needs_base(self, frequency, delta):
+        """
+        :return: If saving would write a whole base rather than a delta, and so needs the frequency.
+        """
+        return isinstance(frequency, FrequencySketch) or not self.base_words or \
+            self.delta_words + len(delta) > self.base_words * self.compact_ratio
+
+    def save(self, frequency, document_count, delta):
+        """
+        :param frequency: Counter or FrequencySketch, not modified. Only read when needs_base is true.
+        :param document_count: Documents counted so far.
+        :param delta: Counter of the counts added since the last save.
+        :return: Version saved.
+        """
+        version = self.version + 1
+        header = {"version": version, "document_count": document_count}
+        if isinstance(frequency, FrequencySketch):
+            header.update(kind="sketch", memory=frequency.memory, depth=frequency.depth,
+                          heavy=frequency.heavy, floor=frequency.floor)
+            arrays = dict(counts_arrays(frequency.exact, "exact_"), table=frequency.table,
+                          base=np.fromiter(frequency.base.values(), dtype=np.uint64, count=len(frequency.base)))
+            kind = "base"
+        elif self.needs_base(frequency, delta):
+            header["kind"] = "counter"
+            arrays = counts_arrays(frequency)
+            kind = "base"
+        else:
+            header["kind"] = "counter"
+            arrays = counts_arrays(delta)
+            kind = "delta"
+
+        write_arrays(self.path(kind, version), header, arrays)
+        self.version = version
+        if kind == "base":
+            self.base_words = len(frequency.exact) if header["kind"] == "sketch" else len(frequency)
+            self.delta_words = 0
+            self.prune(version)
+        else:
+            self.delta_words += len(delta)
+        return version
+
+    def prune(self, version):
+        """
+        Remove every file older than the base of the given version.
+        """
+        for kind, older in self.files():
+            if older < version:
+                os.remove(self.path(kind, older))
+
+    def load(self):
+        """
+        :return: Counter or FrequencySketch, documents counted and version of the latest snapshot,
+            or None if there is no base.
+        """
+        files = self.files()
+        bases = [version for kind, version in files if kind == "base"]
+        if not bases:
+            return None
+        header, arrays = read_arrays(self.path("base", bases[-1]))
+        if header["kind"] == "sketch":
+            frequency = FrequencySketch(header["memory"], header["depth"], header["heavy"])
+            frequency.table[:] = arrays["table"]
+            frequency.exact = counts_from(arrays, "exact_")
+            frequency.base = dict(zip(frequency.exact, arrays["base"].tolist()))
+            frequency.floor = header["floor"]
+            self.base_words = len(frequency.exact)
+        else:
+            frequency = Counter(counts_from(arrays))
+            self.base_words = len(frequency)
+        document_count = header["document_count"]
+        version = header["version"]
+
+        self.delta_words = 0
+        for kind, newer in files:
+            if kind == "delta" and newer > version:
+                header, arrays = read_arrays(self.path("delta", newer))
+                delta = counts_from(arrays)
+                frequency.update(delta)
+                self.delta_words += len(delta)
+                document_count = header["document_count"]
+                version = header["version"]
+        self.version = max(self.version, version)
+        return frequency, document_count, version
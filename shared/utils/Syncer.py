@@ -1,12 +1,127 @@
-import json
+import os
 import time
 import queue
 import redis
+import socket
 import threading
 
+try:
+    from shared.utils.Codec import Codec
+except ImportError:
+    from Codec import Codec
+
+
+def drain(q, limit):
+    """
+    Take up to limit items off a queue without blocking.
+    Channels hand over a whole batch under one lock, plain queues are emptied item by item.
+    :param q: Channel or queue.Queue.
+    :param limit: Most items to take, -1 for no limit.
+    :return: List of items.
+    """
+    if hasattr(q, "get_batch"):
+        return q.get_batch(limit)
+
+    items = []
+    while limit == -1 or len(items) < limit:
+        try:
+            items.append(q.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+def wait_batch(q, limit, timeout):
+    """
+    Take up to limit items off a queue, waiting up to timeout seconds for the first one.
+    :param q: Channel or queue.Queue.
+    :param limit: Most items to take, -1 for no limit.
+    :param timeout: Seconds to wait for the first item.
+    :return: List of items, empty if none arrived.
+    """
+    if hasattr(q, "get_batch"):
+        return q.get_batch(limit, timeout=timeout)
+    try:
+        first = q.get(timeout=timeout)
+    except queue.Empty:
+        return []
+    return [first] + drain(q, -1 if limit == -1 else limit - 1)
+
+
+def room(q):
+    """
+    :param q: Channel or queue.Queue.
+    :return: Items that may be added before the queue is full or pressured, -1 if it is unbounded.
+    """
+    if hasattr(q, "room"):
+        return q.room()
+    if q.maxsize > 0:
+        return max(0, q.maxsize - q.qsize())
+    return -1
+
+
+def bounded(limit, free):
+    """
+    :return: The smaller of two item limits, where -1 means no limit.
+    """
+    if limit == -1:
+        return free
+    if free == -1:
+        return limit
+    return min(limit, free)
+
+
+def fill(q, items):
+    """
+    Put a list of items on a queue, in one lock acquisition for Channels.
+    :param q: Channel or queue.Queue.
+    :param items: List of items.
+    """
+    if hasattr(q, "put_many"):
+        q.put_many(items)
+        return
+    for item in items:
+        q.put(item)
+
+
+def stream_id(message_id):
+    """
+    :param message_id: Stream entry id as bytes or str.
+    :return: Tuple of milliseconds and sequence number, ordered like the ids.
+    """
+    if isinstance(message_id, bytes):
+        message_id = message_id.decode()
+    ms, _, seq = message_id.partition("-")
+    return int(ms), int(seq or 0)
+
+
+def next_id(message_id):
+    """
+    :return: The smallest stream id after message_id.
+    """
+    ms, seq = stream_id(message_id)
+    return f"{ms}-{seq + 1}"
+
+
+class StreamAck:
+    def __init__(self, redis_key, message_id, queues):
+        """
+        Marker queued behind the results of a pulled stream entry, in every push queue.
+        The entry is acknowledged once each of those queues has sent the batch holding its marker.
+        :param redis_key: Redis name of the stream.
+        :param message_id: Id of the entry.
+        :param queues: Number of push queues the marker was put in.
+        """
+        self.redis_key = redis_key
+        self.message_id = message_id
+        self.remaining = queues
+
 
 class Syncer:
-    def __init__(self, redis_client, push_map=None, pull_map=None, sync_period=5):
+    def __init__(self, redis_client, push_map=None, pull_map=None, sync_period=5, lease_map=None,
+                 push_batch=500, pull_batch=500, mode="poll", max_latency=0.05, block_timeout=1,
+                 streams=None, group="workers", consumer=None, claim_idle=60, stream_maxlen=None, codec=None,
+                 remote_limits=None, stream_groups=None):
         """
         Initializes Syncer agent.
 
@@ -14,71 +129,567 @@ class Syncer:
         :param push_map: Pairings of queues to push to Redis. Copy only or push.
         :param pull_map: Pairings of Redis to pull to queues. Copy only or pull.
         :param sync_period: Time to wait between syncs.
+        :param lease_map: Pairings of sources with a lease(count) method to pull to queues.
+        :param push_batch: Most items sent to Redis in one round trip.
+        :param pull_batch: Most items taken from Redis in one round trip.
+        :param mode: "poll" syncs everything every sync_period.
+            "blocking" pulls with BLMPOP and pushes as soon as push_batch items or max_latency is reached.
+            Copy only maps are still synced every sync_period.
+        :param max_latency: Seconds a pushed item may wait for its batch to fill, in blocking mode.
+        :param block_timeout: Seconds a blocking pull or push waits before checking for shutdown.
+        :param streams: Redis names synced through a stream at name:stream instead of the name:list queue.
+            Pulls read through a consumer group and put (message id, item) pairs in the queue.
+            Each id must be passed to ack once its results are in the push queues, unacked entries are redelivered.
+        :param group: Consumer group of pulled streams, shared by every replica of a service.
+        :param consumer: Name of this consumer in the group, unique per replica.
+        :param claim_idle: Seconds an entry may stay unacked before another consumer claims it.
+        :param stream_maxlen: Approximate length streams are trimmed to on push, None keeps entries until every
+            consumer group has acked them, after which the pulling syncers trim them away.
+        :param codec: Codec of items in Redis, plain JSON if not given. Pulls decode what any codec wrote.
+        :param remote_limits: Dictionary of Redis name to the most items left waiting in Redis.
+            Pushes to a name hold off while it is over its limit, so items back up in the local queue.
+            Pulls never take more than a queue has room for, so a full consumer leaves items in Redis.
+        :param stream_groups: Consumer groups created on a stream before it is first pushed to or read,
+            so entries are kept for services that have not started reading yet.
         """
+        if mode not in ("poll", "blocking"):
+            raise ValueError(f"Unknown sync mode {mode}.")
+        self.streams = set(streams or [])
+        for _, redis_key, copy_only, _ in pull_map or []:
+            if copy_only and redis_key in self.streams:
+                raise ValueError(f"Copy only pulls are not supported for stream {redis_key}.")
         self.redis_client = redis_client
         self.push_map = push_map or []
         self.pull_map = pull_map or []
+        self.lease_map = lease_map or []
         self.sync_period = sync_period
+        self.push_batch = push_batch
+        self.pull_batch = pull_batch
+        self.mode = mode
+        self.max_latency = max_latency
+        self.block_timeout = block_timeout
+        # BLMPOP needs Redis 7, older servers fall back to BLPOP.
+        self.use_blmpop = True
+        self.group = group
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle = claim_idle
+        self.stream_maxlen = stream_maxlen
+        self.codec = codec or Codec()
+        self.remote_limits = remote_limits or {}
+        # last seen length of each limited Redis name.
+        self.remote_lengths = {}
+        # items of a failed push, by push queue, sent before anything new from it.
+        # refilling the queue could block on a bounded queue that only this syncer drains.
+        self.retries = {}
+        self.stream_groups = list(stream_groups or [])
+        # streams whose consumer groups exist, those this syncer reads with and the stream_groups.
+        self.groups = set()
+        self.declared = set()
+        self.last_claim = 0
+        self.last_trim = 0
+        # stream ids whose results were sent, acked by the thread that sent them.
+        self.acks = queue.Queue()
+        self.ack_lock = threading.Lock()
         self.running = False
-        self.thread = None
+        self.stopping = threading.Event()
+        self.threads = []
 
     def sync(self):
         """
         Continuously syncs data between queues and Redis.
         Tuple format is: (queue, redis name, copy only?, item limit, sync type).
         No sync type for pulling.
+        Lease tuple format is: (queue, source, item limit).
         An -1 item limit means there is no limit.
         """
         while self.running:
-
-            # push data to Redis until cannot pull more.
             for q, redis_key, copy_only, limit, sync_type in self.push_map:
-                loops = 0
-                while True:
-                    try:
-                        data = q.get_nowait()
-                        dump = json.dumps(data)
-                        if sync_type != "queue":
-                            if not self.redis_client.sismember(redis_key, dump):
-                                self.redis_client.sadd(redis_key + ":set", dump)
-                        if sync_type != "set":
-                            self.redis_client.rpush(redis_key + ":list", dump)
-
-                        if copy_only:
-                            q.put(data)
-
-                        loops += 1
-
-                        if limit != -1 and loops >= limit:
-                            break
-                    except queue.Empty:
-                        break
-
-            # Pull data from Redis until cannot pull more.
+                limit = bounded(limit, self.remote_room(redis_key))
+                if limit != 0:
+                    self.push(q, redis_key, copy_only, limit, sync_type)
+            # markers of handled entries went out with the pushes.
+            self.send_acks()
+
             for q, redis_key, copy_only, limit in self.pull_map:
-                loops = 0
-                while True:
-                    if limit != -1 and loops >= limit:
-                        break
-                    try:
-                        if copy_only:
-                            data = self.redis_client.lindex(redis_key + ":list", loops)
-                        else:
-                            data = self.redis_client.lpop(redis_key + ":list")
-                        if data:
-                            try:
-                                q.put(json.loads(data))
-                                loops += 1
-                            except json.decoder.JSONDecodeError:
-                                print("Syncer json decode error.")
-                        else:
-                            break
-
-                    except redis.exceptions.RedisError as e:
-                        print("Redis error during pull:", e)
-                        break
-
-            time.sleep(self.sync_period)
+                limit = bounded(limit, room(q))
+                if limit == 0:
+                    continue
+                if redis_key in self.streams:
+                    self.stream_pull({redis_key: q}, limit)
+                else:
+                    self.pull(q, redis_key, copy_only, limit)
+
+            self.lease()
+
+            # returns early on stop.
+            self.stopping.wait(self.sync_period)
+
+    def lease(self):
+        """
+        Lease from sources that pick items themselves, such as a frontier.
+        """
+        for q, source, limit in self.lease_map:
+            limit = bounded(limit, room(q))
+            if limit == 0:
+                continue
+            try:
+                fill(q, source.lease(limit))
+            except redis.exceptions.RedisError as e:
+                print("Redis error during lease:", e)
+
+    def remote_length(self, redis_key):
+        """
+        Items waiting in Redis. For a stream, the entries its slowest consumer group has not read or acked.
+        :param redis_key: Redis name.
+        :return: Number of items.
+        """
+        if redis_key not in self.streams:
+            return self.redis_client.llen(redis_key + ":list")
+        stream = redis_key + ":stream"
+        try:
+            groups = self.redis_client.xinfo_groups(stream)
+        except redis.exceptions.ResponseError:
+            # no stream yet.
+            return 0
+        if not groups:
+            return self.redis_client.xlen(stream)
+        return max((group.get("lag") or 0) + group["pending"] for group in groups)
+
+    def remote_room(self, redis_key):
+        """
+        :param redis_key: Redis name.
+        :return: Items that may be pushed before the name reaches its remote limit, -1 if it has none.
+        """
+        limit = self.remote_limits.get(redis_key)
+        if not limit:
+            return -1
+        try:
+            length = self.remote_length(redis_key)
+        except redis.exceptions.RedisError as e:
+            print("Redis error during length check:", e)
+            return -1
+        self.remote_lengths[redis_key] = length
+        return max(0, limit - length)
+
+    def remote_full(self, redis_key):
+        """
+        :param redis_key: Redis name.
+        :return: True if the name has a remote limit and is over it.
+        """
+        return self.remote_room(redis_key) == 0
+
+    def push(self, q, redis_key, copy_only, limit, sync_type):
+        """
+        Push data to Redis until the queue is empty, one multi-value command per batch.
+        :return: Number of items pushed, None if Redis failed.
+        """
+        pushed = 0
+        while limit == -1 or pushed < limit:
+            size = self.push_batch if limit == -1 else min(self.push_batch, limit - pushed)
+            items = self.take_retries(q, size)
+            if len(items) < size:
+                items += drain(q, size - len(items))
+            if not items:
+                break
+
+            if not self.send(q, items, redis_key, sync_type):
+                return None
+
+            pushed += len(items)
+            if copy_only:
+                # items go back in the queue, so one pass is all there is.
+                fill(q, items)
+                break
+        return pushed
+
+    def send(self, q, items, redis_key, sync_type):
+        """
+        Send a batch of items to Redis in one pipeline, then acknowledge the stream entries
+        whose markers were in the batch and in every other push queue before.
+        :return: True if sent, otherwise the items are kept to be sent first next time.
+        """
+        markers = [data for data in items if isinstance(data, StreamAck)]
+        data_items = [data for data in items if not isinstance(data, StreamAck)]
+        if not data_items:
+            self.release(markers)
+            return True
+        dumps = [self.codec.encode(data) for data in data_items]
+        pipe = self.redis_client.pipeline(transaction=False)
+        if sync_type != "queue":
+            pipe.sadd(redis_key + ":set", *dumps)
+        if sync_type != "set" and redis_key in self.streams:
+            for dump in dumps:
+                pipe.xadd(redis_key + ":stream", {"data": dump}, maxlen=self.stream_maxlen,
+                          approximate=self.stream_maxlen is not None)
+        elif sync_type != "set":
+            pipe.rpush(redis_key + ":list", *dumps)
+        try:
+            if sync_type != "set" and redis_key in self.streams:
+                self.declare_groups(redis_key + ":stream")
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print("Redis error during push:", e)
+            # keep the items for the next round, ahead of retries not taken yet.
+            self.retries[q] = items + self.retries.get(q, [])
+            return False
+        self.release(markers)
+        return True
+
+    def take_retries(self, q, limit):
+        """
+        Take up to limit items of a failed push from a queue.
+        :return: List of items, oldest first.
+        """
+        items = self.retries.pop(q, [])
+        if len(items) > limit:
+            self.retries[q] = items[limit:]
+            items = items[:limit]
+        return items
+
+    def push_loop(self, q, redis_key, sync_type):
+        """
+        Blocking mode push. Waits for the first item, then sends the batch once it is full or max_latency has passed.
+        """
+        while self.running:
+            # a batch never takes a name past its remote limit.
+            size = bounded(self.push_batch, self.remote_room(redis_key))
+            if size == 0:
+                self.stopping.wait(self.block_timeout)
+                continue
+            items = self.take_retries(q, size)
+            if items:
+                # a failed batch is resent as it is, topped up with what is already queued.
+                items += drain(q, size - len(items))
+                if not self.send(q, items, redis_key, sync_type):
+                    self.stopping.wait(self.block_timeout)
+                continue
+            items = wait_batch(q, size, self.block_timeout)
+            if not items:
+                continue
+            deadline = time.monotonic() + self.max_latency
+            while len(items) < size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                items += wait_batch(q, size - len(items), remaining)
+            if not self.send(q, items, redis_key, sync_type):
+                self.stopping.wait(self.block_timeout)
+
+    def ack(self, redis_key, message_id):
+        """
+        Mark a pulled stream entry as handled. Put its results in the push queues first:
+        a marker is queued behind them, and the entry is acknowledged by the thread that sends the marker,
+        so results reach Redis before their source entry is forgotten.
+        :param redis_key: Redis name of the stream.
+        :param message_id: Id that came with the item.
+        """
+        queues = [q for q, _, copy_only, _, _ in self.push_map if not copy_only]
+        if not queues:
+            self.acks.put((redis_key, message_id))
+            return
+        marker = StreamAck(redis_key, message_id, len(queues))
+        for q in queues:
+            q.put(marker)
+
+    def release(self, markers):
+        """
+        Count sent markers, then acknowledge the entries whose markers every push queue has sent.
+        """
+        with self.ack_lock:
+            for marker in markers:
+                marker.remaining -= 1
+                if marker.remaining == 0:
+                    self.acks.put((marker.redis_key, marker.message_id))
+        if markers:
+            self.send_acks()
+
+    def flush_acks(self):
+        """
+        Push every queue, sending the markers of handled entries, then acknowledge them.
+        Names over their remote limit are left alone, their entries are acked once they have been sent.
+        Only for a single sending thread, blocking mode push threads send their own markers.
+        """
+        for q, redis_key, copy_only, limit, sync_type in self.push_map:
+            if copy_only:
+                continue
+            limit = self.remote_room(redis_key)
+            if limit != 0 and self.push(q, redis_key, copy_only, limit, sync_type) is None:
+                return
+        self.send_acks()
+
+    def send_acks(self):
+        """
+        Acknowledge the stream entries whose results were sent, in one pipeline.
+        Failed acks are kept for the next call.
+        """
+        acks = drain(self.acks, -1)
+        if not acks:
+            return
+        ids = {}
+        for redis_key, message_id in acks:
+            ids.setdefault(redis_key, []).append(message_id)
+        pipe = self.redis_client.pipeline(transaction=False)
+        for redis_key, message_ids in ids.items():
+            pipe.xack(redis_key + ":stream", self.group, *message_ids)
+        try:
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print("Redis error during ack:", e)
+            fill(self.acks, acks)
+            return
+
+        if time.monotonic() - self.last_trim >= self.sync_period:
+            self.last_trim = time.monotonic()
+            for redis_key in ids:
+                self.trim(redis_key + ":stream")
+
+    def trim(self, stream):
+        """
+        Delete the entries every consumer group of a stream has read and acked,
+        those before the oldest pending entry or after the last delivered one of any group.
+        :param stream: Redis key of the stream.
+        """
+        try:
+            min_id = None
+            for group in self.redis_client.xinfo_groups(stream):
+                if group["pending"]:
+                    keep = self.redis_client.xpending(stream, group["name"])["min"]
+                else:
+                    # everything up to the last delivered entry is acked.
+                    keep = next_id(group["last-delivered-id"])
+                keep = stream_id(keep)
+                if min_id is None or keep < min_id:
+                    min_id = keep
+            if min_id is not None:
+                self.redis_client.xtrim(stream, minid="%d-%d" % min_id, approximate=False)
+        except redis.exceptions.RedisError as e:
+            print("Redis error during trim:", e)
+
+    def create_group(self, stream, group):
+        """
+        Create a consumer group of a stream, starting from its first entry, if it does not exist yet.
+        """
+        try:
+            self.redis_client.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def declare_groups(self, stream):
+        """
+        Create the stream_groups of a stream, so trimming keeps entries for them before they first read.
+        """
+        if stream in self.declared:
+            return
+        for group in self.stream_groups:
+            self.create_group(stream, group)
+        self.declared.add(stream)
+
+    def join_group(self, stream):
+        """
+        Create the consumer group of a stream this syncer reads with, and the stream_groups, if they do not exist yet.
+        """
+        if stream in self.groups:
+            return
+        self.declare_groups(stream)
+        self.create_group(stream, self.group)
+        self.groups.add(stream)
+
+    def claim(self, stream, q, limit):
+        """
+        Take over entries other consumers left unacked for claim_idle seconds, such as those of a crashed replica.
+        :return: Number of entries claimed.
+        """
+        claimed = 0
+        start_id = "0-0"
+        while limit == -1 or claimed < limit:
+            size = self.pull_batch if limit == -1 else min(self.pull_batch, limit - claimed)
+            start_id, entries = self.redis_client.xautoclaim(
+                stream, self.group, self.consumer, int(self.claim_idle * 1000), start_id=start_id, count=size
+            )[:2]
+            claimed += self.deliver(q, entries)
+            if start_id in (b"0-0", "0-0"):
+                break
+        return claimed
+
+    def deliver(self, q, entries):
+        """
+        Put stream entries in a queue as (message id, item) pairs.
+        :return: Number of entries.
+        """
+        items = []
+        for message_id, fields in entries:
+            if not fields:
+                # trimmed away while pending.
+                continue
+            message_id = message_id.decode() if isinstance(message_id, bytes) else message_id
+            try:
+                items.append((message_id, self.codec.decode(fields[b"data"])))
+            except (ValueError, KeyError):
+                print("Syncer decode error.")
+        fill(q, items)
+        return len(entries)
+
+    def stream_pull(self, queues, limit=-1, block=None):
+        """
+        Read new entries for this consumer, after reclaiming entries of dead consumers.
+        :param queues: Dictionary of Redis name to queue.
+        :param limit: Most entries per stream, -1 for no limit.
+        :param block: Seconds to wait for new entries, None returns at once.
+        :return: Number of entries pulled.
+        """
+        try:
+            streams = {redis_key + ":stream": q for redis_key, q in queues.items()}
+            for stream in streams:
+                self.join_group(stream)
+
+            pulled = 0
+            if time.monotonic() - self.last_claim >= self.claim_idle / 2:
+                self.last_claim = time.monotonic()
+                for stream, q in streams.items():
+                    pulled += self.claim(stream, q, limit)
+
+            size = self.pull_batch if limit == -1 else min(self.pull_batch, limit)
+            while True:
+                read = self.redis_client.xreadgroup(
+                    self.group, self.consumer, {stream: ">" for stream in streams}, count=size,
+                    block=None if block is None else int(block * 1000)
+                )
+                count = 0
+                for stream, entries in read or []:
+                    stream = stream.decode() if isinstance(stream, bytes) else stream
+                    count += self.deliver(streams[stream], entries)
+                pulled += count
+                # one blocking wait per call, then only what is already there.
+                block = None
+                if count < size or limit != -1:
+                    break
+            return pulled
+        except redis.exceptions.RedisError as e:
+            print("Redis error during stream pull:", e)
+            self.stopping.wait(self.block_timeout)
+            return 0
+
+    def block_pull(self, queues, count=None):
+        """
+        Wait up to block_timeout for any of the lists, then pop a batch from the first one with items.
+        :param queues: Dictionary of Redis list key to queue.
+        :param count: Most items to pop, pull_batch if not given.
+        :return: Number of items pulled.
+        """
+        keys = list(queues)
+        count = count or self.pull_batch
+        try:
+            if self.use_blmpop:
+                try:
+                    result = self.redis_client.blmpop(self.block_timeout, len(keys), *keys,
+                                                      direction="LEFT", count=count)
+                except redis.exceptions.ResponseError:
+                    self.use_blmpop = False
+                    return 0
+            else:
+                result = self.redis_client.blpop(keys, timeout=self.block_timeout)
+                if result:
+                    key, first = result
+                    rest = self.redis_client.lpop(key, count - 1) if count > 1 else None
+                    result = [key, [first] + (rest or [])]
+        except redis.exceptions.RedisError as e:
+            print("Redis error during pull:", e)
+            self.stopping.wait(self.block_timeout)
+            return 0
+
+        if not result:
+            return 0
+        key, dumps = result
+        key = key.decode() if isinstance(key, bytes) else key
+        fill(queues[key], self.decode(dumps))
+        return len(dumps)
+
+    def decode(self, dumps):
+        """
+        Decode pulled items, skipping malformed ones.
+        :param dumps: List of encoded items.
+        :return: List of items.
+        """
+        items = []
+        for dump in dumps:
+            try:
+                items.append(self.codec.decode(dump))
+            except ValueError:
+                print("Syncer decode error.")
+        return items
+
+    def pull_loop(self):
+        """
+        Blocking mode pull. Lists are popped as soon as they have items, leases run after every wait,
+        and copy only maps are synced every sync_period.
+        A pull map item limit is the most items kept waiting in its queue, so one consumer does not take a whole list.
+        """
+        last_poll = 0
+        while self.running:
+            # entries with no push queue to wait for, the others are acked by the push threads.
+            self.send_acks()
+
+            queues = {}
+            streams = {}
+            count = self.pull_batch
+            for q, redis_key, copy_only, limit in self.pull_map:
+                if copy_only:
+                    continue
+                free = bounded(-1 if limit == -1 else max(0, limit - q.qsize()), room(q))
+                if free == 0:
+                    continue
+                if free != -1:
+                    count = min(count, free)
+                if redis_key in self.streams:
+                    streams[redis_key] = q
+                else:
+                    queues[redis_key + ":list"] = q
+
+            if queues:
+                self.block_pull(queues, count)
+                if streams:
+                    self.stream_pull(streams, count)
+            elif streams:
+                self.stream_pull(streams, count, block=self.block_timeout)
+            else:
+                # every queue is full or there is nothing to block on.
+                self.stopping.wait(self.max_latency if self.pull_map else self.block_timeout)
+
+            self.lease()
+
+            if time.monotonic() - last_poll >= self.sync_period:
+                last_poll = time.monotonic()
+                for q, redis_key, copy_only, limit, sync_type in self.push_map:
+                    if copy_only:
+                        self.push(q, redis_key, copy_only, limit, sync_type)
+                for q, redis_key, copy_only, limit in self.pull_map:
+                    if copy_only:
+                        self.pull(q, redis_key, copy_only, limit)
+
+    def pull(self, q, redis_key, copy_only, limit):
+        """
+        Pull data from Redis until there is no more, with LPOP count or LRANGE per batch.
+        :return: Number of items pulled.
+        """
+        pulled = 0
+        while limit == -1 or pulled < limit:
+            size = self.pull_batch if limit == -1 else min(self.pull_batch, limit - pulled)
+            try:
+                if copy_only:
+                    dumps = self.redis_client.lrange(redis_key + ":list", pulled, pulled + size - 1)
+                else:
+                    dumps = self.redis_client.lpop(redis_key + ":list", size) or []
+            except redis.exceptions.RedisError as e:
+                print("Redis error during pull:", e)
+                break
+
+            fill(q, self.decode(dumps))
+
+            pulled += len(dumps)
+            if len(dumps) < size:
+                break
+        return pulled
 
     def start(self):
         """
@@ -86,8 +697,16 @@ class Syncer:
         """
         if not self.running:
             self.running = True
-            self.thread = threading.Thread(target=self.sync, daemon=True)
-            self.thread.start()
+            self.stopping.clear()
+            if self.mode == "blocking":
+                targets = [(self.pull_loop, ())]
+                targets += [(self.push_loop, (q, redis_key, sync_type))
+                            for q, redis_key, copy_only, _, sync_type in self.push_map if not copy_only]
+            else:
+                targets = [(self.sync, ())]
+            self.threads = [threading.Thread(target=target, args=args, daemon=True) for target, args in targets]
+            for thread in self.threads:
+                thread.start()
             print("Syncer started.")
 
     def stop(self):
@@ -95,6 +714,14 @@ class Syncer:
         Stops the sync process.
         """
         self.running = False
-        if self.thread:
-            self.thread.join()
+        self.stopping.set()
+        if self.threads:
+            for thread in self.threads:
+                thread.join()
+            self.threads = []
+            # send what arrived since the last round.
+            for q, redis_key, copy_only, limit, sync_type in self.push_map:
+                if not copy_only:
+                    self.push(q, redis_key, copy_only, limit, sync_type)
+            self.flush_acks()
             print("Syncer stopped.")
\ No newline at end of file
@@ -0,0 +1,82 @@
+import re
+import unicodedata
+from collections import Counter
+
+# runs of letters and digits, keeping inner apostrophes as in "don't" or "o'neill".
+TOKEN = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+
+STOPWORDS = frozenset([
+    "the", "be", "to", "of", "and", "a", "in", "that", "have", "i",
+    "it", "for", "not", "on", "with", "he", "as", "you", "do", "at",
+    "this", "but", "his", "by", "from", "they", "we", "say", "her", "she",
+    "or", "an", "will", "my", "one", "all", "would", "there", "their", "what",
+    "so", "up", "out", "if", "about", "who", "get", "which", "go", "me",
+    "when", "make", "can", "like", "time", "no", "just", "him", "know", "take",
+    "people", "into", "year", "your", "good", "some", "could", "them", "see", "other",
+    "than", "then", "now", "look", "only", "come", "its", "over", "think", "also",
+    "back", "after", "use", "two", "how", "our", "work", "first", "well", "way",
+    "even", "new", "want", "because", "any", "these", "give", "day", "most", "us", "was", "is",
+])
+
+# separates documents counted in one pass, never part of a token.
+SEPARATOR = "\x00"
+
+
+class Tokenizer:
+    def __init__(self, stopwords=STOPWORDS, form="NFKC", min_length=1):
+        """
+        Turns text into lowercase word tokens without punctuation or stopwords.
+        Text is Unicode normalized first, so "ﬁle" and "file" or full width digits give the same token.
+        :param stopwords: Tokens to drop, looked up in a frozenset.
+        :param form: Unicode normalization form, None to skip normalizing.
+        :param min_length: Shortest token kept.
+        """
+        self.stopwords = frozenset(stopwords)
+        self.form = form
+        self.min_length = min_length
+
+    def normalize(self, text):
+        if self.form:
+            text = unicodedata.normalize(self.form, text)
+        return text.casefold()
+
+    def tokenize(self, text):
+        """
+        :param text: Text to split.
+        :return: List of tokens in order.
+        """
+        stopwords = self.stopwords
+        min_length = self.min_length
+        return [token for token in TOKEN.findall(self.normalize(text))
+                if token not in stopwords and len(token) >= min_length]
+
+    def count(self, text):
+        """
+        :param text: Text to count.
+        :return: Counter of tokens.
+        """
+        return self._filter(Counter(TOKEN.findall(self.normalize(text))))
+
+    def _filter(self, counts):
+        """
+        Drop stopwords and short tokens once per distinct token rather than once per occurrence.
+        :param counts: Counter of every token.
+        :return: The same Counter.
+        """
+        for token in self.stopwords & counts.keys():
+            del counts[token]
+        if self.min_length > 1:
+            for token in [token for token in counts if len(token) < self.min_length]:
+                del counts[token]
+        return counts
+
+    def count_many(self, texts):
+        """
+        Count the tokens of many texts, normalizing and matching all of them in a single pass.
+        :param texts: List of texts.
+        :return: List of Counters, one per text.
+        """
+        if not texts:
+            return []
+        joined = self.normalize(SEPARATOR.join(text.replace(SEPARATOR, " ") for text in texts))
+        return [self._filter(Counter(TOKEN.findall(document))) for document in joined.split(SEPARATOR)]